@@ -1,7 +1,8 @@
 import os
 from pathlib import Path
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, Optional
+from app.core.logging_config import setup_logging
 
 class Settings(BaseSettings):
     # App Config
@@ -14,18 +15,147 @@ class Settings(BaseSettings):
     DATA_DIR: Path = BASE_DIR / "data"
     VIDEO_DIR: Path = DATA_DIR / "videos"
     CLIPS_DIR: Path = DATA_DIR / "clips"
+    SEGMENT_INDEX_DIR: Path = DATA_DIR / "segment_index"
+    JOBS_DB_PATH: Path = DATA_DIR / "jobs.db"
+    UPLOADS_DB_PATH: Path = DATA_DIR / "uploads.db"
+    EMBEDDING_CACHE_PATH: Path = DATA_DIR / "embedding_cache.db"
     
     # Secrets
-    OPENAI_API_KEY: str
+    OPENAI_API_KEY: Optional[str] = None # Required by LLM_PROVIDER=openai
     QDRANT_URL: str
     
     # --- NEW: Add API Key Support ---
     QDRANT_API_KEY: Optional[str] = None 
 
+    # Qdrant storage layout: "per_camera" (collection per camera) or "shared" (one collection, camera_id index)
+    QDRANT_LAYOUT: str = "per_camera"
+    QDRANT_SHARED_COLLECTION: str = "video_frames"
+    QDRANT_COLLECTION_CACHE_TTL: float = 30.0 # Seconds to trust the cached list of collections
+    QDRANT_SEARCH_TIMEOUT: float = 5.0 # Per-collection timeout in the concurrent search path
+    QDRANT_PROFILE: str = "full" # full | scalar | binary (applies to newly created collections)
+    QDRANT_HNSW_M: int = 16
+    QDRANT_HNSW_EF_CONSTRUCT: int = 100
+    QDRANT_HNSW_ON_DISK: bool = False
+    QDRANT_HNSW_EF: Optional[int] = None # Search-time ef; None uses the server default
+    SEARCH_EVENT_GAP: float = 5.0 # Hits of one video closer than this (seconds) form one event
+    SEARCH_EVENT_OVERFETCH: int = 3 # Per-collection limit = k * this, so events get their full span
+    QDRANT_UPSERT_BATCH_SIZE: int = 128 # Points per streamed upsert during ingestion
+    QDRANT_UPSERT_MAX_DELAY: float = 5.0 # Seconds a point may wait in the buffer before its batch is sent
+    QDRANT_UPSERT_MAX_INFLIGHT: int = 2 # Queued batches before ingestion waits for Qdrant
+
+    # Ingestion
+    INGEST_WORKERS: int = 2 # Background ingestion worker threads
+    INGEST_PROCESS_WORKERS: int = 0 # Processes for frame decode/resize/encode; 0 = in the API process
+    INGEST_SHARD_SECONDS: float = 60.0 # Video length each process decodes per task (seek to start)
+    INGEST_SHARD_WINDOW: Optional[int] = None # Shards in flight per video; None = 2 x INGEST_PROCESS_WORKERS
+    VISION_CONCURRENCY: int = 8 # Caption requests in flight per video
+    OPENAI_VISION_RPM: int = 500 # Requests per minute budget for the vision model
+    OPENAI_VISION_TPM: int = 200000 # Tokens per minute budget for the vision model
+    VISION_TOKENS_PER_REQUEST: int = 600 # Estimate (prompt + 640x360 image + completion), settled against real usage
+    VISION_BATCH_MODE: str = "off" # off (one frame per request) | frames (several images per request) | mosaic (one tiled image)
+    VISION_BATCH_SIZE: int = 4 # Consecutive frames per batched vision request
+    VISION_MOSAIC_COLUMNS: int = 2 # Tiles per row in mosaic mode
+    VISION_TOKENS_PER_FRAME: int = 100 # Completion budget per frame in a batched request
+    UPLOAD_MAX_CHUNK_BYTES: int = 64 * 1024 * 1024 # Largest accepted PUT body for chunked uploads
+    UPLOAD_STALL_TIMEOUT: float = 300.0 # Streaming ingestion fails if an upload sends nothing for this long (retry resumes it)
+    FRAME_SAMPLING_MODE: str = "grab" # read | grab | seek (see VideoProcessor.iter_sampled_frames)
+    FRAME_DECODE_THREAD: bool = True # Decode on a separate thread, overlapping resize + JPEG encode
+    FRAME_WIDTH: int = 640 # Sampled frames are resized to FRAME_WIDTH x FRAME_HEIGHT before captioning
+    FRAME_HEIGHT: int = 360
+    FRAME_JPEG_QUALITY: int = 95 # 0-100; ~80 roughly halves frame size with little caption change
+
+    # Frame deduplication before captioning
+    FRAME_DEDUP_MODE: str = "off" # off | reuse (store with previous caption/vector) | skip (don't store)
+    FRAME_DEDUP_METHOD: str = "phash" # phash | diff
+    FRAME_DEDUP_HASH_DISTANCE: int = 6 # Max differing bits (of 64) for phash duplicates
+    FRAME_DEDUP_DIFF_THRESHOLD: float = 3.0 # Max mean abs pixel difference (0-255) for diff duplicates
+    FRAME_DEDUP_MAX_RUN: int = 60 # Force a fresh caption after this many consecutive duplicates
+
+    # Event segmentation: consecutive similar frames are indexed as one event point
+    EVENT_SEGMENTATION: bool = False
+    EVENT_SIMILARITY_THRESHOLD: float = 0.88 # Cosine similarity to the event centroid to stay in the event
+    EVENT_MAX_SECONDS: float = 60.0
+    EVENT_MAX_GAP: float = 5.0 # Seconds between consecutive frames of one event
+    EVENT_KEEP_FRAMES: bool = True # Also store frame-level points in "<collection>__frames"
+
+    # Clips
+    CLIP_CACHE_MAX_BYTES: int = 2 * 1024 ** 3 # LRU-evict CLIPS_DIR beyond this
+    CLIP_PREWARM_COUNT: int = 3 # Extra search hits whose clips are built in the background
+    CLIP_PREWARM_WORKERS: int = 2
+    CLIP_MAX_SECONDS: float = 15.0 # Upper bound for clips spanning a whole search event
+    SEGMENT_STREAMING: bool = True # Serve result windows from the original file via /api/segments when indexed
+    SEGMENT_REMUX: bool = False # Fallback for MP4s whose sample tables can't be served: a fragmented copy under SEGMENT_INDEX_DIR
+
+    # Intent routing (SEARCH vs CHAT)
+    INTENT_ROUTING: str = "local" # local (regex -> embedding classifier -> LLM) | llm (always ask the LLM)
+    INTENT_EMBEDDING_CLASSIFIER: bool = True
+    INTENT_CONFIDENCE_THRESHOLD: float = 0.6 # Below this the classifier defers to the LLM
+
+    # Cross-encoder reranking (needs sentence-transformers)
+    RERANK_ENABLED: bool = False
+    RERANK_MODEL: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    RERANK_MAX_CANDIDATES: int = 20 # Vector hits scored by the cross-encoder
+    RERANK_BATCH_SIZE: int = 32
+    RERANK_TIMEOUT: Optional[float] = 0.5 # Latency budget (s); over it, vector order is kept
+    RERANK_DEVICE: Optional[str] = None # e.g. "cpu" or "cuda"; None lets sentence-transformers pick
+
+    # Search result cache
+    SEARCH_CACHE_ENABLED: bool = True
+    SEARCH_CACHE_MAX_ENTRIES: int = 512 # In-process LRU tier
+    SEARCH_CACHE_TTL: float = 300.0 # Seconds
+    SEARCH_CACHE_BACKEND: str = "memory" # memory | sqlite | redis (second tier; needed when ingestion runs in another process)
+    SEARCH_CACHE_PATH: Path = DATA_DIR / "search_cache.db"
+    SEARCH_CACHE_STORE_MAX_ENTRIES: int = 5000
+    SEARCH_CACHE_REDIS_URL: Optional[str] = None # e.g. redis://localhost:6379/0
+
+    # LLM provider
+    LLM_PROVIDER: str = "openai" # openai | local (offline captioning + embeddings on CPU) | stub (deterministic fake)
+    LOCAL_BACKEND: str = "onnx" # onnx (int8 quantized, needs optimum[onnxruntime]) | torch
+    LOCAL_CAPTION_MODEL: str = "nlpconnect/vit-gpt2-image-captioning"
+    LOCAL_CAPTION_BATCH_SIZE: int = 8 # Frames per generate() call
+    LOCAL_CAPTION_MAX_TOKENS: int = 40
+    LOCAL_EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
+    LOCAL_EMBEDDING_SIZE: int = 384 # Output size of LOCAL_EMBEDDING_MODEL (EMBEDDING_DIMENSIONS truncates it)
+    LOCAL_EMBEDDING_ONNX_FILE: Optional[str] = "onnx/model_quint8_avx2.onnx" # Quantized weights in the model repo
+    LOCAL_THREADS: Optional[int] = None # Intra-op CPU threads; None = all cores
+    LOCAL_MODEL_DIR: Path = DATA_DIR / "models" # Quantized caption model exports
+    STUB_LATENCY: float = 0.0 # Seconds each stub caption takes (simulated API latency)
+
+    # Embeddings
+    EMBEDDING_BATCH_SIZE: int = 64 # Inputs per embeddings.create call
+    EMBEDDING_DIMENSIONS: Optional[int] = None # e.g. 512 for shortened text-embedding-3-small vectors; None = 1536
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 200000 # LRU-evicted beyond this
+
+    # Live ingestion (watch folder of rolling NVR segments and/or stream URLs)
+    LIVE_WATCH_DIR: Optional[Path] = None # Segments directly inside belong to LIVE_CAMERA_ID, subdirectories are cameras
+    LIVE_CAMERA_ID: str = "live"
+    LIVE_SEGMENT_EXTENSIONS: str = ".mp4,.mkv,.ts,.avi,.mov"
+    LIVE_SEGMENT_TIME_REGEX: str = r"(\d{4})-?(\d{2})-?(\d{2})[T_-]?(\d{2})-?(\d{2})-?(\d{2})" # Start time in segment names
+    LIVE_SEGMENT_TIMEZONE: Optional[str] = None # IANA zone the NVR names segments in (e.g. "UTC"); None = this host's zone
+    LIVE_SEGMENT_SETTLE: float = 15.0 # A segment is finished once unchanged this long (or a newer one appears)
+    LIVE_POLL_INTERVAL: float = 2.0 # Seconds between watch folder scans
+    LIVE_BACKFILL: bool = True # Also index segments already in the folder at startup
+    LIVE_JOBS_DB_PATH: Path = DATA_DIR / "live_jobs.db" # Segment jobs, run by one worker per camera apart from uploads
+    LIVE_LOCK_PATH: Path = DATA_DIR / "live_ingest.lock" # Held by the one process running live ingestion
+    LIVE_RETENTION_HOURS: Optional[float] = 168.0 # Stored segments the NVR has rotated away are deleted this long after indexing; None keeps them
+    LIVE_STREAMS: Dict[str, str] = {} # camera_id -> cv2.VideoCapture source (RTSP URL, device, or a file as stand-in)
+    LIVE_INTERVAL: float = 1.0 # Seconds between sampled frames
+    LIVE_MAX_LAG: float = 60.0 # Live frames further behind real time than this are skipped, not captioned
+    LIVE_FLUSH_INTERVAL: float = 2.0 # Live captions are embedded and upserted at least this often, even in partial batches
+    LIVE_MAX_PENDING_FRAMES: int = 32 # Sampled stream frames waiting for captioning; the oldest are dropped beyond this
+
+    # Observability
+    LOG_LEVEL: str = "INFO" # DEBUG | INFO | WARNING | ERROR
+    LOG_FORMAT: str = "text" # text | json (one object per line)
+    METRICS_ENABLED: bool = True # Time service calls and serve GET /metrics
+    SERVER_TIMING: bool = True # Add a Server-Timing header with per-call durations to API responses
+
     class Config:
         env_file = ".env"
 
 settings = Settings()
 
+setup_logging(settings.LOG_LEVEL, settings.LOG_FORMAT)
+
 os.makedirs(settings.VIDEO_DIR, exist_ok=True)
 os.makedirs(settings.CLIPS_DIR, exist_ok=True)
\ No newline at end of file
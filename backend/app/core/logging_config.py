@@ -0,0 +1,51 @@
+import json
+import logging
+import sys
+
+# Attributes every LogRecord has; anything else on a record came from `extra=`
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, plus any `extra=` fields."""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Plain lines with `extra=` fields appended as key=value."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s: %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        extras = [f"{k}={v}" for k, v in vars(record).items() if k not in _STANDARD_ATTRS and not k.startswith("_")]
+        return f"{line} [{' '.join(extras)}]" if extras else line
+
+
+def setup_logging(level="INFO", fmt="text"):
+    """Configures the `app` logger tree once: LOG_LEVEL gates output, LOG_FORMAT picks text or json."""
+    logger = logging.getLogger("app")
+    logger.setLevel(level.upper())
+    if not any(getattr(h, "_videorag", False) for h in logger.handlers):
+        handler = logging.StreamHandler(sys.stdout)
+        handler._videorag = True
+        logger.addHandler(handler)
+        # Uvicorn configures the root logger; don't print every line twice
+        logger.propagate = False
+    for handler in logger.handlers:
+        if getattr(handler, "_videorag", False):
+            handler.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
@@ -1,8 +1,17 @@
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request, Header
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from fastapi.concurrency import run_in_threadpool, iterate_in_threadpool
+from contextlib import asynccontextmanager
+from typing import Optional
+from urllib.parse import quote
+import asyncio
+import json
+import logging
 import os
 import shutil
+import time
 from datetime import datetime, timedelta
 
 # Import Services
@@ -10,10 +19,44 @@ from app.core.config import settings
 from app.services.llm_factory import get_llm_provider
 from app.services.qdrant_store import QdrantService
 from app.services.video_proc import VideoProcessor
-# from app.services.reranker import rerank_results  <--- REMOVED IMPORT
-from app.models.api_models import SearchRequest
+from app.services.ingestion import IngestionPipeline
+from app.services.job_queue import JobQueue
+from app.services.clip_cache import ClipCache
+from app.services.result_cache import get_search_cache
+from app.services.intent_router import get_intent_router
+from app.services.segment_index import SegmentIndex, iter_range
+from app.services.chunked_upload import (
+    ChunkedUploadManager, UploadNotFound, OffsetMismatch, ChecksumMismatch, FilenameInUse, UploadError,
+    reserve_video_file
+)
+from app.services.reranker import get_reranker
+from app.services.frame_pool import get_frame_pool
+from app.services.live_ingest import get_live_ingest, segment_ready, bound_lag
+from app.services import metrics
+from app.models.api_models import SearchRequest, UploadSessionRequest
+
+logger = logging.getLogger(__name__)
 
-app = FastAPI(title=settings.PROJECT_NAME)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Start ingestion workers (also resumes jobs interrupted by a restart)
+    job_queue.start()
+    if live_ingest is not None:
+        live_ingest.start()
+    if reranker is not None:
+        # Load the cross-encoder in the background; searches use vector order until it's ready
+        reranker.warmup()
+    yield
+    if live_ingest is not None:
+        live_ingest.stop()
+    job_queue.stop()
+    clip_cache.shutdown()
+    if frame_pool is not None:
+        frame_pool.shutdown()
+    if reranker is not None:
+        reranker.shutdown()
+
+app = FastAPI(title=settings.PROJECT_NAME, lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -25,8 +68,141 @@ app.add_middleware(
 app.mount("/static", StaticFiles(directory=str(settings.DATA_DIR)), name="static")
 
 llm = get_llm_provider()
-qdrant = QdrantService()
+qdrant = QdrantService(vector_size=llm.embedding_size)
 processor = VideoProcessor()
+segment_index = SegmentIndex(settings.SEGMENT_INDEX_DIR, remux=settings.SEGMENT_REMUX)
+intent_router = get_intent_router(llm)
+reranker = get_reranker()
+search_cache = get_search_cache()
+frame_pool = get_frame_pool(processor)
+ingestion = IngestionPipeline(
+    llm, qdrant, processor, segment_index=segment_index, search_cache=search_cache, frame_pool=frame_pool
+)
+
+uploads = ChunkedUploadManager(settings.UPLOADS_DB_PATH, settings.VIDEO_DIR)
+clip_cache = ClipCache(processor, settings.CLIPS_DIR, settings.CLIP_CACHE_MAX_BYTES, settings.CLIP_PREWARM_WORKERS)
+
+if settings.METRICS_ENABLED:
+    # Every public call on these is timed (histogram, in-flight gauge, errors, Server-Timing);
+    # per-point helpers are left out to keep the overhead off the hot loops
+    metrics.instrument(llm, "llm")
+    metrics.instrument(qdrant, "qdrant", exclude=("parse_custom_timestamp", "collection_for", "writer"))
+    metrics.instrument(processor, "video", exclude=("parse_custom_ts",))
+
+def run_ingestion_job(job, report_progress):
+    payload = job["payload"]
+    frames = None
+    flush_interval = None
+    upload_id = payload.get("upload_id")
+    watch_path = payload.get("watch_path")
+    if watch_path:
+        # NVR segment from the watch folder: follow it until the recorder moves on to the next one
+        frames = processor.process_growing_video(
+            payload["file_path"],
+            payload["start_timestamp"],
+            is_complete=lambda: segment_ready(watch_path, payload["file_path"]),
+            interval=settings.LIVE_INTERVAL,
+            resume_after=job.get("checkpoint")
+        )
+        if payload.get("live"):
+            start_dt = processor.parse_custom_ts(payload["start_timestamp"])
+            frames = bound_lag(frames, start_dt, settings.LIVE_MAX_LAG, payload["camera_id"])
+            flush_interval = settings.LIVE_FLUSH_INTERVAL
+    elif upload_id and not uploads.is_complete(upload_id):
+        # Chunked upload still in progress: index what has arrived so far, then follow the file
+        frames = processor.process_growing_video(
+            payload["file_path"],
+            payload["start_timestamp"],
+            is_complete=lambda: uploads.is_complete(upload_id),
+            resume_after=job.get("checkpoint")
+        )
+    # A retried/resumed job continues after the last frame Qdrant acknowledged
+    return ingestion.run(
+        payload["file_path"],
+        payload["filename"],
+        payload["camera_id"],
+        payload["start_timestamp"],
+        report_progress=report_progress,
+        frames=frames,
+        resume_after=job.get("checkpoint"),
+        flush_interval=flush_interval
+    )
+
+def submit_ingestion(session):
+    # A job that follows an upload still in progress waits on the client; its own lane
+    # keeps an abandoned upload from holding one of the shared workers
+    job_id = job_queue.submit({
+        "file_path": session["file_path"],
+        "filename": session["filename"],
+        "camera_id": session["camera_id"],
+        "start_timestamp": session["start_timestamp"],
+        "upload_id": session["id"]
+    }, lane=None if session["complete"] else f"upload:{session['id']}")
+    uploads.set_job(session["id"], job_id)
+    return job_id
+
+job_queue = JobQueue(settings.JOBS_DB_PATH, run_ingestion_job, num_workers=settings.INGEST_WORKERS)
+live_ingest = get_live_ingest(ingestion, processor, run_ingestion_job)
+
+# --- Observability ---
+def collect_service_stats():
+    """Scrape-time samples from the counters the caches, queue and routers already keep"""
+    caches = {"clip": clip_cache.stats()}
+    if search_cache is not None:
+        stats = search_cache.stats()
+        caches["search"] = {"hits": stats["hits"] + stats["store_hits"], "misses": stats["misses"]}
+    embedding_cache = getattr(llm, "embedding_cache", None)
+    if embedding_cache is not None:
+        caches["embedding"] = embedding_cache.stats()
+    for name, stats in caches.items():
+        for result, key in (("hit", "hits"), ("miss", "misses")):
+            yield ("videorag_cache_requests_total", "counter", "Cache lookups by cache and result",
+                   {"cache": name, "result": result}, stats[key])
+    yield ("videorag_clip_cache_bytes", "gauge", "Bytes of clips on disk", {}, caches["clip"]["bytes"])
+    for status, count in job_queue.counts().items():
+        yield ("videorag_jobs", "gauge", "Ingestion jobs by status", {"status": status}, count)
+    for tier, count in intent_router.stats()["routes"].items():
+        yield ("videorag_intent_routes_total", "counter", "Intent decisions by routing tier", {"tier": tier}, count)
+    if live_ingest is not None:
+        stats = live_ingest.stats()
+        yield ("videorag_live_segments_total", "counter", "Watch folder segments submitted for ingestion", {},
+               stats["segments_submitted"])
+        yield ("videorag_live_segments_pruned_total", "counter", "Stored segments deleted after LIVE_RETENTION_HOURS", {},
+               stats["segments_pruned"])
+        for status, count in stats["segment_jobs"].items():
+            yield ("videorag_live_jobs", "gauge", "Watch folder segment jobs by status", {"status": status}, count)
+        for camera_id, stream in stats["streams"].items():
+            yield ("videorag_live_stream_frames_total", "counter", "Frames sampled from live streams",
+                   {"source": camera_id}, stream["frames_read"])
+            yield ("videorag_live_stream_connections_total", "counter", "Live stream (re)connections",
+                   {"source": camera_id}, stream["connections"])
+    if reranker is not None:
+        for outcome, count in (("reranked", reranker.reranked), ("skipped", reranker.skipped)):
+            yield ("videorag_rerank_total", "counter", "Searches by reranking outcome", {"outcome": outcome}, count)
+
+if settings.METRICS_ENABLED:
+    metrics.REGISTRY.register_collector(collect_service_stats)
+
+    @app.middleware("http")
+    async def record_timings(request: Request, call_next):
+        timings = metrics.start_request_timing()
+        start = time.perf_counter()
+        response = await call_next(request)
+        elapsed = time.perf_counter() - start
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        metrics.HTTP_SECONDS.observe(elapsed, method=request.method, route=route, status=response.status_code)
+        if settings.SERVER_TIMING and timings is not None:
+            # Streaming responses only report what ran before the first byte
+            response.headers["Server-Timing"] = metrics.server_timing_header(timings, elapsed)
+            response.headers["Timing-Allow-Origin"] = "*"
+        return response
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    text = await run_in_threadpool(metrics.REGISTRY.render)
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4")
 
 @app.post("/api/upload")
 async def upload_video(
@@ -34,68 +210,233 @@ async def upload_video(
     camera_id: str = Form(...),
     start_timestamp: str = Form(...) 
 ):
-    # 1. Save directly to local storage
-    file_path = settings.VIDEO_DIR / file.filename
-    
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    # 1. Save directly to local storage (off the event loop), under a name no other upload holds
+    try:
+        file_path = await run_in_threadpool(reserve_video_file, settings.VIDEO_DIR, file.filename)
+    except FilenameInUse as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    # 2. Process Video (Extract frames & logic)
-    frames_gen = processor.process_video(str(file_path), start_timestamp)
-    
-    indexed_count = 0
-    batch_items = []
-    
-    # Parse start_timestamp to datetime
+    def save_upload():
+        with open(file_path, "r+b") as buffer:
+            shutil.copyfileobj(file.file, buffer)
+
+    await run_in_threadpool(save_upload)
+
+    # 2. Queue ingestion; workers extract, caption and index in the background
+    job_id = job_queue.submit({
+        "file_path": str(file_path),
+        "filename": file_path.name,
+        "camera_id": camera_id,
+        "start_timestamp": start_timestamp
+    })
+
+    return {"status": "queued", "job_id": job_id}
+
+# --- Resumable chunked uploads ---
+@app.post("/api/uploads")
+async def create_upload(request: UploadSessionRequest):
+    try:
+        session = await run_in_threadpool(
+            uploads.create, request.filename, request.camera_id, request.start_timestamp, request.total_size
+        )
+    except FilenameInUse as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if request.stream_ingest:
+        # Ingestion follows the file as chunks arrive
+        session["job_id"] = submit_ingestion(session)
+    return session
+
+@app.get("/api/uploads/{upload_id}")
+async def get_upload(upload_id: str):
+    try:
+        return uploads.get(upload_id)
+    except UploadNotFound:
+        raise HTTPException(status_code=404, detail="Upload not found")
+
+@app.put("/api/uploads/{upload_id}")
+async def put_upload_chunk(
+    upload_id: str,
+    request: Request,
+    offset: int,
+    x_chunk_sha256: Optional[str] = Header(None)
+):
+    # Enforce the limit while reading, so an oversized body is never buffered whole
+    limit = settings.UPLOAD_MAX_CHUNK_BYTES
+    if int(request.headers.get("content-length") or 0) > limit:
+        raise HTTPException(status_code=413, detail="Chunk too large")
+    body = bytearray()
+    async for piece in request.stream():
+        body += piece
+        if len(body) > limit:
+            raise HTTPException(status_code=413, detail="Chunk too large")
+    data = bytes(body)
     try:
-        if "T" in start_timestamp:
-             video_start_dt = datetime.fromisoformat(start_timestamp)
+        session = await run_in_threadpool(uploads.write_chunk, upload_id, offset, data, x_chunk_sha256)
+    except UploadNotFound:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    except OffsetMismatch as e:
+        # Client resumes from the offset we actually have
+        raise HTTPException(status_code=409, detail={"message": str(e), "offset": e.expected})
+    except ChecksumMismatch as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if session["complete"] and not session["job_id"]:
+        session["job_id"] = submit_ingestion(session)
+    return session
+
+# --- Time-window streaming from the original file ---
+@app.get("/api/segments/{video_id}")
+async def stream_segment(video_id: str, start: float = 0.0, duration: float = 3.0, range_header: Optional[str] = Header(None, alias="Range")):
+    video_path = settings.VIDEO_DIR / os.path.basename(video_id)
+    if not os.path.exists(video_path):
+        raise HTTPException(status_code=404, detail="Video not found")
+
+    planned = await run_in_threadpool(segment_index.plan, str(video_path), max(0.0, start), max(0.1, duration))
+    if planned is None:
+        raise HTTPException(status_code=404, detail="No segment index for this video")
+    media_path, parts, total = planned
+
+    headers = {"Accept-Ranges": "bytes", "Cache-Control": "public, max-age=3600"}
+    range_start, range_end, status = 0, total - 1, 200
+    if range_header and range_header.startswith("bytes="):
+        try:
+            lo, _, hi = range_header[len("bytes="):].split(",")[0].strip().partition("-")
+            if lo:
+                range_start = int(lo)
+                range_end = min(int(hi), total - 1) if hi else total - 1
+            else:
+                # Suffix range: last N bytes
+                range_start = max(0, total - int(hi))
+        except ValueError:
+            raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{total}"})
+        if range_start > range_end or range_start >= total:
+            raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{total}"})
+        status = 206
+        headers["Content-Range"] = f"bytes {range_start}-{range_end}/{total}"
+    headers["Content-Length"] = str(range_end - range_start + 1)
+
+    return StreamingResponse(
+        iterate_in_threadpool(iter_range(media_path, parts, range_start, range_end)),
+        status_code=status,
+        media_type="video/mp4",
+        headers=headers
+    )
+
+@app.get("/api/jobs")
+async def list_jobs(status: Optional[str] = None, limit: int = 50):
+    return {"jobs": job_queue.list(status=status, limit=limit)}
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.post("/api/jobs/{job_id}/retry")
+async def retry_job(job_id: str):
+    if job_queue.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if not job_queue.retry(job_id):
+        raise HTTPException(status_code=409, detail="Only failed jobs can be retried")
+    return job_queue.get(job_id)
+
+def clip_window_for(res):
+    """
+    (start_offset, duration) of the clip for a result. Results grouped into an event get a
+    clip covering the whole event (capped at CLIP_MAX_SECONDS around the peak frame);
+    single frames keep the 3-second window. Clips start 1s before start_offset.
+    """
+    offset = res.get('relative_offset')
+    event = res.get('event')
+    if not event or offset is None:
+        return offset, 3
+    duration = min(max(3, event['end'] - event['start'] + 3), settings.CLIP_MAX_SECONDS)
+    start = event['start']
+    if offset > start + duration - 2:
+        # Event longer than the cap: keep the peak frame inside the window
+        start = max(start, offset - duration / 2)
+    return start, round(duration, 3)
+
+def clip_request_for(res):
+    """(video_path, clip_time, clip_filename, duration) for a result, or None when it has no usable offset"""
+    # Determine correct clip timestamp
+    clip_time, duration = clip_window_for(res)
+    if clip_time is None:
+        # Legacy Fallback
+        if res.get('timestamp_sortable', 0) < 100000:
+            clip_time = res.get('timestamp_sortable', 0)
         else:
-             video_start_dt = datetime.fromisoformat(start_timestamp)
-    except Exception as e:
-        print(f"Error parsing start_timestamp {start_timestamp}: {e}")
-        video_start_dt = datetime.now() # Fallback
-
-    # Static URL for local playback
-    public_url = f"/static/videos/{file.filename}"
-
-    for frame_data in frames_gen:
-        description = llm.get_vision_description(frame_data['image'])
-        vector = llm.get_embedding(description)
-        
-        # Calculate Clock Time Seconds (0-86400)
-        frame_offset = frame_data['relative_offset']
-        frame_dt = video_start_dt + timedelta(seconds=frame_offset)
-        clock_time_seconds = frame_dt.hour * 3600 + frame_dt.minute * 60 + frame_dt.second
-
-        metadata = {
-            "camera_id": camera_id,
-            "video_id": file.filename,
-            "timestamp_str": frame_data['timestamp_str'],
-            "display_time": frame_data['timestamp_str'],
-            "relative_offset": frame_data['relative_offset'],
-            "clock_time_seconds": clock_time_seconds,
-            "description": description,
-            "video_path": file.filename, # Store filename
-            "frame_id": frame_data['frame_id'],
-            "video_url": public_url # Direct link for full video playback
-        }
-        batch_items.append((vector, metadata))
-        indexed_count += 1
+            return None
+    video_path = settings.VIDEO_DIR / res.get('video_path', '')
+    if not video_path.is_file():
+        # Live stream results are index-only: there is no stored video to cut from
+        return None
+    # Unique clip name based on Point ID (and the window, for event clips)
+    suffix = "" if duration == 3 else f"_{clip_time:g}_{duration:g}s"
+    return (video_path, clip_time, f"clip_{res['id']}{suffix}.mp4", duration)
 
-    # Upload all frames in one batch
-    if batch_items:
-        qdrant.upload_batch(batch_items)
+def segment_url_for(res):
+    """Range-streamable window URL for a result, or None when its video has no segment index"""
+    if not settings.SEGMENT_STREAMING or res.get('relative_offset') is None:
+        return None
+    video_id = res.get('video_path')
+    if not video_id or not segment_index.has_index(video_id):
+        return None
+    clip_time, duration = clip_window_for(res)
+    start = max(0, clip_time - 1)
+    return f"/api/segments/{quote(video_id)}?start={start:g}&duration={duration:g}"
 
-    return {"status": "success", "frames_indexed": indexed_count}
+def build_clip(clip_req):
+    if clip_req is None:
+        return False
+    video_path, clip_time, clip_filename, duration = clip_req
+    try:
+        return clip_cache.get(video_path, clip_time, clip_filename, duration)
+    except Exception as e:
+        logger.error("Failed to create clip: %s", e)
+        return False
+
+@app.get("/api/intent/stats")
+async def intent_stats():
+    return intent_router.stats()
 
 @app.post("/api/search")
 async def search_videos(request: SearchRequest):
-    # 1. Check Intent
-    intent = llm.check_intent(request.query)
+    if search_cache is None:
+        return await run_search(request)
+
+    # Repeated searches (same normalized query/filters, no new footage since) are served from cache
+    key = await run_in_threadpool(search_cache.key_for, request)
+    response = await search_cache.get_or_compute(key, lambda: run_search(request))
+    if not clips_available(response):
+        # A clip it links to has been evicted from the clip cache since; rebuild
+        response = await run_search(request)
+        await run_in_threadpool(search_cache.set, key, response)
+    return response
+
+def clips_available(response):
+    prefix = "/static/clips/"
+    return all(
+        clip_cache.touch(res["video_url"][len(prefix):])
+        for res in response.get("results", [])
+        if (res.get("video_url") or "").startswith(prefix)
+    )
+
+NO_RESULTS_MESSAGE = "I looked through the footage but couldn't find anything matching your description."
+
+async def run_search(request: SearchRequest):
+    # 1. Check Intent (local routing; the LLM is only asked when the classifier is unsure)
+    intent = await run_in_threadpool(intent_router.classify, request.query)
 
     if intent == "CHAT":
-        reply = llm.get_general_response(request.query)
+        reply = await run_in_threadpool(llm.get_general_response, request.query)
         return {
             "type": "chat",
             "message": reply,
@@ -103,7 +444,37 @@ async def search_videos(request: SearchRequest):
         }
 
     # 2. Search Qdrant
-    query_vector = llm.get_embedding(request.query)
+    final_results = await find_results(request)
+    
+    # Generate & Inject Trimmed Clips (cached, single-flight, built concurrently)
+    # Videos with a segment index are streamed straight from the original file, no clip needed
+    segment_urls = [segment_url_for(res) for res in final_results]
+    clip_requests = [clip_request_for(res) for res in final_results]
+    clips_ready = await asyncio.gather(*(
+        run_in_threadpool(build_clip, None if seg else req) for seg, req in zip(segment_urls, clip_requests)
+    ))
+
+    for res, segment_url, clip_req, clip_ok in zip(final_results, segment_urls, clip_requests, clips_ready):
+        apply_video_url(res, segment_url, clip_req, clip_ok)
+        format_display_fields(res)
+
+    count = len(final_results)
+    
+    # Generate AI Answer
+    if count > 0:
+        ai_message = await run_in_threadpool(llm.get_search_summary, request.query, final_results)
+    else:
+        ai_message = NO_RESULTS_MESSAGE
+
+    return {
+        "type": "search",
+        "message": ai_message,
+        "results": final_results
+    }
+
+async def find_results(request: SearchRequest):
+    """Embeds the query, applies the request's filters and returns the top hits as result dicts"""
+    query_vector = await run_in_threadpool(llm.get_embedding, request.query)
     
     # --- Parse Date Filter ---
     date_range = None
@@ -119,7 +490,7 @@ async def search_videos(request: SearchRequest):
             
             date_range = (dt_start.timestamp(), dt_end_inclusive.timestamp())
         except ValueError:
-            print(f"Invalid date format: {request.start_date} - {request.end_date}")
+            logger.warning("Invalid date format: %s - %s", request.start_date, request.end_date)
 
     # --- Parse Relative Time Filter ---
     def parse_seconds(t_str):
@@ -142,125 +513,204 @@ async def search_videos(request: SearchRequest):
     if start_rel is not None or end_rel is not None:
         relative_range = (start_rel, end_rel)
 
-    # Get Top 3 directly (No Reranking)
-    candidates = qdrant.search(
+    # Top 3, plus a few extra to pre-warm clips for (over-fetched when reranking)
+    k = 3 + settings.CLIP_PREWARM_COUNT
+    if reranker is not None:
+        k = max(k, reranker.max_candidates)
+    candidates = await qdrant.search_async(
         query_vector,
         camera_ids=request.cameras,  # Pass list directly
         date_range=date_range,
         relative_range=relative_range,
-        k=3 
+        k=k
     )
     
     # Extract results and inject score & ID
-    final_results = []
+    results = []
     for hit in candidates:
         res = hit.payload
         res['score'] = float(hit.score)
         res['id'] = str(hit.id)
-        final_results.append(res)
-    
-    # Generate & Inject Trimmed Clips
-    for res in final_results:
-        # Debug
-        print(f"DEBUG: Processing result {res.get('id')}")
-        print(f"DEBUG: Original Path/URL: {res.get('video_path')}")
-        print(f"DEBUG: Relative Offset: {res.get('relative_offset')}")
-
-        # Unique clip name based on Point ID
-        clip_filename = f"clip_{res['id']}.mp4"
-        local_clip_path = settings.CLIPS_DIR / clip_filename
-        
-        # Determine correct clip timestamp
-        clip_time = res.get('relative_offset')
-        
-        if clip_time is None:
-             # Legacy Fallback
-             if res.get('timestamp_sortable', 0) < 100000:
-                  clip_time = res.get('timestamp_sortable', 0)
-             else:
-                  print(f"Skipping clip for {clip_filename}: timestamp too large.")
-                  if not res.get('video_url'):
-                       res['video_url'] = f"/static/videos/{res.get('video_path', '')}"
-                  res['timestamp_sortable'] = 0 
-                  continue
-
-        original_video_filename = res.get('video_path')
-        local_video_path = settings.VIDEO_DIR / original_video_filename
-
-        # Check if clip exists locally
-        if not os.path.exists(local_clip_path):
-            print(f"Generating clip: {clip_filename} at offset {clip_time}")
-            
-            try:
-                success = processor.create_clip(
-                    str(local_video_path), 
-                    clip_time, 
-                    str(local_clip_path)
-                )
-                if not success:
-                    raise Exception("Clip generation failed")
-            except Exception as e:
-                print(f"Failed to create clip: {e}")
-                # Fallback to local original video
-                res['video_url'] = f"/static/videos/{original_video_filename}"
-                continue
+        results.append(res)
+
+    if reranker is not None:
+        results = await reranker.rerank_async(request.query, results)
+    final_results, runners_up = results[:3], results[3:3 + settings.CLIP_PREWARM_COUNT]
+
+    # Next-best hits are likely to be asked for next; build their clips in the background
+    clip_cache.prewarm(filter(None, (clip_request_for(res) for res in runners_up)))
+    return final_results
+
+def original_video_url(res):
+    """Static URL of the result's original video, or None when there is no file (live stream frames)"""
+    video_path = res.get('video_path')
+    if not video_path or not (settings.VIDEO_DIR / os.path.basename(video_path)).is_file():
+        return None
+    return f"/static/videos/{video_path}"
 
+def apply_video_url(res, segment_url, clip_req, clip_ok):
+    """
+    Points a result at its segment window, its clip, or (fallback) the original video.
+    Results with none of these (stream frames are index-only) are left without a
+    video_url, which the player shows as a placeholder.
+    """
+    # Debug
+    logger.debug("Processing result", extra={"result_id": res.get('id'), "video_path": res.get('video_path'), "relative_offset": res.get('relative_offset')})
+
+    if segment_url:
+        res['video_url'] = segment_url
+    elif clip_req is None:
+        logger.info("Skipping clip for %s: timestamp too large", res.get('id'))
+        res['video_url'] = original_video_url(res)
+        res['timestamp_sortable'] = 0 
+        return
+    elif not clip_ok:
+        # Fallback to local original video
+        res['video_url'] = original_video_url(res)
+        return
+    else:
         # Point to the local static clip
-        res['video_url'] = f"/static/clips/{clip_filename}"
-        
-        # CRITICAL: Reset timestamp to 0 so Player starts from beginning of the CLIP
-        res['timestamp_sortable'] = 0
-        
-        
-        # --- Format Timestamp for AI & Display ---
-        # User requested: "video timestamp" (e.g. 00:01:03)
-        # UPDATE: User now wants CLOCK TIME if available
-        try:
-             clock_seconds = res.get('clock_time_seconds')
-             if clock_seconds is not None:
-                 # Format as HH:MM:SS (Clock Time)
-                 c_hours = int(clock_seconds // 3600)
-                 c_minutes = int((clock_seconds % 3600) // 60)
-                 c_seconds = int(clock_seconds % 60)
-                 formatted_time = f"{c_hours:02d}:{c_minutes:02d}:{c_seconds:02d}"
-             else:
-                 # Fallback to Relative Time
-                 offset_seconds = int(res.get('relative_offset', 0))
-                 hours = offset_seconds // 3600
-                 minutes = (offset_seconds % 3600) // 60
-                 seconds = offset_seconds % 60
-                 formatted_time = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-        except Exception as e:
-             print(f"Error formatting time: {e}")
-             formatted_time = "00:00:00"
-        
-        res['display_time'] = formatted_time
-        
-        # --- Format Date ---
-        ts_str = res.get('timestamp_str', '')
-        formatted_date = "Unknown Date"
-        if len(ts_str) >= 8:
-            try:
-                # 15012026... -> 15/01/2026
-                day = ts_str[0:2]
-                month = ts_str[2:4]
-                year = ts_str[4:8]
-                dt = datetime(int(year), int(month), int(day))
-                formatted_date = dt.strftime("%b %d, %Y") # Jan 15, 2026
-            except:
-                pass
-        res['display_date'] = formatted_date
+        res['video_url'] = f"/static/clips/{clip_req[2]}"
+    
+    # CRITICAL: Reset timestamp to 0 so Player starts from beginning of the CLIP
+    res['timestamp_sortable'] = 0
 
-    count = len(final_results)
+def format_display_fields(res):
+    # --- Format Timestamp for AI & Display ---
+    # User requested: "video timestamp" (e.g. 00:01:03)
+    # UPDATE: User now wants CLOCK TIME if available
+    try:
+         clock_seconds = res.get('clock_time_seconds')
+         if clock_seconds is not None:
+             # Format as HH:MM:SS (Clock Time)
+             c_hours = int(clock_seconds // 3600)
+             c_minutes = int((clock_seconds % 3600) // 60)
+             c_seconds = int(clock_seconds % 60)
+             formatted_time = f"{c_hours:02d}:{c_minutes:02d}:{c_seconds:02d}"
+         else:
+             # Fallback to Relative Time
+             offset_seconds = int(res.get('relative_offset', 0))
+             hours = offset_seconds // 3600
+             minutes = (offset_seconds % 3600) // 60
+             seconds = offset_seconds % 60
+             formatted_time = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+    except Exception as e:
+         logger.warning("Error formatting time: %s", e)
+         formatted_time = "00:00:00"
     
-    # Generate AI Answer
-    if count > 0:
-        ai_message = llm.get_search_summary(request.query, final_results)
-    else:
-        ai_message = "I looked through the footage but couldn't find anything matching your description."
+    res['display_time'] = formatted_time
+    
+    # --- Format Date ---
+    ts_str = res.get('timestamp_str', '')
+    formatted_date = "Unknown Date"
+    if len(ts_str) >= 8:
+        try:
+            # 15012026... -> 15/01/2026
+            day = ts_str[0:2]
+            month = ts_str[2:4]
+            year = ts_str[4:8]
+            dt = datetime(int(year), int(month), int(day))
+            formatted_date = dt.strftime("%b %d, %Y") # Jan 15, 2026
+        except:
+            pass
+    res['display_date'] = formatted_date
 
-    return {
-        "type": "search",
-        "message": ai_message,
-        "results": final_results
-    }
\ No newline at end of file
+# --- Streaming search (server-sent events) ---
+@app.post("/api/search/stream")
+async def search_videos_stream(request: SearchRequest):
+    """
+    Same search as /api/search, streamed as server-sent events:
+      results  -> ranked hits right after the vector search (segment URLs already set)
+      clip     -> {id, video_url, timestamp_sortable} as each clip becomes ready
+      token    -> {text} pieces of the summary / chat reply as the model writes them
+      done     -> the complete response, identical in shape to /api/search
+      error    -> {message}
+    """
+    return StreamingResponse(
+        stream_search(request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def stream_search(request: SearchRequest):
+    try:
+        key = None
+        if search_cache is not None:
+            key = await run_in_threadpool(search_cache.key_for, request)
+            cached = await run_in_threadpool(search_cache.get, key)
+            if cached is not None and clips_available(cached):
+                if cached["type"] == "search":
+                    yield sse_event("results", {"type": "search", "results": cached["results"]})
+                yield sse_event("token", {"text": cached["message"]})
+                yield sse_event("done", cached)
+                return
+
+        intent = await run_in_threadpool(intent_router.classify, request.query)
+        if intent == "CHAT":
+            parts = []
+            async for text in iterate_in_threadpool(llm.stream_general_response(request.query)):
+                parts.append(text)
+                yield sse_event("token", {"text": text})
+            response = {"type": "chat", "message": "".join(parts), "results": []}
+        else:
+            final_results = await find_results(request)
+            segment_urls = [segment_url_for(res) for res in final_results]
+            clip_requests = [clip_request_for(res) for res in final_results]
+            for res, segment_url in zip(final_results, segment_urls):
+                format_display_fields(res)
+                if segment_url:
+                    apply_video_url(res, segment_url, None, False)
+            yield sse_event("results", {"type": "search", "results": final_results})
+
+            # Clips and summary tokens are produced concurrently and sent in completion order
+            events = asyncio.Queue()
+
+            async def produce_clip(res, clip_req):
+                clip_ok = await run_in_threadpool(build_clip, clip_req)
+                apply_video_url(res, None, clip_req, clip_ok)
+                await events.put(("clip", {
+                    "id": res["id"], "video_url": res["video_url"], "timestamp_sortable": res.get("timestamp_sortable")
+                }))
+
+            async def produce_summary():
+                if not final_results:
+                    await events.put(("token", {"text": NO_RESULTS_MESSAGE}))
+                    return
+                async for text in iterate_in_threadpool(llm.stream_search_summary(request.query, final_results)):
+                    await events.put(("token", {"text": text}))
+
+            async def produce_all():
+                try:
+                    await asyncio.gather(produce_summary(), *(
+                        produce_clip(res, clip_req)
+                        for res, segment_url, clip_req in zip(final_results, segment_urls, clip_requests)
+                        if not segment_url
+                    ))
+                    await events.put(None)
+                except Exception as e:
+                    await events.put(e)
+
+            producer = asyncio.create_task(produce_all())
+            parts = []
+            try:
+                while (item := await events.get()) is not None:
+                    if isinstance(item, Exception):
+                        raise item
+                    event, data = item
+                    if event == "token":
+                        parts.append(data["text"])
+                    yield sse_event(event, data)
+            finally:
+                # Client went away or something failed: stop building clips / reading tokens
+                producer.cancel()
+            response = {"type": "search", "message": "".join(parts), "results": final_results}
+
+        if key is not None:
+            await run_in_threadpool(search_cache.set, key, response)
+        yield sse_event("done", response)
+    except Exception as e:
+        logger.exception("Streaming search failed: %s", e)
+        yield sse_event("error", {"message": "Search failed."})
@@ -7,4 +7,11 @@ class SearchRequest(BaseModel):
     start_date: Optional[str] = None # YYYY-MM-DD
     end_date: Optional[str] = None   # YYYY-MM-DD
     start_time: Optional[str] = None # HH:MM:SS (Clock time, e.g. "09:00:00")
-    end_time: Optional[str] = None # HH:MM:SS (Clock time, e.g. "17:00:00")
\ No newline at end of file
+    end_time: Optional[str] = None # HH:MM:SS (Clock time, e.g. "17:00:00")
+
+class UploadSessionRequest(BaseModel):
+    filename: str
+    camera_id: str
+    start_timestamp: str # ISO, e.g. "2026-01-15T09:00:00"
+    total_size: int # Bytes
+    stream_ingest: bool = True # Start indexing while chunks are still arriving
@@ -0,0 +1,170 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+
+
+class UploadError(Exception):
+    pass
+
+
+class UploadNotFound(UploadError):
+    pass
+
+
+class OffsetMismatch(UploadError):
+    def __init__(self, expected, received):
+        super().__init__(f"Expected offset {expected}, got {received}")
+        self.expected = expected
+
+
+class ChecksumMismatch(UploadError):
+    pass
+
+
+class FilenameInUse(UploadError):
+    pass
+
+
+def reserve_video_file(video_dir, filename):
+    """
+    Creates an empty `video_dir/<basename of filename>` and returns its path. Never
+    replaces an existing (possibly indexed, or reserved by another upload) video.
+    """
+    filename = os.path.basename(filename or "")
+    if filename in ("", ".", ".."):
+        raise UploadError("A file name is required")
+    path = video_dir / filename
+    try:
+        open(path, "xb").close()
+    except FileExistsError:
+        raise FilenameInUse(f"A video named '{filename}' already exists")
+    return path
+
+
+class ChunkedUploadManager:
+    """
+    Resumable, offset-addressed uploads written straight into the video directory.
+
+    The bytes on disk are the source of truth for the current offset, so a client
+    can always resume by asking for the session and continuing from `offset`.
+    Session metadata lives in SQLite so it survives restarts.
+    """
+
+    def __init__(self, db_path, video_dir):
+        self.video_dir = video_dir
+        self._lock = threading.Lock()
+        self._file_locks = {}
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS uploads (
+                    id TEXT PRIMARY KEY,
+                    filename TEXT NOT NULL,
+                    camera_id TEXT NOT NULL,
+                    start_timestamp TEXT NOT NULL,
+                    total_size INTEGER NOT NULL,
+                    complete INTEGER NOT NULL DEFAULT 0,
+                    job_id TEXT,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+                """
+            )
+            self._conn.commit()
+
+    def create(self, filename, camera_id, start_timestamp, total_size):
+        if total_size <= 0:
+            raise UploadError("total_size must be greater than 0")
+        upload_id = uuid.uuid4().hex
+        filename = reserve_video_file(self.video_dir, filename).name
+        now = datetime.now().isoformat()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO uploads (id, filename, camera_id, start_timestamp, total_size, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (upload_id, filename, camera_id, start_timestamp, total_size, now, now)
+            )
+            self._conn.commit()
+        return self.get(upload_id)
+
+    def set_job(self, upload_id, job_id):
+        with self._lock:
+            self._conn.execute("UPDATE uploads SET job_id = ? WHERE id = ?", (job_id, upload_id))
+            self._conn.commit()
+
+    def get(self, upload_id):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM uploads WHERE id = ?", (upload_id,)).fetchone()
+        if not row:
+            raise UploadNotFound(upload_id)
+        session = dict(row)
+        session["complete"] = bool(session["complete"])
+        session["file_path"] = str(self.video_dir / session["filename"])
+        session["offset"] = self._size_on_disk(session["file_path"])
+        return session
+
+    def is_complete(self, upload_id):
+        return self.get(upload_id)["complete"]
+
+    def write_chunk(self, upload_id, offset, data: bytes, sha256=None):
+        session = self.get(upload_id)
+        if sha256 and hashlib.sha256(data).hexdigest() != sha256.lower():
+            raise ChecksumMismatch("Chunk checksum does not match")
+
+        with self._file_lock(upload_id):
+            current = self._size_on_disk(session["file_path"])
+            if session["complete"] or offset != current:
+                raise OffsetMismatch(current, offset)
+            if current + len(data) > session["total_size"]:
+                raise UploadError("Chunk extends past the declared total_size")
+
+            with open(session["file_path"], "r+b") as f:
+                f.seek(offset)
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+
+            complete = current + len(data) == session["total_size"]
+            with self._lock:
+                self._conn.execute(
+                    "UPDATE uploads SET complete = ?, updated_at = ? WHERE id = ?",
+                    (int(complete), datetime.now().isoformat(), upload_id)
+                )
+                self._conn.commit()
+        return self.get(upload_id)
+
+    def _file_lock(self, upload_id):
+        with self._lock:
+            return self._file_locks.setdefault(upload_id, threading.Lock())
+
+    @staticmethod
+    def _size_on_disk(path):
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+
+
+def wait_for_growth(path, is_complete, last_size, poll_interval, stall_timeout):
+    """
+    Blocks until `path` grows past `last_size` or the upload completes.
+    Returns the new size; raises TimeoutError if nothing arrives within `stall_timeout`.
+    """
+    waited = 0.0
+    while True:
+        if is_complete():
+            return os.path.getsize(path)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if size > last_size:
+            return size
+        if waited >= stall_timeout:
+            raise TimeoutError(f"Upload stalled: no new data for {stall_timeout}s")
+        time.sleep(poll_interval)
+        waited += poll_interval
@@ -0,0 +1,145 @@
+import logging
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class ClipCache:
+    """
+    Clip store for CLIPS_DIR.
+
+    - single-flight: concurrent requests for the same clip wait on one build
+    - atomic writes: clips are written to a unique temp file and renamed into place
+    - pre-warming: clips can be built in the background before anyone asks
+    - LRU eviction once the directory grows past `max_bytes`
+    """
+
+    TEMP_MARKER = ".part-"
+
+    def __init__(self, processor, clips_dir, max_bytes, prewarm_workers=2):
+        self.processor = processor
+        self.clips_dir = clips_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._index = OrderedDict() # clip_name -> size, least recently used first
+        self._total_bytes = 0
+        self._executor = ThreadPoolExecutor(max_workers=prewarm_workers, thread_name_prefix="clip-prewarm")
+        self.hits = 0
+        self.misses = 0
+        self._load_index()
+
+    def _load_index(self):
+        entries = []
+        for entry in os.scandir(self.clips_dir):
+            if not entry.is_file():
+                continue
+            if self.TEMP_MARKER in entry.name:
+                # Leftover from a crash mid-write
+                os.remove(entry.path)
+                continue
+            stat = entry.stat()
+            entries.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self._index[name] = size
+            self._total_bytes += size
+
+    def path_for(self, clip_name):
+        return self.clips_dir / clip_name
+
+    def get(self, video_path, start_offset, clip_name, duration=3) -> bool:
+        """Returns True once `clip_name` exists, building it (at most once across threads) if needed."""
+        with self._lock:
+            if clip_name in self._index:
+                self._index.move_to_end(clip_name)
+                self.hits += 1
+                return True
+            future = self._inflight.get(clip_name)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[clip_name] = future
+                self.misses += 1
+
+        if not owner:
+            return future.result()
+
+        try:
+            ok = self._build(video_path, start_offset, clip_name, duration)
+            future.set_result(ok)
+            return ok
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(clip_name, None)
+
+    def touch(self, clip_name) -> bool:
+        """True if `clip_name` is cached; marks it recently used."""
+        with self._lock:
+            if clip_name not in self._index:
+                return False
+            self._index.move_to_end(clip_name)
+            return True
+
+    def prewarm(self, requests):
+        """requests: iterable of (video_path, start_offset, clip_name, duration); built in the background"""
+        for video_path, start_offset, clip_name, duration in requests:
+            with self._lock:
+                if clip_name in self._index or clip_name in self._inflight:
+                    continue
+            self._executor.submit(self._prewarm_one, video_path, start_offset, clip_name, duration)
+
+    def _prewarm_one(self, video_path, start_offset, clip_name, duration):
+        try:
+            self.get(video_path, start_offset, clip_name, duration)
+        except Exception as e:
+            logger.warning("Clip pre-warm failed for %s: %s", clip_name, e)
+
+    def _build(self, video_path, start_offset, clip_name, duration=3):
+        final_path = self.path_for(clip_name)
+        stem, ext = os.path.splitext(clip_name)
+        temp_path = self.path_for(f"{stem}{self.TEMP_MARKER}{uuid.uuid4().hex}{ext}")
+        try:
+            if not self.processor.cut_clip(str(video_path), start_offset, str(temp_path), duration):
+                return False
+            os.replace(temp_path, final_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        size = os.path.getsize(final_path)
+        with self._lock:
+            self._total_bytes += size - self._index.get(clip_name, 0)
+            self._index[clip_name] = size
+            self._index.move_to_end(clip_name)
+            self._evict()
+        return True
+
+    def _evict(self):
+        # Caller holds the lock. Never evict the clip that was just added.
+        while self._total_bytes > self.max_bytes and len(self._index) > 1:
+            name, size = self._index.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(self.path_for(name))
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                "clips": len(self._index),
+                "bytes": self._total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "inflight": len(self._inflight)
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,118 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+
+
+class EmbeddingCache:
+    """
+    Persistent, content-addressed embedding cache (SQLite).
+
+    Keys are sha256(model + text), values are float32 vectors. When the cache
+    holds more than `max_entries` vectors the least recently used ones are evicted.
+    """
+
+    def __init__(self, db_path, max_entries=200000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    vector BLOB NOT NULL,
+                    last_used REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+            self._conn.commit()
+            self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\x00{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys):
+        """Returns {key: vector} for the keys that are cached."""
+        if not keys:
+            return {}
+        found = {}
+        unique = list(set(keys))
+        with self._lock:
+            # SQLite caps bound parameters, so look up in slices
+            for i in range(0, len(unique), 500):
+                chunk = unique[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, k) for k in found]
+                )
+                self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(unique) - len(found)
+        return found
+
+    def put_many(self, items):
+        """items: iterable of (key, vector)"""
+        now = time.time()
+        rows = [(key, array("f", vector).tobytes(), now) for key, vector in items]
+        if not rows:
+            return
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany("INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows)
+            self._count += self._conn.total_changes - before
+            if self._count > self.max_entries:
+                self._evict(self._count - self.max_entries)
+            self._conn.commit()
+
+    def get_or_embed(self, model_key, texts, embed_batch, batch_size=64):
+        """
+        Vectors for `texts` in order. Only unique texts not cached under `model_key`
+        are passed to embed_batch(list_of_texts), `batch_size` at a time.
+        """
+        keys = [self.make_key(model_key, t) for t in texts]
+        vectors = self.get_many(keys)
+
+        # Unique misses, in first-seen order
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors and key not in missing:
+                missing[key] = text
+
+        if missing:
+            miss_keys = list(missing)
+            fresh = []
+            for i in range(0, len(miss_keys), batch_size):
+                chunk = miss_keys[i:i + batch_size]
+                embedded = list(embed_batch([missing[k] for k in chunk]))
+                if len(embedded) != len(chunk):
+                    # zip() would silently misalign or drop vectors; fail here, not as a KeyError later
+                    raise ValueError(f"Embedding provider returned {len(embedded)} vectors for {len(chunk)} texts")
+                fresh.extend(zip(chunk, embedded))
+            self.put_many(fresh)
+            vectors.update(fresh)
+
+        return [vectors[k] for k in keys]
+
+    def _evict(self, n):
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (n,)
+        )
+        self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def stats(self):
+        with self._lock:
+            return {"entries": self._count, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,93 @@
+import numpy as np
+from app.core.config import settings
+
+
+class EventSegmenter:
+    """
+    Groups consecutive captioned frames into events by embedding similarity.
+
+    A frame joins the open event while its vector stays within `threshold` cosine
+    similarity of the event's running centroid, it follows the previous frame by at
+    most `max_gap` seconds, and the event is shorter than `max_span` seconds.
+    Otherwise the open event is closed and a new one starts.
+
+    add() / flush() return closed events as dicts:
+      vector     - pooled (normalized mean) vector of the member frames
+      frames     - [(frame_data, description, vector)] in order
+      rep        - index into frames of the representative (closest to the centroid)
+      start, end - relative offsets of the first and last member frame
+    """
+
+    def __init__(self, threshold=0.88, max_span=60.0, max_gap=5.0):
+        self.threshold = threshold
+        self.max_span = max_span
+        self.max_gap = max_gap
+        self._frames = []
+        self._vectors = []
+        self._sum = None
+        self.events = 0
+        self.frame_count = 0
+
+    def add(self, frame_data, description, vector):
+        """Adds one frame (in time order); returns the event it closed, if any."""
+        unit = self._unit(vector)
+        offset = frame_data['relative_offset']
+        closed = None
+        if self._frames and not self._joins(unit, offset):
+            closed = self.flush()
+
+        # Only metadata is needed from here on; don't hold on to encoded images
+        frame_data = {k: frame_data[k] for k in ("frame_id", "timestamp_str", "relative_offset")}
+        self._frames.append((frame_data, description, vector))
+        self._vectors.append(unit)
+        self._sum = unit.copy() if self._sum is None else self._sum + unit
+        self.frame_count += 1
+        return closed
+
+    def _joins(self, unit, offset):
+        first_offset = self._frames[0][0]['relative_offset']
+        last_offset = self._frames[-1][0]['relative_offset']
+        if offset - last_offset > self.max_gap or offset - first_offset > self.max_span:
+            return False
+        return float(unit @ self._unit(self._sum)) >= self.threshold
+
+    def flush(self):
+        """Closes and returns the open event (None if there is none)."""
+        if not self._frames:
+            return None
+        centroid = self._unit(self._sum)
+        rep = int(np.argmax(np.stack(self._vectors) @ centroid))
+        event = {
+            "vector": centroid.tolist(),
+            "frames": self._frames,
+            "rep": rep,
+            "start": self._frames[0][0]['relative_offset'],
+            "end": self._frames[-1][0]['relative_offset']
+        }
+        self._frames, self._vectors, self._sum = [], [], None
+        self.events += 1
+        return event
+
+    def stats(self):
+        return {
+            "event_frames": self.frame_count,
+            "events": self.events,
+            "frames_per_event": round(self.frame_count / self.events, 2) if self.events else None
+        }
+
+    @staticmethod
+    def _unit(vector):
+        v = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+
+def get_event_segmenter():
+    """Segmenter from settings; None when EVENT_SEGMENTATION is off (one point per frame)."""
+    if not settings.EVENT_SEGMENTATION:
+        return None
+    return EventSegmenter(
+        threshold=settings.EVENT_SIMILARITY_THRESHOLD,
+        max_span=settings.EVENT_MAX_SECONDS,
+        max_gap=settings.EVENT_MAX_GAP
+    )
@@ -0,0 +1,99 @@
+from abc import ABC, abstractmethod
+import cv2
+import numpy as np
+from app.core.config import settings
+from app.services.video_proc import drop_image
+
+
+class ChangeDetector(ABC):
+    """Decides whether two frames are near-duplicates, from their small grayscale thumbnails."""
+
+    @abstractmethod
+    def signature(self, thumb): pass
+    @abstractmethod
+    def is_similar(self, sig_a, sig_b) -> bool: pass
+
+
+class PerceptualHashDetector(ChangeDetector):
+    """64-bit DCT perceptual hash; frames within `max_distance` differing bits are duplicates."""
+
+    def __init__(self, max_distance=6):
+        self.max_distance = max_distance
+
+    def signature(self, thumb):
+        dct = cv2.dct(np.float32(cv2.resize(thumb, (32, 32), interpolation=cv2.INTER_AREA)))
+        low = dct[:8, :8].flatten()
+        # Skip the DC term when picking the median so overall brightness doesn't dominate
+        return np.packbits(low > np.median(low[1:]))
+
+    def is_similar(self, sig_a, sig_b) -> bool:
+        distance = int(np.unpackbits(np.bitwise_xor(sig_a, sig_b)).sum())
+        return distance <= self.max_distance
+
+
+class FrameDiffDetector(ChangeDetector):
+    """Mean absolute pixel difference of downscaled frames (0-255 scale)."""
+
+    def __init__(self, threshold=3.0):
+        self.threshold = threshold
+
+    def signature(self, thumb):
+        return thumb.astype(np.int16)
+
+    def is_similar(self, sig_a, sig_b) -> bool:
+        return float(np.abs(sig_a - sig_b).mean()) <= self.threshold
+
+
+class FrameDeduplicator:
+    """
+    Change-detection stage between frame extraction and captioning.
+
+    Each frame is compared with the last frame that was kept (the reference).
+    Near-duplicates are not yielded; they are appended to the reference's
+    `duplicates` list instead, so the caller can reuse its caption and vector.
+    A fresh frame is forced at least every `max_run` frames.
+    """
+
+    def __init__(self, detector: ChangeDetector, max_run=60):
+        self.detector = detector
+        self.max_run = max_run
+        self.total = 0
+        self.suppressed = 0
+
+    def unique_frames(self, frames):
+        reference = None
+        ref_sig = None
+        for frame in frames:
+            self.total += 1
+            thumb = frame.pop('thumb', None)
+            sig = self.detector.signature(thumb) if thumb is not None else None
+
+            if (
+                reference is not None
+                and sig is not None
+                and ref_sig is not None
+                and len(reference['duplicates']) < self.max_run
+                and self.detector.is_similar(ref_sig, sig)
+            ):
+                drop_image(frame) # Never sent anywhere, don't keep it around
+                reference['duplicates'].append(frame)
+                self.suppressed += 1
+                continue
+
+            frame['duplicates'] = []
+            reference, ref_sig = frame, sig
+            yield frame
+
+    def stats(self):
+        return {"frames_sampled": self.total, "frames_suppressed": self.suppressed}
+
+
+def get_frame_deduplicator():
+    """Builds the configured dedup stage, or None when FRAME_DEDUP_MODE is 'off'."""
+    if settings.FRAME_DEDUP_MODE == "off":
+        return None
+    if settings.FRAME_DEDUP_METHOD == "diff":
+        detector = FrameDiffDetector(settings.FRAME_DEDUP_DIFF_THRESHOLD)
+    else:
+        detector = PerceptualHashDetector(settings.FRAME_DEDUP_HASH_DISTANCE)
+    return FrameDeduplicator(detector, max_run=settings.FRAME_DEDUP_MAX_RUN)
@@ -0,0 +1,145 @@
+import logging
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+
+from app.core.config import settings
+from app.services.video_proc import VideoProcessor
+
+logger = logging.getLogger(__name__)
+
+# Settings the worker processes must share with the parent (they import their own copy of settings)
+_SHARED_SETTINGS = ("FRAME_WIDTH", "FRAME_HEIGHT", "FRAME_JPEG_QUALITY", "FRAME_SAMPLING_MODE")
+
+_worker_processor = None
+
+
+def _init_worker(overrides):
+    global _worker_processor
+    for name, value in overrides.items():
+        setattr(settings, name, value)
+    # One process per core already; OpenCV's own thread pool would only oversubscribe
+    cv2.setNumThreads(1)
+    _worker_processor = VideoProcessor()
+
+
+def _extract_range(video_path, start_timestamp, start_frame, end_frame, interval):
+    """Runs in a worker process: the FrameRecords of one time range, ready to pickle."""
+    records = []
+    for record in _worker_processor.process_video(
+        video_path, start_timestamp, interval=interval, decode_thread=False, frame_range=(start_frame, end_frame)
+    ):
+        record.jpeg = bytes(record.jpeg) # memoryviews don't pickle
+        records.append(record)
+    return records
+
+
+class FrameExtractionPool:
+    """
+    Frame extraction (decode, resize, JPEG encode) on a pool of worker processes.
+
+    A video is split into shards of `shard_seconds`; each shard is decoded in its own
+    process, starting with a seek to the shard's first frame. process_video() has the
+    same contract as VideoProcessor.process_video: FrameRecords in frame order, so
+    captioning, dedup and checkpoints are unaffected. Up to `window` shards per video
+    are in flight; finished shards are handed back in order as soon as all earlier
+    ones are done. Concurrent jobs share the pool, so several uploads spread across
+    the cores instead of competing for the API process's GIL. Videos that can't be
+    sharded are extracted in-process by `processor` (the app's shared one, so its
+    metrics cover them too).
+    """
+
+    def __init__(self, workers, shard_seconds=60.0, window=None, processor=None):
+        self.workers = workers
+        self.processor = processor or VideoProcessor()
+        self.shard_seconds = shard_seconds
+        self.window = window or workers * 2
+        self._executor = None
+        self._lock = threading.Lock()
+        self.shards = 0
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                overrides = {name: getattr(settings, name) for name in _SHARED_SETTINGS}
+                # spawn: forking a process that runs threads (uvicorn, ingestion workers) isn't safe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(overrides,)
+                )
+            return self._executor
+
+    def plan(self, video_path, interval=1, resume_after=None):
+        """
+        [(start_frame, end_frame)] shards covering the video, or None if its length is unknown.
+        The last shard's end_frame is None: CAP_PROP_FRAME_COUNT is only an estimate (often
+        short for VFR or badly muxed files), so it reads to EOF like the in-process path.
+        """
+        cap = cv2.VideoCapture(video_path)
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+        if not fps or total <= 0:
+            return None
+        stride = max(1, int(fps * interval))
+        # Shard boundaries on the sampling grid, so every shard samples the same frames a single pass would
+        shard_frames = stride * max(1, round(self.shard_seconds * fps / stride))
+        start = 0
+        if resume_after is not None:
+            start = VideoProcessor.first_frame_after(resume_after, fps, stride)
+        shards = [(s, s + shard_frames) for s in range(start, total, shard_frames)]
+        if shards:
+            shards[-1] = (shards[-1][0], None)
+        return shards
+
+    def process_video(self, video_path, start_timestamp_str, interval=1, resume_after=None):
+        shards = self.plan(video_path, interval, resume_after)
+        if shards is None:
+            # No frame count in the container (e.g. some streams): extract in-process
+            logger.info("Frame count unknown for %s; extracting in-process", video_path)
+            yield from self.processor.process_video(video_path, start_timestamp_str, interval=interval,
+                                                    resume_after=resume_after)
+            return
+
+        pool = self._pool()
+        remaining = iter(shards)
+        pending = deque()
+        try:
+            for start_frame, end_frame in remaining:
+                pending.append(pool.submit(_extract_range, video_path, start_timestamp_str, start_frame, end_frame, interval))
+                if len(pending) >= self.window:
+                    break
+            while pending:
+                records = pending.popleft().result()
+                # Keep the window full while the caller works through this shard
+                next_shard = next(remaining, None)
+                if next_shard is not None:
+                    pending.append(pool.submit(_extract_range, video_path, start_timestamp_str, *next_shard, interval))
+                self.shards += 1
+                yield from records
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+def get_frame_pool(processor=None):
+    """Process pool from settings; None when INGEST_PROCESS_WORKERS is 0 (extract in the API process)."""
+    if settings.INGEST_PROCESS_WORKERS <= 0:
+        return None
+    return FrameExtractionPool(
+        settings.INGEST_PROCESS_WORKERS,
+        shard_seconds=settings.INGEST_SHARD_SECONDS,
+        window=settings.INGEST_SHARD_WINDOW,
+        processor=processor
+    )
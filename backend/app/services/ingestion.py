@@ -0,0 +1,225 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from app.core.config import settings
+from app.services.frame_dedup import get_frame_deduplicator
+from app.services.event_segmenter import get_event_segmenter
+
+logger = logging.getLogger(__name__)
+
+
+class IngestionPipeline:
+    """Frame extraction -> captioning -> embedding -> Qdrant, for one stored video."""
+
+    def __init__(self, llm, qdrant, processor, segment_index=None, search_cache=None, frame_pool=None):
+        self.llm = llm
+        self.qdrant = qdrant
+        self.processor = processor
+        # Optional FrameExtractionPool: finished files are decoded on worker processes
+        self.frame_pool = frame_pool
+        self.segment_index = segment_index
+        self.search_cache = search_cache
+        self.dedup_mode = settings.FRAME_DEDUP_MODE # off | reuse | skip
+
+    def run(self, file_path, filename, camera_id, start_timestamp, report_progress=None, frames=None, resume_after=None,
+            flush_interval=None):
+        """
+        frames: optional frame generator (e.g. from process_growing_video);
+                defaults to process_video over the finished file.
+                file_path may be None with frames from a live stream (nothing stored).
+        resume_after: relative_offset of the last frame already committed by a previous
+                      attempt (the job checkpoint); extraction restarts just after it.
+        flush_interval: for live sources, seconds after which captions are embedded and
+                        written even if the batches aren't full (checked on a timer).
+        """
+        frames_seen = 0
+        if frames is None:
+            frames_total = self.processor.estimate_frame_count(str(file_path))
+            extractor = self.frame_pool or self.processor
+            frames_gen = extractor.process_video(str(file_path), start_timestamp, resume_after=resume_after)
+            if resume_after is not None:
+                frames_seen = self.processor.estimate_frames_before(str(file_path), resume_after)
+        else:
+            frames_total = None
+            frames_gen = frames
+        if report_progress:
+            report_progress(frames_seen, frames_total)
+
+        # Frames are streamed to Qdrant in bounded batches while captioning continues;
+        # every acknowledged batch moves the job checkpoint forward
+        def on_commit(watermark, committed):
+            # New frames are searchable now: cached searches over this camera are stale
+            if self.search_cache is not None:
+                self.search_cache.bump(camera_id)
+            if report_progress and watermark is not None:
+                report_progress(checkpoint=watermark)
+
+        writer = self.qdrant.writer(on_commit=on_commit, max_delay=flush_interval)
+
+        # Parse start_timestamp to datetime
+        try:
+            video_start_dt = datetime.fromisoformat(start_timestamp)
+        except Exception as e:
+            logger.warning("Error parsing start_timestamp %s: %s", start_timestamp, e)
+            video_start_dt = datetime.now() # Fallback
+
+        # Static URL for local playback; stream frames have no file behind them
+        public_url = f"/static/videos/{filename}" if file_path is not None else None
+
+        captioned = []
+        captioned_since = None
+        # [frame_data, description, vector, duplicates emitted] of the last embedded reference frame
+        open_ref = []
+        segmenter = get_event_segmenter()
+        # The caption loop and the flush ticker (live sources) share the state above and the writer
+        state_lock = threading.Lock()
+
+        def write_event(event):
+            # Frame-level detail first; only the event point moves the checkpoint (see QdrantBatchWriter)
+            if settings.EVENT_KEEP_FRAMES:
+                for frame_data, description, vector in event['frames']:
+                    metadata = self.build_metadata(frame_data, description, camera_id, filename, video_start_dt, public_url)
+                    metadata['level'] = "frame"
+                    writer.add(vector, metadata)
+            writer.add(event['vector'], self.build_event_metadata(event, camera_id, filename, video_start_dt, public_url))
+
+        def emit(frame_data, description, vector):
+            if segmenter is None:
+                writer.add(vector, self.build_metadata(frame_data, description, camera_id, filename, video_start_dt, public_url))
+                return
+            event = segmenter.add(frame_data, description, vector)
+            if event is not None:
+                write_event(event)
+
+        def finish_reference():
+            # Near-duplicates found since the reference was embedded reuse its caption and vector.
+            # Its list keeps growing until the next reference is extracted, so this may run several times
+            nonlocal frames_seen
+            if not open_ref:
+                return
+            frame_data, description, vector, emitted = open_ref
+            duplicates = (frame_data.get('duplicates') or [])[emitted:]
+            if self.dedup_mode == "reuse":
+                for dup in duplicates:
+                    emit(dup, description, vector)
+            open_ref[3] = emitted + len(duplicates)
+            frames_seen += len(duplicates)
+
+        def embed_pending():
+            nonlocal frames_seen
+            # One embeddings call for the whole group of captions
+            vectors = self.llm.get_embeddings([description for _, description in captioned])
+            for (frame_data, description), vector in zip(captioned, vectors):
+                # The previous reference's run of duplicates ends where this frame begins
+                finish_reference()
+                emit(frame_data, description, vector)
+                open_ref[:] = [frame_data, description, vector, 0]
+                frames_seen += 1
+            captioned.clear()
+            if report_progress:
+                report_progress(frames_seen)
+
+        def flush_due():
+            # Partial batches go out after flush_interval instead of waiting for a full one,
+            # so a quiet live camera still becomes searchable within seconds
+            with state_lock:
+                finish_reference()
+                if captioned and time.monotonic() - captioned_since >= flush_interval:
+                    embed_pending()
+                    writer.flush() # These captions already waited flush_interval
+                else:
+                    writer.flush_if_due()
+
+        stop_ticker = threading.Event()
+
+        def tick():
+            while not stop_ticker.wait(flush_interval / 2):
+                try:
+                    flush_due()
+                except Exception as e:
+                    # The caption loop hits the same error on its next batch and fails the run
+                    logger.warning("Timed flush failed for %s: %s", filename, e)
+
+        dedup = get_frame_deduplicator()
+        if dedup is not None:
+            frames_gen = dedup.unique_frames(frames_gen)
+
+        with writer:
+            ticker = None
+            if flush_interval:
+                ticker = threading.Thread(target=tick, name=f"ingest-flush-{camera_id}", daemon=True)
+                ticker.start()
+            try:
+                # Captions are produced concurrently by the provider but arrive in frame order
+                for frame_data, description in self.llm.caption_frames(frames_gen):
+                    with state_lock:
+                        if not captioned:
+                            captioned_since = time.monotonic()
+                        captioned.append((frame_data, description))
+                        if len(captioned) >= settings.EMBEDDING_BATCH_SIZE:
+                            embed_pending()
+            finally:
+                stop_ticker.set()
+                if ticker is not None:
+                    ticker.join()
+            if captioned:
+                embed_pending()
+            finish_reference()
+            if segmenter is not None:
+                event = segmenter.flush()
+                if event is not None:
+                    write_event(event)
+        indexed_count = writer.committed if segmenter is None else segmenter.frame_count
+
+        # Keyframe byte-offset index for range streaming (file is complete at this point)
+        if self.segment_index is not None and file_path is not None:
+            try:
+                browser_safe = self.processor.get_codec(str(file_path)) in self.processor.BROWSER_SAFE_FOURCC
+                self.segment_index.build(str(file_path), is_browser_safe=browser_safe)
+            except Exception as e:
+                logger.warning("Segment index failed for %s: %s", filename, e)
+
+        result = {"frames_indexed": indexed_count}
+        if resume_after is not None:
+            result["resumed_after"] = resume_after
+        if segmenter is not None:
+            result.update(segmenter.stats())
+        if dedup is not None:
+            result.update(dedup.stats())
+            logger.info("Dedup for %s: suppressed %d/%d frames", filename, dedup.suppressed, dedup.total)
+        return result
+
+    @staticmethod
+    def build_metadata(frame_data, description, camera_id, filename, video_start_dt, public_url):
+        # Calculate Clock Time Seconds (0-86400)
+        frame_offset = frame_data['relative_offset']
+        frame_dt = video_start_dt + timedelta(seconds=frame_offset)
+        clock_time_seconds = frame_dt.hour * 3600 + frame_dt.minute * 60 + frame_dt.second
+
+        return {
+            "camera_id": camera_id,
+            "video_id": filename,
+            "timestamp_str": frame_data['timestamp_str'],
+            "display_time": frame_data['timestamp_str'],
+            "relative_offset": frame_data['relative_offset'],
+            "clock_time_seconds": clock_time_seconds,
+            "description": description,
+            "video_path": filename, # Store filename
+            "frame_id": frame_data['frame_id'],
+            "video_url": public_url # Direct link for full video playback
+        }
+
+    @classmethod
+    def build_event_metadata(cls, event, camera_id, filename, video_start_dt, public_url):
+        # The representative frame supplies caption, timestamps and clip offset
+        rep_frame, rep_description, _ = event['frames'][event['rep']]
+        metadata = cls.build_metadata(rep_frame, rep_description, camera_id, filename, video_start_dt, public_url)
+        metadata.update({
+            "frame_id": f"{event['frames'][0][0]['frame_id']}_event",
+            "level": "event",
+            "event_start": event['start'],
+            "event_end": event['end'],
+            "frame_count": len(event['frames'])
+        })
+        return metadata
@@ -0,0 +1,221 @@
+import logging
+import re
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+SEARCH = "SEARCH"
+CHAT = "CHAT"
+
+# Small-talk that never needs the footage
+CHAT_PATTERNS = [
+    r"^(hi|hello|hey|yo|hiya|greetings|good (morning|afternoon|evening))\b[\s!.,?]*(there|again)?[\s!.?]*$",
+    r"^(thanks|thank you|thx|cheers|ok|okay|cool|great|nice|bye|goodbye)\b[\s\w!.,]{0,20}$",
+    r"\b(who|what) are you\b",
+    r"\byour name\b",
+    r"\bwhat can you do\b",
+    r"\bhow are you\b",
+    r"\bhow does this (app|system|tool) work\b",
+]
+
+# Phrasing that only makes sense as a question about the footage
+SEARCH_PATTERNS = [
+    r"\b(find|show|search|locate|look(ing)? for|spot|track|play|pull up)\b",
+    r"\b(did|does|was|were|is) (there|anyone|anybody|someone|somebody)\b",
+    r"\b(when|where) (did|does|was|were|is)\b",
+    r"\b(any|every) (one|body|person|people|car|vehicle|truck|van|bike)\b",
+    r"\b(person|people|man|woman|men|women|kid|child|guy|someone|car|cars|vehicle|truck|van|bus|bike|bicycle|motorcycle|"
+    r"dog|cat|package|parcel|bag|backpack|license plate|plate|door|gate|entrance|parking|intruder|thief|delivery)s?\b",
+    r"\b(red|blue|green|black|white|grey|gray|yellow|orange|silver|brown|purple|pink)\b",
+    r"\b(cam|camera)\s*\d+\b",
+    r"\b\d{1,2}(:\d{2})?\s*(am|pm)\b|\b(after|before|between|around) \d",
+    r"\b(yesterday|last night|this morning)\b",
+]
+
+# Seed examples for the embedding classifier
+SEED_EXAMPLES = {
+    SEARCH: [
+        "show me the red car turning left",
+        "did anyone enter the shop after 9 pm",
+        "find the man in the blue jacket",
+        "a delivery driver dropping off a package",
+        "someone climbing over the fence",
+        "when did the white van arrive",
+        "people walking near the entrance",
+        "anything unusual in the parking lot last night",
+        "a dog running across the street",
+        "person carrying a large box",
+        "who left the door open",
+        "car with headlights on in the driveway",
+    ],
+    CHAT: [
+        "hello",
+        "hi there, how are you",
+        "what is your name",
+        "what can you do",
+        "thanks, that was helpful",
+        "tell me a joke",
+        "how does this system work",
+        "what's the weather like today",
+        "who built you",
+        "can you explain what video rag means",
+        "good morning",
+        "give me a recipe for pancakes",
+    ],
+}
+
+
+class IntentRouter:
+    """
+    Decides SEARCH vs CHAT for a query without an LLM call in the common case.
+
+    1. Regex fast path: obvious greetings / obvious footage questions.
+    2. Nearest-centroid classifier over the query embedding. Search needs that
+       embedding anyway and the embedding cache keeps it, so this tier is nearly free.
+    3. The LLM's check_intent, only when the classifier is unsure. Its answers are
+       fed back as labelled examples, so the classifier improves with use.
+    """
+
+    def __init__(self, llm, confidence_threshold=0.6, use_patterns=True, use_classifier=True, max_learned=500):
+        self.llm = llm
+        self.confidence_threshold = confidence_threshold
+        self.use_patterns = use_patterns
+        self.use_classifier = use_classifier
+        self._chat_re = [re.compile(p, re.IGNORECASE) for p in CHAT_PATTERNS]
+        self._search_re = [re.compile(p, re.IGNORECASE) for p in SEARCH_PATTERNS]
+
+        self._lock = threading.Lock()
+        self._examples = None # {intent: list of seed unit vectors}; embedded lazily
+        self._learned = {SEARCH: deque(maxlen=max_learned), CHAT: deque(maxlen=max_learned)}
+        self._centroids = None
+        self._stats = {"regex": 0, "classifier": 0, "llm": 0, SEARCH: 0, CHAT: 0}
+        self._seconds = {"regex": 0.0, "classifier": 0.0, "llm": 0.0}
+
+    def classify(self, text: str) -> str:
+        return self.route(text)[0]
+
+    def route(self, text: str):
+        """Returns (intent, tier, confidence)."""
+        start = time.perf_counter()
+        intent, tier, confidence = self._route(text)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._stats[tier] += 1
+            self._stats[intent] += 1
+            self._seconds[tier] += elapsed
+        return intent, tier, confidence
+
+    def _route(self, text):
+        normalized = " ".join(text.split())
+        intent = self._match_patterns(normalized) if self.use_patterns else None
+        if intent:
+            return intent, "regex", 1.0
+
+        if self.use_classifier:
+            try:
+                intent, confidence = self._predict(normalized)
+                if confidence >= self.confidence_threshold:
+                    return intent, "classifier", confidence
+            except Exception as e:
+                logger.warning("Intent classifier unavailable, using LLM: %s", e)
+
+        intent = self._ask_llm(normalized)
+        if self.use_classifier:
+            self._learn(normalized, intent)
+        return intent, "llm", 1.0
+
+    def _match_patterns(self, text):
+        chat = any(p.search(text) for p in self._chat_re)
+        search = any(p.search(text) for p in self._search_re)
+        if chat and not search:
+            return CHAT
+        if search and not chat:
+            return SEARCH
+        return None
+
+    def _predict(self, text):
+        centroids = self._get_centroids()
+        vector = self._unit(self.llm.get_embedding(text))
+        search_sim = float(vector @ centroids[SEARCH])
+        chat_sim = float(vector @ centroids[CHAT])
+        # Logistic on the similarity margin; cosine gaps between classes are small, hence the scale
+        p_search = 1.0 / (1.0 + float(np.exp(-(search_sim - chat_sim) * 40.0)))
+        intent = SEARCH if p_search >= 0.5 else CHAT
+        confidence = abs(p_search - 0.5) * 2
+        return intent, confidence
+
+    def _ask_llm(self, text):
+        answer = (self.llm.check_intent(text) or "").upper()
+        return CHAT if CHAT in answer and SEARCH not in answer else SEARCH
+
+    def _get_centroids(self):
+        with self._lock:
+            if self._centroids is not None:
+                return self._centroids
+        # Seed embeddings go through the provider's (persistent) embedding cache
+        examples = {}
+        for intent, texts in SEED_EXAMPLES.items():
+            vectors = self.llm.get_embeddings(texts)
+            examples[intent] = [self._unit(v) for v in vectors]
+        with self._lock:
+            if self._examples is None:
+                self._examples = examples
+                self._centroids = self._compute_centroids()
+            return self._centroids
+
+    def _learn(self, text, intent):
+        with self._lock:
+            if self._examples is None:
+                return
+        try:
+            vector = self._unit(self.llm.get_embedding(text))
+        except Exception:
+            return
+        with self._lock:
+            self._learned[intent].append(vector)
+            self._centroids = self._compute_centroids()
+
+    def _compute_centroids(self):
+        # Caller holds the lock
+        return {
+            intent: self._unit(np.mean(seeds + list(self._learned[intent]), axis=0))
+            for intent, seeds in self._examples.items()
+        }
+
+    @staticmethod
+    def _unit(vector):
+        v = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    def stats(self):
+        with self._lock:
+            total = self._stats["regex"] + self._stats["classifier"] + self._stats["llm"]
+            return {
+                "total": total,
+                "routes": {tier: self._stats[tier] for tier in ("regex", "classifier", "llm")},
+                "intents": {SEARCH: self._stats[SEARCH], CHAT: self._stats[CHAT]},
+                "llm_fallback_rate": round(self._stats["llm"] / total, 4) if total else None,
+                "avg_ms": {
+                    tier: round(self._seconds[tier] / self._stats[tier] * 1000, 2) if self._stats[tier] else None
+                    for tier in self._seconds
+                },
+                "learned_examples": sum(len(v) for v in self._learned.values())
+            }
+
+
+def get_intent_router(llm):
+    """Local routing tier from settings; INTENT_ROUTING=llm keeps every decision on the LLM."""
+    if settings.INTENT_ROUTING == "llm":
+        return IntentRouter(llm, use_patterns=False, use_classifier=False)
+    return IntentRouter(
+        llm,
+        confidence_threshold=settings.INTENT_CONFIDENCE_THRESHOLD,
+        use_classifier=settings.INTENT_EMBEDDING_CLASSIFIER
+    )
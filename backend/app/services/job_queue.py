@@ -0,0 +1,273 @@
+import json
+import logging
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueue:
+    """
+    Durable local job queue backed by SQLite with a small pool of worker threads.
+
+    Jobs survive restarts: anything left 'running' when the process died is put
+    back to 'queued' on start() and picked up again by the workers.
+
+    Jobs submitted with a `lane` bypass the shared pool: each lane gets its own
+    worker thread, started on demand and gone once the lane is empty, that runs the
+    lane's jobs in order. Long jobs in one lane (a camera's live segment, an upload
+    the client is still sending) never hold up another lane or the shared pool.
+    """
+
+    STATUSES = ("queued", "running", "completed", "failed")
+
+    def __init__(self, db_path, handler, num_workers=2, poll_interval=2.0):
+        """
+        handler: callable(job: dict, report_progress) -> dict (stored as job result)
+        report_progress: callable(frames_done=None, frames_total=None, checkpoint=None)
+        """
+        self.db_path = str(db_path)
+        self.handler = handler
+        self.num_workers = num_workers
+        self.poll_interval = poll_interval
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition()
+        self._stop = threading.Event()
+        self._workers = []
+        self._lanes = {}
+        self._started = False
+
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    frames_done INTEGER NOT NULL DEFAULT 0,
+                    frames_total INTEGER,
+                    result TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)")
+            # Added after the first release; older databases need the column
+            columns = {r["name"] for r in self._conn.execute("PRAGMA table_info(jobs)")}
+            if "checkpoint" not in columns:
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN checkpoint REAL")
+            if "lane" not in columns:
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN lane TEXT")
+            self._conn.commit()
+
+    # --- Lifecycle ---
+    def start(self):
+        # Resume jobs interrupted by a restart
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', updated_at = ? WHERE status = 'running'",
+                (self._now(),)
+            )
+            self._conn.commit()
+        if cur.rowcount:
+            logger.info("Resuming %d interrupted ingestion job(s)", cur.rowcount)
+
+        self._stop.clear()
+        self._started = True
+        for i in range(self.num_workers):
+            t = threading.Thread(target=self._worker_loop, name=f"ingest-worker-{i}", daemon=True)
+            t.start()
+            self._workers.append(t)
+        with self._lock:
+            lanes = [r["lane"] for r in self._conn.execute(
+                "SELECT DISTINCT lane FROM jobs WHERE status = 'queued' AND lane IS NOT NULL"
+            )]
+        for lane in lanes:
+            self._start_lane(lane)
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for t in self._workers + list(self._lanes.values()):
+            t.join(timeout=timeout)
+        self._workers = []
+        self._lanes = {}
+        self._started = False
+
+    # --- Public API ---
+    def submit(self, payload: dict, lane=None) -> str:
+        job_id = uuid.uuid4().hex
+        now = self._now()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, payload, lane, created_at, updated_at) VALUES (?, 'queued', ?, ?, ?, ?)",
+                (job_id, json.dumps(payload), lane, now, now)
+            )
+            self._conn.commit()
+        if lane is not None and self._started:
+            self._start_lane(lane)
+        with self._wakeup:
+            # Lane workers only take their own lane's jobs, so wake everyone
+            self._wakeup.notify_all()
+        return job_id
+
+    def get(self, job_id: str):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def list(self, status=None, limit=50):
+        query = "SELECT * FROM jobs"
+        params = []
+        if status:
+            query += " WHERE status = ?"
+            params.append(status)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [self._row_to_dict(r) for r in rows]
+
+    def counts(self):
+        """{status: number of jobs}"""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {r["status"]: r["n"] for r in rows}
+
+    def finished_before(self, cutoff: str, limit=100):
+        """Completed or failed jobs last updated before `cutoff` (ISO timestamp), oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs WHERE status IN ('completed', 'failed') AND updated_at < ? "
+                "ORDER BY updated_at LIMIT ?",
+                (cutoff, limit)
+            ).fetchall()
+        return [self._row_to_dict(r) for r in rows]
+
+    def delete(self, job_id: str) -> bool:
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            self._conn.commit()
+        return bool(cur.rowcount)
+
+    def retry(self, job_id: str) -> bool:
+        """Re-queues a failed job; it resumes from its checkpoint."""
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', updated_at = ? WHERE id = ? AND status = 'failed'",
+                (self._now(), job_id)
+            )
+            self._conn.commit()
+        if cur.rowcount:
+            lane = self.get(job_id)["lane"]
+            if lane is not None and self._started:
+                self._start_lane(lane)
+            with self._wakeup:
+                self._wakeup.notify_all()
+        return bool(cur.rowcount)
+
+    def update_progress(self, job_id: str, frames_done=None, frames_total=None, checkpoint=None):
+        """
+        checkpoint: relative_offset of the last frame durably indexed; a resumed job
+        continues after it instead of starting over.
+        """
+        fields = {"frames_done": frames_done, "frames_total": frames_total, "checkpoint": checkpoint}
+        updates = [(k, v) for k, v in fields.items() if v is not None]
+        assignments = ", ".join(f"{k} = ?" for k, _ in updates)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE jobs SET {assignments + ', ' if assignments else ''}updated_at = ? WHERE id = ?",
+                [v for _, v in updates] + [self._now(), job_id]
+            )
+            self._conn.commit()
+
+    # --- Internals ---
+    def _start_lane(self, lane):
+        with self._lock:
+            if lane in self._lanes:
+                return
+            t = threading.Thread(target=self._worker_loop, args=(lane,), name=f"ingest-lane-{lane}", daemon=True)
+            self._lanes[lane] = t
+        t.start()
+
+    def _retire_lane(self, lane):
+        """Drops an empty lane's worker; False if a job arrived in the meantime."""
+        with self._lock:
+            queued = self._conn.execute(
+                "SELECT 1 FROM jobs WHERE status = 'queued' AND lane = ? LIMIT 1", (lane,)
+            ).fetchone()
+            if queued:
+                return False
+            self._lanes.pop(lane, None)
+            return True
+
+    def _claim_next(self, lane=None):
+        """Atomically moves the oldest queued job (of `lane`; None = the shared pool) to 'running' and returns it."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' AND lane IS ? ORDER BY created_at LIMIT 1", (lane,)
+            ).fetchone()
+            if not row:
+                return None
+            self._conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, error = NULL, updated_at = ? WHERE id = ?",
+                (self._now(), row["id"])
+            )
+            self._conn.commit()
+        job = self._row_to_dict(row)
+        job["status"] = "running"
+        job["attempts"] += 1
+        return job
+
+    def _finish(self, job_id, status, result=None, error=None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE id = ?",
+                (status, json.dumps(result) if result is not None else None, error, self._now(), job_id)
+            )
+            self._conn.commit()
+
+    def _worker_loop(self, lane=None):
+        while not self._stop.is_set():
+            job = self._claim_next(lane)
+            if job is None:
+                if lane is not None and self._retire_lane(lane):
+                    return
+                with self._wakeup:
+                    self._wakeup.wait(timeout=self.poll_interval)
+                continue
+
+            job_id = job["id"]
+
+            def report_progress(frames_done=None, frames_total=None, checkpoint=None, _job_id=job_id):
+                self.update_progress(_job_id, frames_done, frames_total, checkpoint)
+
+            try:
+                result = self.handler(job, report_progress)
+                self._finish(job_id, "completed", result=result)
+            except Exception as e:
+                logger.exception("Ingestion job %s failed: %s", job_id, e)
+                self._finish(job_id, "failed", error=str(e))
+
+    @staticmethod
+    def _row_to_dict(row):
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"]) if job.get("payload") else {}
+        job["result"] = json.loads(job["result"]) if job.get("result") else None
+        total = job.get("frames_total")
+        job["progress"] = round(job["frames_done"] / total, 4) if total else None
+        return job
+
+    @staticmethod
+    def _now():
+        return datetime.now().isoformat()
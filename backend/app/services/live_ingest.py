@@ -0,0 +1,579 @@
+import logging
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from pathlib import Path
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import cv2
+
+from app.core.config import settings
+from app.services import metrics
+from app.services.job_queue import JobQueue
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+
+def bound_lag(frames, start_dt, max_lag, source):
+    """
+    Passes frames through, skipping those already more than `max_lag` seconds behind
+    real time when they are requested. Captioning pulls frames only as fast as it has
+    room for, so when the LLM tier falls behind the backlog is shed here instead of
+    growing without bound; the index stays at most ~max_lag behind the camera.
+    """
+    for frame in frames:
+        frame_dt = start_dt + timedelta(seconds=frame['relative_offset'])
+        lag = (datetime.now() - frame_dt).total_seconds()
+        metrics.LIVE_LAG.set(round(max(lag, 0.0), 3), source=source)
+        if max_lag is not None and lag > max_lag:
+            metrics.LIVE_DROPPED.inc(source=source, reason="lag")
+            continue
+        yield frame
+
+
+# --- Watch folder ---
+
+def list_segments(directory):
+    """Segment files directly inside `directory`, in name order (NVRs name segments by start time)."""
+    extensions = {e.strip().lower() for e in settings.LIVE_SEGMENT_EXTENSIONS.split(",") if e.strip()}
+    try:
+        entries = [
+            e for e in os.scandir(directory)
+            if e.is_file() and not e.name.startswith(".") and os.path.splitext(e.name)[1].lower() in extensions
+        ]
+    except FileNotFoundError:
+        return []
+    return [Path(e.path) for e in sorted(entries, key=lambda e: e.name)]
+
+
+def segment_complete(path, settle=None):
+    """A segment is finished once a newer one exists next to it or it hasn't changed for `settle` seconds."""
+    path = Path(path)
+    if settle is None:
+        settle = settings.LIVE_SEGMENT_SETTLE
+    if any(other.name > path.name for other in list_segments(path.parent)):
+        return True
+    try:
+        return time.time() - path.stat().st_mtime >= settle
+    except FileNotFoundError:
+        # Rotated away by the NVR: index whatever the VIDEO_DIR link or copy still holds
+        return True
+
+
+def segment_ready(path, stored_path):
+    """segment_complete(), and for a segment copied into VIDEO_DIR, every byte has been copied."""
+    if not segment_complete(path):
+        return False
+    try:
+        source, stored = os.stat(path), os.stat(stored_path)
+    except FileNotFoundError:
+        return True
+    return os.path.samestat(source, stored) or stored.st_size >= source.st_size
+
+
+def segment_start(name, fallback, tz=None):
+    """
+    Start time from a segment name via LIVE_SEGMENT_TIME_REGEX (Y, M, D, h, m, s groups), else `fallback`.
+    The name is read as wall time in `tz` (None: this host's zone) and returned as naive
+    host-local time, like every other timestamp the pipeline stores and compares.
+    """
+    match = re.search(settings.LIVE_SEGMENT_TIME_REGEX, name)
+    if match:
+        try:
+            start = datetime(*(int(g) for g in match.groups()[:6]))
+        except (TypeError, ValueError):
+            return fallback
+        if tz is not None:
+            start = start.replace(tzinfo=tz).astimezone().replace(tzinfo=None)
+        return start
+    return fallback
+
+
+class WatchFolder:
+    """
+    Polls a directory of rolling NVR segments and submits every new segment as an
+    ingestion job as soon as it appears, while it is still being written.
+
+    Files directly in `root` belong to `default_camera`; each subdirectory is a camera
+    named after it. Jobs are submitted to a per-camera lane (backfill to a lane of its
+    own), so each camera's live segments are followed by a dedicated worker.
+
+    A segment is hard-linked into VIDEO_DIR as `<camera>_<file name>`, so clips and
+    range streaming treat it like an upload and it outlives the NVR's rotation.
+    Across filesystems it is copied instead, and every scan appends what the recorder
+    wrote since. The stored file also marks the segment as submitted across restarts.
+    The job follows the growing file until segment_ready(), and its checkpoint lets
+    it resume after a restart. Segments still being written when found are `live`: their frames
+    go through bound_lag; finished ones (backfill, or NVRs that move segments in once
+    closed) are indexed in full.
+    """
+
+    def __init__(self, root, submit, default_camera="live", poll_interval=2.0, backfill=True, timezone=None):
+        self.root = Path(root)
+        self.submit = submit
+        self.timezone = timezone
+        self.default_camera = default_camera
+        self.poll_interval = poll_interval
+        self.backfill = backfill
+        self.submitted = 0
+        self._scanned = False
+        self._skipped = set()
+        self._copying = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def cameras(self):
+        yield self.default_camera, self.root
+        try:
+            subdirs = sorted(e for e in os.scandir(self.root) if e.is_dir() and not e.name.startswith("."))
+        except FileNotFoundError:
+            return
+        for entry in subdirs:
+            yield entry.name, Path(entry.path)
+
+    @staticmethod
+    def stored_name(camera_id, path):
+        return f"{camera_id}_{path.name}"
+
+    def scan(self):
+        """Submits jobs for segments not seen before; returns their job ids."""
+        first_scan = not self._scanned
+        self._scanned = True
+        self._sync_copies()
+        job_ids = []
+        for camera_id, directory in self.cameras():
+            for path in list_segments(directory):
+                stored = settings.VIDEO_DIR / self.stored_name(camera_id, path)
+                if os.path.lexists(stored):
+                    if first_scan and not segment_ready(path, stored):
+                        # Copy interrupted by a restart
+                        self._copying[stored] = path
+                    continue
+                if path in self._skipped:
+                    continue
+                live = not segment_complete(path)
+                if first_scan and not live and not self.backfill:
+                    self._skipped.add(path)
+                    continue
+                job_ids.append(self._submit_segment(camera_id, path, stored, live))
+        return job_ids
+
+    def _store(self, path, stored):
+        try:
+            os.link(path, stored)
+        except OSError:
+            open(stored, "xb").close()
+            self._copying[stored] = path
+            self._copy_new_bytes(path, stored)
+
+    @staticmethod
+    def _copy_new_bytes(path, stored):
+        with open(path, "rb") as src, open(stored, "ab") as dst:
+            src.seek(os.path.getsize(stored))
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+
+    def _sync_copies(self):
+        """Appends newly recorded bytes to copied segments; a copy is done once its segment is."""
+        for stored, path in list(self._copying.items()):
+            # Checked before copying, so the recorder's last write is in this pass
+            complete = segment_complete(path)
+            try:
+                self._copy_new_bytes(path, stored)
+            except FileNotFoundError:
+                complete = True
+            except OSError:
+                logger.exception("Copying segment %s failed", path)
+                continue
+            if complete:
+                del self._copying[stored]
+
+    def _submit_segment(self, camera_id, path, stored, live):
+        self._store(path, stored)
+        start_dt = segment_start(path.name, fallback=datetime.now().replace(microsecond=0), tz=self.timezone)
+        job_id = self.submit({
+            "file_path": str(stored),
+            "filename": stored.name,
+            "camera_id": camera_id,
+            "start_timestamp": start_dt.isoformat(),
+            "watch_path": str(path),
+            "live": live
+        }, lane=camera_id if live else f"{camera_id}:backfill")
+        self.submitted += 1
+        logger.info("Watching %s segment %s (%s)", camera_id, path.name, "live" if live else "backfill",
+                    extra={"job_id": job_id})
+        return job_id
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.scan()
+            except Exception:
+                logger.exception("Watch folder scan failed: %s", self.root)
+            self._stop.wait(self.poll_interval)
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="live-watch", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+
+# --- Streams ---
+
+class FrameBuffer:
+    """Bounded hand-off from a stream reader to captioning: when full, the oldest frame is dropped."""
+
+    def __init__(self, max_frames, source):
+        self.max_frames = max_frames
+        self.source = source
+        self.dropped = 0
+        self._frames = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def put(self, frame):
+        with self._cond:
+            if len(self._frames) >= self.max_frames:
+                self._frames.popleft()
+                self.dropped += 1
+                metrics.LIVE_DROPPED.inc(source=self.source, reason="buffer")
+            self._frames.append(frame)
+            self._cond.notify()
+
+    def close(self, discard=False):
+        with self._cond:
+            self._closed = True
+            if discard:
+                self._frames.clear()
+            self._cond.notify_all()
+
+    @property
+    def exhausted(self):
+        with self._cond:
+            return self._closed and not self._frames
+
+    def __iter__(self):
+        while True:
+            with self._cond:
+                while not self._frames and not self._closed:
+                    self._cond.wait()
+                if not self._frames:
+                    return
+                frame = self._frames.popleft()
+            yield frame
+
+
+class StreamSource:
+    """
+    One camera read through cv2.VideoCapture: an RTSP/HTTP URL, a device index, or a
+    local file standing in for a camera (played back at its own frame rate).
+
+    A reader thread keeps draining the capture, since a stalled reader makes RTSP
+    servers drop the connection, and samples one frame per `interval` seconds into a
+    FrameBuffer. An ingest thread runs the pipeline over each connection as one video
+    named `<camera>_live_<start time>`, so a reconnect starts a new one. Streams are
+    index-only: nothing is recorded, so their results come without clips.
+    """
+
+    def __init__(self, camera_id, source, processor, ingestion, interval=1.0, max_lag=60.0, max_pending=32,
+                 flush_interval=2.0):
+        self.camera_id = camera_id
+        self.source = source
+        self.processor = processor
+        self.ingestion = ingestion
+        self.interval = interval
+        self.max_lag = max_lag
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+        self.is_file = os.path.isfile(source)
+        self.frames_read = 0
+        self.connections = 0
+        self._sessions = queue.Queue()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def _open(self):
+        return cv2.VideoCapture(int(self.source) if self.source.isdigit() else self.source)
+
+    def _read_loop(self):
+        backoff = 1.0
+        while not self._stop.is_set():
+            cap = self._open()
+            if not cap.isOpened():
+                cap.release()
+                logger.warning("Stream %s unavailable; retrying in %.0fs", self.camera_id, backoff)
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 30.0)
+                continue
+            backoff = 1.0
+            self.connections += 1
+            try:
+                self._read_connection(cap)
+            except Exception:
+                logger.exception("Stream %s failed", self.camera_id)
+            finally:
+                cap.release()
+
+    def _read_connection(self, cap):
+        start_dt = datetime.now()
+        video_name = f"{self.camera_id}_live_{start_dt:%Y%m%d-%H%M%S}"
+        buffer = FrameBuffer(self.max_pending, self.camera_id)
+        self._sessions.put((video_name, start_dt, buffer))
+
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        # A file stands in for a camera: replay it in real time instead of as fast as it decodes
+        paced = self.is_file and fps > 0
+        opened = time.monotonic()
+        frame_index = 0
+        next_sample = 0.0
+        try:
+            while not self._stop.is_set() and cap.grab():
+                offset = frame_index / fps if paced else time.monotonic() - opened
+                frame_index += 1
+                if paced:
+                    delay = opened + offset - time.monotonic()
+                    if delay > 0:
+                        self._stop.wait(delay)
+                if offset < next_sample:
+                    continue
+                ok, frame = cap.retrieve()
+                if not ok:
+                    continue
+                next_sample = (int(offset // self.interval) + 1) * self.interval
+                buffer.put(self.processor.build_frame_record_at(video_name, start_dt, offset, frame))
+                self.frames_read += 1
+        finally:
+            buffer.close(discard=self._stop.is_set())
+            logger.info("Stream %s connection ended after %d frames", self.camera_id, frame_index)
+
+    def _ingest_loop(self):
+        while not self._stop.is_set():
+            try:
+                video_name, start_dt, buffer = self._sessions.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            # A failed run (LLM or Qdrant outage) picks up the same connection's remaining frames
+            while not buffer.exhausted and not self._stop.is_set():
+                try:
+                    result = self.ingestion.run(
+                        None, video_name, self.camera_id, start_dt.isoformat(),
+                        frames=bound_lag(buffer, start_dt, self.max_lag, self.camera_id),
+                        flush_interval=self.flush_interval
+                    )
+                    logger.info("Indexed stream %s: %s", video_name, result)
+                except Exception:
+                    logger.exception("Live ingestion of %s failed; retrying", video_name)
+                    self._stop.wait(5.0)
+
+    def start(self):
+        self._stop.clear()
+        for name, target in (("read", self._read_loop), ("ingest", self._ingest_loop)):
+            t = threading.Thread(target=target, name=f"live-{name}-{self.camera_id}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        for t in self._threads:
+            t.join(timeout=timeout)
+        self._threads = []
+
+
+class ProcessLock:
+    """Exclusive lock on a file, held by at most one process until release() or exit."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def acquire(self):
+        """Takes the lock without waiting; False if another process holds it."""
+        f = open(self.path, "a+")
+        try:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            f.close()
+            return False
+        self._file = f
+        return True
+
+    def release(self):
+        if self._file is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        self._file.close()
+        self._file = None
+
+
+class LiveIngestService:
+    """
+    The configured watch folder and stream sources, started and stopped together.
+    Watch-folder segments run on `jobs`, a JobQueue of their own, so uploads queued
+    on the API's workers never delay them and vice versa.
+
+    With `retention_hours` set, stored segments whose job finished longer ago than
+    that and which the NVR has since rotated away are deleted, with their segment
+    index and job. Their frames stay searchable; results for them come without clips.
+
+    Only one process may run live ingestion: two would submit the same segments and
+    requeue each other's running jobs. start() takes `lock_path` first and leaves
+    everything stopped, returning False, when another process (a second API worker
+    or scripts/live_ingest.py) already holds it.
+    """
+
+    PRUNE_INTERVAL = 300.0
+
+    def __init__(self, jobs=None, watch=None, streams=(), segment_index=None, retention_hours=None, lock_path=None):
+        self.jobs = jobs
+        self.watch = watch
+        self.streams = list(streams)
+        self.segment_index = segment_index
+        self.retention_hours = retention_hours
+        self.pruned = 0
+        self.running = False
+        self._lock = ProcessLock(lock_path) if lock_path is not None else None
+        self._stop = threading.Event()
+        self._pruner = None
+
+    def prune(self, limit=500):
+        """Deletes stored segments past retention; returns how many were removed."""
+        cutoff = (datetime.now() - timedelta(hours=self.retention_hours)).isoformat()
+        removed = 0
+        for job in self.jobs.finished_before(cutoff, limit=limit):
+            payload = job["payload"]
+            if os.path.exists(payload["watch_path"]):
+                # Still on the NVR: the stored file marks it as submitted, so it must stay
+                continue
+            try:
+                os.remove(payload["file_path"])
+            except FileNotFoundError:
+                pass
+            if self.segment_index is not None:
+                self.segment_index.remove(payload["filename"])
+            self.jobs.delete(job["id"])
+            removed += 1
+        if removed:
+            self.pruned += removed
+            logger.info("Removed %d live segment(s) older than %gh", removed, self.retention_hours)
+        return removed
+
+    def _prune_loop(self):
+        while not self._stop.wait(self.PRUNE_INTERVAL):
+            try:
+                self.prune()
+            except Exception:
+                logger.exception("Pruning live segments failed")
+
+    def start(self):
+        if self._lock is not None and not self._lock.acquire():
+            logger.warning("Live ingestion is already running in another process (%s is locked); "
+                           "not starting it here", self._lock.path)
+            return False
+        self.running = True
+        if self.jobs is not None:
+            self.jobs.start()
+            if self.retention_hours is not None:
+                self._stop.clear()
+                self._pruner = threading.Thread(target=self._prune_loop, name="live-prune", daemon=True)
+                self._pruner.start()
+        if self.watch is not None:
+            self.watch.start()
+        for stream in self.streams:
+            stream.start()
+        logger.info("Live ingestion started (watch folder: %s, streams: %s)",
+                    self.watch.root if self.watch else None, [s.camera_id for s in self.streams])
+        return True
+
+    def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        if self.watch is not None:
+            self.watch.stop()
+        for stream in self.streams:
+            stream.stop()
+        if self._pruner is not None:
+            self._stop.set()
+            self._pruner.join(timeout=5.0)
+            self._pruner = None
+        if self.jobs is not None:
+            self.jobs.stop()
+        if self._lock is not None:
+            self._lock.release()
+
+    def stats(self):
+        return {
+            "segments_submitted": self.watch.submitted if self.watch else 0,
+            "segment_jobs": self.jobs.counts() if self.jobs else {},
+            "segments_pruned": self.pruned,
+            "streams": {
+                s.camera_id: {"connections": s.connections, "frames_read": s.frames_read}
+                for s in self.streams
+            },
+        }
+
+
+def get_live_ingest(ingestion, processor, handler):
+    """
+    Live ingestion from settings; None when neither LIVE_WATCH_DIR nor LIVE_STREAMS is set.
+    handler: the JobQueue handler that runs watch-folder segment jobs.
+    """
+    jobs = watch = None
+    if settings.LIVE_WATCH_DIR is not None:
+        timezone = None
+        if settings.LIVE_SEGMENT_TIMEZONE:
+            try:
+                timezone = ZoneInfo(settings.LIVE_SEGMENT_TIMEZONE)
+            except (ZoneInfoNotFoundError, ValueError) as e:
+                raise ValueError(f"Unknown LIVE_SEGMENT_TIMEZONE '{settings.LIVE_SEGMENT_TIMEZONE}' "
+                                 "(expected an IANA name such as Europe/Berlin)") from e
+        jobs = JobQueue(settings.LIVE_JOBS_DB_PATH, handler, num_workers=0)
+        watch = WatchFolder(
+            settings.LIVE_WATCH_DIR,
+            jobs.submit,
+            default_camera=settings.LIVE_CAMERA_ID,
+            poll_interval=settings.LIVE_POLL_INTERVAL,
+            backfill=settings.LIVE_BACKFILL,
+            timezone=timezone
+        )
+    streams = [
+        StreamSource(
+            camera_id, source, processor, ingestion,
+            interval=settings.LIVE_INTERVAL,
+            max_lag=settings.LIVE_MAX_LAG,
+            max_pending=settings.LIVE_MAX_PENDING_FRAMES,
+            flush_interval=settings.LIVE_FLUSH_INTERVAL
+        )
+        for camera_id, source in settings.LIVE_STREAMS.items()
+    ]
+    if watch is None and not streams:
+        return None
+    return LiveIngestService(
+        jobs, watch, streams,
+        segment_index=ingestion.segment_index,
+        retention_hours=settings.LIVE_RETENTION_HOURS,
+        lock_path=settings.LIVE_LOCK_PATH
+    )
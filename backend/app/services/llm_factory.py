@@ -1,12 +1,73 @@
 from abc import ABC, abstractmethod
 from openai import OpenAI
+import json
+import logging
 import os
 import openai
 from tenacity import retry, stop_after_attempt, wait_random_exponential, retry_if_exception_type
+from app.core.config import settings
+from app.services.rate_limiter import RateLimiter, bounded_ordered_map
+from app.services.embedding_cache import EmbeddingCache
+from app.services.video_proc import VideoProcessor, frame_image
+from app.services.metrics import record_llm_usage
+
+logger = logging.getLogger(__name__)
+
+FRAME_PROMPT = (
+    "Describe this frame in precise detail. Identify all key elements. If a person appears, specify gender, "
+    "approximate age, clothing type and colors, and visible actions. If a vehicle appears, specify color, "
+    "make/model (if identifiable), license plate, and position. Include notable objects, environment details, "
+    "and anything visually distinctive. Do not omit observable details."
+)
+
+BATCH_PROMPT = (
+    "You are given {count} consecutive frames from a security camera, {layout}. "
+    "For EACH frame separately: describe it in precise detail. Identify all key elements. If a person appears, "
+    "specify gender, approximate age, clothing type and colors, and visible actions. If a vehicle appears, specify "
+    "color, make/model (if identifiable), license plate, and position. Include notable objects, environment details, "
+    "and anything visually distinctive. Do not omit observable details. Describe each frame on its own; do not "
+    "refer to other frames. Respond with JSON only: "
+    '{{"frames": [{{"frame": 1, "description": "..."}}, ...]}} with one entry per frame, numbered 1 to {count}.'
+)
+
+
+def jpeg_data_url(image):
+    """data: URL for a frame; base64 encoding happens here, at the request, not in the frame pipeline."""
+    return "data:image/jpeg;base64," + VideoProcessor.to_base64(image)
+
+
+def parse_frame_descriptions(content, count):
+    """
+    Per-frame descriptions from a batched vision reply: {frame_index (0-based): description}.
+    Entries that are missing, out of range, duplicated or empty are left out.
+    """
+    try:
+        data = json.loads(content)
+    except (TypeError, ValueError):
+        return {}
+    entries = data.get("frames") if isinstance(data, dict) else data
+    if not isinstance(entries, list):
+        return {}
+    parsed = {}
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        try:
+            index = int(entry.get("frame")) - 1
+        except (TypeError, ValueError):
+            continue
+        description = entry.get("description")
+        if 0 <= index < count and index not in parsed and isinstance(description, str) and description.strip():
+            parsed[index] = description.strip()
+    return parsed
+
 
 class BaseLLM(ABC):
+    # Vector size of get_embedding(); None means the Qdrant default (settings.EMBEDDING_DIMENSIONS or 1536)
+    embedding_size = None
+
     @abstractmethod
-    def get_vision_description(self, base64_image: str) -> str: pass
+    def get_vision_description(self, image) -> str: pass # image: raw JPEG bytes/memoryview or base64 str
     @abstractmethod
     def get_embedding(self, text: str) -> list: pass
     @abstractmethod
@@ -16,38 +77,166 @@ class BaseLLM(ABC):
     @abstractmethod
     def get_search_summary(self, query: str, results: list) -> str: pass
 
+    def stream_search_summary(self, query: str, results: list):
+        """Yields the summary in pieces; providers that can stream tokens override this."""
+        yield self.get_search_summary(query, results)
+
+    def stream_general_response(self, text: str):
+        """Yields the chat reply in pieces; providers that can stream tokens override this."""
+        yield self.get_general_response(text)
+
+    def get_embeddings(self, texts: list) -> list:
+        """Embeds many texts; providers with a batch endpoint override this."""
+        return [self.get_embedding(t) for t in texts]
+
+    def caption_frames(self, frames):
+        """
+        Yields (frame, description) for each frame dict, in order.
+        Providers that can caption concurrently override this.
+        """
+        for frame in frames:
+            yield frame, self.get_vision_description(frame_image(frame))
+
 class OpenAIProvider(BaseLLM):
     def __init__(self):
         self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        # Proactive pacing for the vision model, so we stay under the limits instead of reacting to 429s
+        self.vision_limiter = RateLimiter(settings.OPENAI_VISION_RPM, settings.OPENAI_VISION_TPM)
+        self.batch_mode = settings.VISION_BATCH_MODE # off | frames | mosaic
+        if self.batch_mode not in ("off", "frames", "mosaic"):
+            raise ValueError(f"Unknown VISION_BATCH_MODE '{self.batch_mode}' (expected off, frames or mosaic)")
+        self.vision_batches = 0
+        self.vision_fallbacks = 0
+        self.embedding_model = "text-embedding-3-small"
+        self.embedding_dimensions = settings.EMBEDDING_DIMENSIONS
+        self.embedding_size = self.embedding_dimensions or 1536
+        self.embedding_cache = EmbeddingCache(settings.EMBEDDING_CACHE_PATH, settings.EMBEDDING_CACHE_MAX_ENTRIES)
 
     @retry(
         wait=wait_random_exponential(multiplier=1, max=60),
         stop=stop_after_attempt(6),
         retry=retry_if_exception_type((openai.RateLimitError, openai.APIConnectionError))
     )
-    def get_vision_description(self, base64_image: str) -> str:
+    def get_vision_description(self, image) -> str:
+        estimated = settings.VISION_TOKENS_PER_REQUEST
+        self.vision_limiter.acquire(estimated)
         response = self.client.chat.completions.create(
             model="gpt-4o-mini",
             messages=[
                 {"role": "user", "content": [
-                    {"type": "text", "text": "Describe this frame in precise detail. Identify all key elements. If a person appears, specify gender, approximate age, clothing type and colors, and visible actions. If a vehicle appears, specify color, make/model (if identifiable), license plate, and position. Include notable objects, environment details, and anything visually distinctive. Do not omit observable details."},
-                    {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}}
+                    {"type": "text", "text": FRAME_PROMPT},
+                    {"type": "image_url", "image_url": {"url": jpeg_data_url(image)}}
                 ]}
             ],
             max_tokens=100
         )
+        usage = getattr(response, "usage", None)
+        self.vision_limiter.settle(estimated, usage.total_tokens if usage else None)
+        record_llm_usage("gpt-4o-mini", usage)
         return response.choices[0].message.content
 
+    def caption_frames(self, frames):
+        """Keeps up to VISION_CONCURRENCY vision requests in flight; results come back in frame order."""
+        if self.batch_mode == "off":
+            yield from bounded_ordered_map(
+                lambda frame: self.get_vision_description(frame_image(frame)),
+                frames,
+                settings.VISION_CONCURRENCY
+            )
+            return
+        for chunk, descriptions in bounded_ordered_map(
+            self._caption_chunk,
+            self._chunked(frames, max(1, settings.VISION_BATCH_SIZE)),
+            settings.VISION_CONCURRENCY
+        ):
+            yield from zip(chunk, descriptions)
+
+    @staticmethod
+    def _chunked(frames, size):
+        chunk = []
+        for frame in frames:
+            chunk.append(frame)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _caption_chunk(self, chunk):
+        """One batched request for the chunk; frames it didn't describe get their own request."""
+        images = [frame_image(frame) for frame in chunk]
+        parsed = {}
+        if len(images) > 1:
+            try:
+                parsed = self.get_vision_descriptions(images)
+            except Exception as e:
+                logger.warning("Batched vision request failed, captioning %d frames one by one: %s", len(images), e)
+        missing = [i for i in range(len(images)) if i not in parsed]
+        if missing and len(images) > 1:
+            self.vision_fallbacks += len(missing)
+        return [parsed[i] if i in parsed else self.get_vision_description(images[i]) for i in range(len(images))]
+
     @retry(
         wait=wait_random_exponential(multiplier=1, max=60),
         stop=stop_after_attempt(6),
         retry=retry_if_exception_type((openai.RateLimitError, openai.APIConnectionError))
     )
+    def get_vision_descriptions(self, frame_images):
+        """
+        Several consecutive frames in one request (separate images, or one tiled mosaic
+        with VISION_BATCH_MODE=mosaic). Returns {frame_index: description} for the
+        frames the reply described.
+        """
+        count = len(frame_images)
+        if self.batch_mode == "mosaic":
+            layout = f"tiled into one grid image and numbered 1 to {count} left to right, top to bottom"
+            images = [VideoProcessor.build_mosaic(frame_images, settings.VISION_MOSAIC_COLUMNS)]
+        else:
+            layout = f"as images numbered 1 to {count} in order"
+            images = frame_images
+        content = [{"type": "text", "text": BATCH_PROMPT.format(count=count, layout=layout)}]
+        for i, image in enumerate(images):
+            if len(images) > 1:
+                content.append({"type": "text", "text": f"Frame {i + 1}:"})
+            content.append({"type": "image_url", "image_url": {"url": jpeg_data_url(image)}})
+
+        # The shared prompt is paid once; images and completions still scale with the frame count
+        estimated = settings.VISION_TOKENS_PER_REQUEST * count
+        self.vision_limiter.acquire(estimated)
+        response = self.client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[{"role": "user", "content": content}],
+            response_format={"type": "json_object"},
+            max_tokens=settings.VISION_TOKENS_PER_FRAME * count + 50
+        )
+        usage = getattr(response, "usage", None)
+        self.vision_limiter.settle(estimated, usage.total_tokens if usage else None)
+        record_llm_usage("gpt-4o-mini", usage)
+        self.vision_batches += 1
+        return parse_frame_descriptions(response.choices[0].message.content, count)
+
     def get_embedding(self, text: str) -> list:
+        return self.get_embeddings([text])[0]
+
+    def get_embeddings(self, texts: list) -> list:
+        """Cached, batched embeddings. Only texts not seen before hit the API."""
+        # Shortened vectors are different vectors, so the dimension is part of the cache key
+        model_key = f"{self.embedding_model}@{self.embedding_dimensions or 'full'}"
+        return self.embedding_cache.get_or_embed(model_key, texts, self._embed_batch, settings.EMBEDDING_BATCH_SIZE)
+
+    @retry(
+        wait=wait_random_exponential(multiplier=1, max=60),
+        stop=stop_after_attempt(6),
+        retry=retry_if_exception_type((openai.RateLimitError, openai.APIConnectionError))
+    )
+    def _embed_batch(self, texts: list) -> list:
+        kwargs = {"dimensions": self.embedding_dimensions} if self.embedding_dimensions else {}
         response = self.client.embeddings.create(
-            input=text, model="text-embedding-3-small"
+            input=texts, model=self.embedding_model, **kwargs
         )
-        return response.data[0].embedding
+        record_llm_usage(self.embedding_model, getattr(response, "usage", None))
+        # The API returns one item per input; order by index to be safe
+        return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
 
     # --- NEW: Router Logic ---
     @retry(
@@ -72,6 +261,7 @@ class OpenAIProvider(BaseLLM):
                 ],
                 temperature=0.0
             )
+            record_llm_usage("gpt-4o-mini", getattr(response, "usage", None))
             return response.choices[0].message.content.strip().upper()
         except:
             return "SEARCH"
@@ -83,20 +273,28 @@ class OpenAIProvider(BaseLLM):
         retry=retry_if_exception_type((openai.RateLimitError, openai.APIConnectionError))
     )
     def get_general_response(self, text: str) -> str:
+        response = self.client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=self._general_messages(text)
+        )
+        record_llm_usage("gpt-4o-mini", getattr(response, "usage", None))
+        return response.choices[0].message.content
+
+    def stream_general_response(self, text: str):
+        yield from self._stream_chat(self._general_messages(text))
+
+    @staticmethod
+    def _general_messages(text):
         system_prompt = (
             "You are the VideoRAG AI Assistant. "
             "Your job is to help users search through security footage. "
             "You can answer general questions, but strictly keep them brief. "
             "If the user asks something completely unrelated (like cooking recipes), politely steer them back to video search."
         )
-        response = self.client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": text}
-            ]
-        )
-        return response.choices[0].message.content
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": text}
+        ]
 
     # --- NEW: RAG Summary ---
     @retry(
@@ -105,6 +303,18 @@ class OpenAIProvider(BaseLLM):
         retry=retry_if_exception_type((openai.RateLimitError, openai.APIConnectionError))
     )
     def get_search_summary(self, query: str, results: list) -> str:
+        response = self.client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=self._summary_messages(query, results)
+        )
+        record_llm_usage("gpt-4o-mini", getattr(response, "usage", None))
+        return response.choices[0].message.content
+
+    def stream_search_summary(self, query: str, results: list):
+        yield from self._stream_chat(self._summary_messages(query, results))
+
+    @staticmethod
+    def _summary_messages(query, results):
         system_prompt = (
              "You are a helpful assistant summarizing video search results. "
              "Answer the user's query based ONLY on the provided video descriptions. "
@@ -118,15 +328,46 @@ class OpenAIProvider(BaseLLM):
         ])
         
         user_prompt = f"User Query: {query}\n\nFound Video Events:\n{context_str}\n\nAnswer:"
-        
-        response = self.client.chat.completions.create(
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+
+    def _stream_chat(self, messages):
+        """Yields content deltas of a streamed gpt-4o-mini completion"""
+        stream = self._open_stream(messages)
+        try:
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+                # With include_usage the last chunk carries the token counts (and no choices)
+                record_llm_usage("gpt-4o-mini", getattr(chunk, "usage", None))
+        finally:
+            stream.close()
+
+    # Only opening the stream is retried; once tokens have been sent they can't be taken back
+    @retry(
+        wait=wait_random_exponential(multiplier=1, max=60),
+        stop=stop_after_attempt(6),
+        retry=retry_if_exception_type((openai.RateLimitError, openai.APIConnectionError))
+    )
+    def _open_stream(self, messages):
+        return self.client.chat.completions.create(
             model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ]
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True}
         )
-        return response.choices[0].message.content
 
 def get_llm_provider():
-    return OpenAIProvider()
\ No newline at end of file
+    """Provider from settings.LLM_PROVIDER: openai | local (offline models) | stub (deterministic, for tests/benchmarks)"""
+    provider = settings.LLM_PROVIDER
+    if provider == "openai":
+        return OpenAIProvider()
+    # Imported here: the offline providers subclass BaseLLM from this module
+    from app.services.local_llm import LocalProvider, StubProvider
+    if provider == "local":
+        return LocalProvider()
+    if provider == "stub":
+        return StubProvider()
+    raise ValueError(f"Unknown LLM_PROVIDER '{provider}' (expected openai, local or stub)")
@@ -0,0 +1,258 @@
+import hashlib
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from app.core.config import settings
+from app.services.embedding_cache import EmbeddingCache
+from app.services.llm_factory import BaseLLM
+from app.services.rate_limiter import bounded_ordered_map
+from app.services.video_proc import VideoProcessor, frame_image
+
+logger = logging.getLogger(__name__)
+
+
+class OfflineLLM(BaseLLM):
+    """
+    Shared text side of the providers that run without an API.
+
+    There is no generative model here: intent falls back to SEARCH (the local intent
+    router answers most queries before reaching the provider), chat gets a fixed
+    reply and the search summary is extractive, built from the top results.
+    """
+
+    def check_intent(self, text: str) -> str:
+        return "SEARCH"
+
+    def get_general_response(self, text: str) -> str:
+        return (
+            "I'm running in offline mode, so I can only search your footage. "
+            "Describe what you are looking for, e.g. \"person in a red jacket near the gate\"."
+        )
+
+    def get_search_summary(self, query: str, results: list) -> str:
+        top = results[:5]
+        lines = [f"Found {len(results)} matching moment{'s' if len(results) != 1 else ''} for \"{query}\"."]
+        for r in top:
+            lines.append(f"- {r.get('display_date', 'N/A')} {r.get('display_time', 'N/A')}: {r.get('description', 'No description')}")
+        return "\n".join(lines)
+
+    def get_embedding(self, text: str) -> list:
+        return self.get_embeddings([text])[0]
+
+
+class LocalProvider(OfflineLLM):
+    """
+    CPU-only captioning and embeddings, no network after the first model download.
+
+    Captions come from a small image-to-text model (LOCAL_CAPTION_MODEL), run over
+    LOCAL_CAPTION_BATCH_SIZE frames per generate() call. Embeddings come from a
+    sentence-transformers model (LOCAL_EMBEDDING_MODEL) and go through the same
+    persistent EmbeddingCache as the OpenAI provider.
+
+    With LOCAL_BACKEND=onnx both run on onnxruntime with int8 weights: the embedding
+    model loads the quantized file shipped in its repo (LOCAL_EMBEDDING_ONNX_FILE) and
+    the caption model is exported to ONNX and dynamically quantized once, into
+    LOCAL_MODEL_DIR. Models load on first use, never at import time.
+    """
+
+    def __init__(self):
+        self.backend = settings.LOCAL_BACKEND
+        if self.backend not in ("onnx", "torch"):
+            raise ValueError(f"Unknown LOCAL_BACKEND '{self.backend}' (expected onnx or torch)")
+        self.caption_model_name = settings.LOCAL_CAPTION_MODEL
+        self.embedding_model_name = settings.LOCAL_EMBEDDING_MODEL
+        self.embedding_dimensions = settings.EMBEDDING_DIMENSIONS
+        self.embedding_size = self.embedding_dimensions or settings.LOCAL_EMBEDDING_SIZE
+        self.embedding_cache = EmbeddingCache(settings.EMBEDDING_CACHE_PATH, settings.EMBEDDING_CACHE_MAX_ENTRIES)
+        self._captioner = None
+        self._embedder = None
+        self._caption_lock = threading.Lock()
+        self._embed_lock = threading.Lock()
+
+    # --- Model loading ---
+    def _session_options(self):
+        import onnxruntime
+        options = onnxruntime.SessionOptions()
+        if settings.LOCAL_THREADS:
+            options.intra_op_num_threads = settings.LOCAL_THREADS
+        return options
+
+    def _load_captioner(self):
+        with self._caption_lock:
+            if self._captioner is None:
+                try:
+                    from transformers import pipeline
+                except ImportError as e:
+                    raise RuntimeError("LLM_PROVIDER=local requires the 'transformers' package") from e
+                start = time.perf_counter()
+                if self.backend == "onnx":
+                    try:
+                        from optimum.onnxruntime import ORTModelForVision2Seq
+                    except ImportError as e:
+                        raise RuntimeError("LOCAL_BACKEND=onnx requires 'optimum[onnxruntime]'") from e
+                    from transformers import AutoImageProcessor, AutoTokenizer
+                    model_dir = self._quantized_caption_model()
+                    self._captioner = pipeline(
+                        "image-to-text",
+                        model=ORTModelForVision2Seq.from_pretrained(model_dir, session_options=self._session_options()),
+                        tokenizer=AutoTokenizer.from_pretrained(model_dir),
+                        image_processor=AutoImageProcessor.from_pretrained(model_dir)
+                    )
+                else:
+                    if settings.LOCAL_THREADS:
+                        import torch
+                        torch.set_num_threads(settings.LOCAL_THREADS)
+                    self._captioner = pipeline("image-to-text", model=self.caption_model_name, device=-1)
+                logger.info("Loaded caption model %s (%s) in %.1fs", self.caption_model_name, self.backend, time.perf_counter() - start)
+            return self._captioner
+
+    def _quantized_caption_model(self):
+        """ONNX export of the caption model with int8 weights, built once under LOCAL_MODEL_DIR."""
+        target = settings.LOCAL_MODEL_DIR / f"{self.caption_model_name.replace('/', '--')}-int8"
+        if (target / "config.json").exists():
+            return target
+
+        from optimum.onnxruntime import ORTModelForVision2Seq
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        from transformers import AutoImageProcessor, AutoTokenizer
+
+        logger.info("Exporting %s to int8 ONNX (one-off)", self.caption_model_name)
+        building = target.with_name(target.name + ".tmp")
+        shutil.rmtree(building, ignore_errors=True)
+        ORTModelForVision2Seq.from_pretrained(self.caption_model_name, export=True).save_pretrained(building)
+        AutoTokenizer.from_pretrained(self.caption_model_name).save_pretrained(building)
+        AutoImageProcessor.from_pretrained(self.caption_model_name).save_pretrained(building)
+        for path in building.glob("*.onnx"):
+            quantized = path.with_suffix(".int8")
+            quantize_dynamic(str(path), str(quantized), weight_type=QuantType.QInt8)
+            os.replace(quantized, path)
+        # Only a complete export is ever visible under the target name
+        os.replace(building, target)
+        return target
+
+    def _load_embedder(self):
+        with self._embed_lock:
+            if self._embedder is None:
+                try:
+                    from sentence_transformers import SentenceTransformer
+                except ImportError as e:
+                    raise RuntimeError("LLM_PROVIDER=local requires the 'sentence-transformers' package") from e
+                start = time.perf_counter()
+                kwargs = {}
+                if self.backend == "onnx":
+                    model_kwargs = {"session_options": self._session_options()}
+                    if settings.LOCAL_EMBEDDING_ONNX_FILE:
+                        model_kwargs["file_name"] = settings.LOCAL_EMBEDDING_ONNX_FILE
+                    kwargs = {"backend": "onnx", "model_kwargs": model_kwargs}
+                model = SentenceTransformer(
+                    self.embedding_model_name, device="cpu", truncate_dim=self.embedding_dimensions, **kwargs
+                )
+                size = model.get_sentence_embedding_dimension()
+                if size != self.embedding_size:
+                    raise RuntimeError(
+                        f"{self.embedding_model_name} returns {size}-d vectors but collections expect "
+                        f"{self.embedding_size}; set LOCAL_EMBEDDING_SIZE={size}"
+                    )
+                self._embedder = model
+                logger.info("Loaded embedding model %s (%s) in %.1fs", self.embedding_model_name, self.backend, time.perf_counter() - start)
+            return self._embedder
+
+    # --- Captioning ---
+    @staticmethod
+    def _decode_image(image):
+        from PIL import Image
+        buffer = np.frombuffer(VideoProcessor.jpeg_bytes(image), dtype=np.uint8)
+        frame = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+        return Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+
+    def _caption_batch(self, images):
+        captioner = self._load_captioner()
+        outputs = captioner(
+            [self._decode_image(img) for img in images],
+            batch_size=len(images),
+            generate_kwargs={"max_new_tokens": settings.LOCAL_CAPTION_MAX_TOKENS}
+        )
+        # One list of candidates per image
+        return [out[0]["generated_text"].strip() for out in outputs]
+
+    def get_vision_description(self, image) -> str:
+        return self._caption_batch([image])[0]
+
+    def caption_frames(self, frames):
+        """Captions LOCAL_CAPTION_BATCH_SIZE frames per model call; results come back in frame order."""
+        batch_size = max(1, settings.LOCAL_CAPTION_BATCH_SIZE)
+        batch = []
+        for frame in frames:
+            batch.append(frame)
+            if len(batch) >= batch_size:
+                yield from zip(batch, self._caption_batch([frame_image(f) for f in batch]))
+                batch = []
+        if batch:
+            yield from zip(batch, self._caption_batch([frame_image(f) for f in batch]))
+
+    # --- Embeddings ---
+    def get_embeddings(self, texts: list) -> list:
+        model_key = f"local:{self.embedding_model_name}@{self.backend}@{self.embedding_size}"
+        return self.embedding_cache.get_or_embed(model_key, texts, self._embed_batch, settings.EMBEDDING_BATCH_SIZE)
+
+    def _embed_batch(self, texts):
+        model = self._load_embedder()
+        vectors = model.encode(texts, batch_size=len(texts), normalize_embeddings=True, show_progress_bar=False)
+        return vectors.tolist()
+
+
+class StubProvider(OfflineLLM):
+    """
+    Deterministic fake provider for tests and benchmarks (no models, no network).
+
+    Captions are picked from a small vocabulary by hashing the frame's JPEG bytes, so
+    identical frames get identical captions; each call sleeps STUB_LATENCY seconds to
+    stand in for API latency, with VISION_CONCURRENCY calls in flight like the OpenAI
+    provider. Embeddings are signed feature hashes of the caption's words, so texts
+    sharing words are close and the same text always maps to the same vector.
+    """
+
+    SUBJECTS = ["A person in a dark jacket", "A woman with a red umbrella", "A white delivery van", "A black SUV",
+                "Two people on bicycles", "A dog on a leash", "A courier holding a parcel", "A silver sedan"]
+    ACTIONS = ["walks past the front door", "turns left at the intersection", "is parked in the driveway",
+               "stops near the gate", "crosses the street", "enters the building", "waits by the entrance"]
+    SCENES = ["in daylight.", "at night under a streetlight.", "in light rain.", "while the gate is open.",
+              "with a parked car in the background.", "near a row of bins."]
+
+    def __init__(self):
+        self.latency = settings.STUB_LATENCY
+        self.embedding_size = settings.EMBEDDING_DIMENSIONS or 1536
+
+    def get_vision_description(self, image) -> str:
+        if self.latency:
+            time.sleep(self.latency)
+        digest = hashlib.blake2b(VideoProcessor.jpeg_bytes(image), digest_size=8).digest()
+        return " ".join([
+            self.SUBJECTS[digest[0] % len(self.SUBJECTS)],
+            self.ACTIONS[digest[1] % len(self.ACTIONS)],
+            self.SCENES[digest[2] % len(self.SCENES)]
+        ])
+
+    def caption_frames(self, frames):
+        yield from bounded_ordered_map(
+            lambda frame: self.get_vision_description(frame_image(frame)),
+            frames,
+            settings.VISION_CONCURRENCY if self.latency else 1
+        )
+
+    def get_embeddings(self, texts: list) -> list:
+        vectors = np.zeros((len(texts), self.embedding_size), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in re.findall(r"\w+", text.lower()):
+                h = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+                vectors[row, h % self.embedding_size] += 1.0 if (h >> 63) else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+        return vectors.tolist()
@@ -0,0 +1,299 @@
+import contextvars
+import functools
+import inspect
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# USD per million tokens (input, output); models not listed are counted but not priced
+LLM_PRICES_PER_MTOK = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "text-embedding-3-small": (0.02, 0.0),
+}
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, sum, count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            i = 0
+            while i < len(self.buckets) and value > self.buckets[i]:
+                i += 1
+            state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted((key, (list(s[0]), s[1], s[2])) for key, s in self._values.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (math.inf,), counts):
+                cumulative += n
+                le = [("le", _format_value(float(bound)) if bound != math.inf else "+Inf")]
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {count}")
+        return lines
+
+
+class Registry:
+    """
+    Minimal Prometheus-compatible registry (text exposition format 0.0.4).
+
+    Metrics are created once at import time below. Collectors are callables run at
+    scrape time that return (name, kind, help, {labels}, value) samples, for numbers
+    other components already keep (cache stats, queue depth).
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help_text, labels=()):
+        return self._add(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=()):
+        return self._add(Gauge(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help_text, labels, buckets))
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        seen = set()
+        for collector in self._collectors:
+            try:
+                samples = list(collector())
+            except Exception:
+                continue
+            for name, kind, help_text, labels, value in samples:
+                if value is None:
+                    continue
+                if name not in seen:
+                    seen.add(name)
+                    lines.append(f"# HELP {name} {help_text}")
+                    lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name}{_format_labels(list(labels), list(labels.values()))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+OPERATION_SECONDS = REGISTRY.histogram(
+    "videorag_operation_seconds", "Duration of instrumented service calls", ("component", "operation")
+)
+OPERATION_ERRORS = REGISTRY.counter(
+    "videorag_operation_errors_total", "Instrumented service calls that raised", ("component", "operation")
+)
+OPERATIONS_IN_FLIGHT = REGISTRY.gauge(
+    "videorag_operations_in_flight", "Instrumented service calls currently running", ("component", "operation")
+)
+LLM_TOKENS = REGISTRY.counter(
+    "videorag_llm_tokens_total", "Tokens reported by the LLM API", ("model", "kind")
+)
+LLM_COST = REGISTRY.counter(
+    "videorag_llm_cost_usd_total", "Estimated LLM spend from reported usage", ("model",)
+)
+HTTP_SECONDS = REGISTRY.histogram(
+    "videorag_http_request_seconds", "HTTP request duration (until the response starts)", ("method", "route", "status")
+)
+LIVE_LAG = REGISTRY.gauge(
+    "videorag_live_lag_seconds", "How far behind real time the last live frame was when captioning took it", ("source",)
+)
+LIVE_DROPPED = REGISTRY.counter(
+    "videorag_live_frames_dropped_total", "Live frames skipped to keep up with real time", ("source", "reason")
+)
+
+# Per-request timing entries for the Server-Timing header: [(name, seconds)], set by the HTTP middleware
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def start_request_timing():
+    """Starts collecting Server-Timing entries for the current request; returns the list."""
+    timings = []
+    _request_timings.set(timings)
+    return timings
+
+
+def server_timing_header(timings, total=None):
+    """Server-Timing value: durations of repeated operations are summed, in first-seen order."""
+    merged = {}
+    for name, seconds in timings:
+        merged[name] = merged.get(name, 0.0) + seconds
+    parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in merged.items()]
+    if total is not None:
+        parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+@contextmanager
+def timed(component, operation):
+    """Times a block into the operation histogram, in-flight gauge, error counter and Server-Timing."""
+    OPERATIONS_IN_FLIGHT.inc(component=component, operation=operation)
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        OPERATION_ERRORS.inc(component=component, operation=operation)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        OPERATIONS_IN_FLIGHT.dec(component=component, operation=operation)
+        OPERATION_SECONDS.observe(elapsed, component=component, operation=operation)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((f"{component}.{operation}", elapsed))
+
+
+def record_llm_usage(model, usage):
+    """Token and cost counters from an OpenAI-style usage object (None is ignored)."""
+    if usage is None:
+        return
+    prompt = getattr(usage, "prompt_tokens", 0) or 0
+    completion = getattr(usage, "completion_tokens", 0) or 0
+    LLM_TOKENS.inc(prompt, model=model, kind="prompt")
+    LLM_TOKENS.inc(completion, model=model, kind="completion")
+    prices = LLM_PRICES_PER_MTOK.get(model)
+    if prices:
+        LLM_COST.inc((prompt * prices[0] + completion * prices[1]) / 1_000_000, model=model)
+
+
+def _wrap(component, name, method):
+    if inspect.iscoroutinefunction(method):
+        @functools.wraps(method)
+        async def async_wrapper(*args, **kwargs):
+            with timed(component, name):
+                return await method(*args, **kwargs)
+        return async_wrapper
+
+    if inspect.isgeneratorfunction(method):
+        # Each item is timed on its own: the time the consumer spends between items
+        # (e.g. captioning extracted frames) is not the generator's
+        @functools.wraps(method)
+        def generator_wrapper(*args, **kwargs):
+            gen = method(*args, **kwargs)
+            try:
+                while True:
+                    with timed(component, name):
+                        try:
+                            item = next(gen)
+                        except StopIteration:
+                            return
+                    yield item
+            finally:
+                gen.close()
+        return generator_wrapper
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        with timed(component, name):
+            return method(*args, **kwargs)
+    return wrapper
+
+
+def instrument(obj, component, exclude=()):
+    """
+    Wraps every public method of `obj` (an instance) with timed(component, method).
+    Returns obj. Calls between its own methods are timed too, since they go through
+    the instance attributes.
+    """
+    for name, _ in inspect.getmembers(type(obj), callable):
+        if name.startswith("_") or name in exclude:
+            continue
+        method = getattr(obj, name)
+        if not inspect.ismethod(method):
+            continue
+        setattr(obj, name, _wrap(component, name, method))
+    return obj
@@ -1,49 +1,236 @@
+import logging
 import os
 import uuid
-from qdrant_client import QdrantClient
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from tenacity import retry, stop_after_attempt, wait_random_exponential
+from qdrant_client import QdrantClient, AsyncQdrantClient
 from qdrant_client.http import models
 from datetime import datetime
 from app.core.config import settings  # Import settings
 
-class QdrantService:
-    def __init__(self):
-        # --- NEW: Use Config & API Key ---
-        print(f"Connecting to Qdrant at: {settings.QDRANT_URL}")
-        
-        self.client = QdrantClient(
-            url=settings.QDRANT_URL,
-            api_key=settings.QDRANT_API_KEY, 
-            timeout=300.0 # Increase timeout for cloud operations to 5 mins
+logger = logging.getLogger(__name__)
+
+# Larger than any video's duration in seconds; keeps per-video running maxima apart
+VIDEO_SPAN_SEPARATION = 1e7
+
+# Suffix of the secondary collection holding frame-level points behind event points
+FRAMES_SUFFIX = "__frames"
+
+# In the per-camera layout, these tell this app's camera collections apart from others on the
+# same instance: the payload indexes _ensure_collection creates, or (local mode keeps no
+# indexes) fields every point build_metadata writes carries
+CAMERA_INDEX_FIELDS = ("timestamp_sortable", "relative_offset", "clock_time_seconds")
+CAMERA_PAYLOAD_FIELDS = ("relative_offset", "clock_time_seconds", "video_path")
+
+# Collection storage profiles. "full" is the original layout: float32 vectors in RAM, default HNSW.
+# The others keep a compact quantized copy in RAM for the HNSW walk, leave the original vectors
+# (and payloads) on disk, and rescore the oversampled candidates with the originals.
+COLLECTION_PROFILES = {
+    "full": {"quantization": None, "on_disk": False, "oversampling": None},
+    "scalar": {"quantization": "scalar", "on_disk": True, "oversampling": 2.0},
+    "binary": {"quantization": "binary", "on_disk": True, "oversampling": 3.0},
+}
+
+
+def collection_config(profile, vector_size):
+    """kwargs for create_collection for a given profile"""
+    spec = COLLECTION_PROFILES[profile]
+    quantization = None
+    if spec["quantization"] == "scalar":
+        quantization = models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, quantile=0.99, always_ram=True)
         )
-        # Removed hardcoded "video_frames" collection creation
+    elif spec["quantization"] == "binary":
+        quantization = models.BinaryQuantization(
+            binary=models.BinaryQuantizationConfig(always_ram=True)
+        )
+    return {
+        "vectors_config": models.VectorParams(
+            size=vector_size,
+            distance=models.Distance.COSINE,
+            on_disk=spec["on_disk"]
+        ),
+        "quantization_config": quantization,
+        "hnsw_config": models.HnswConfigDiff(
+            m=settings.QDRANT_HNSW_M,
+            ef_construct=settings.QDRANT_HNSW_EF_CONSTRUCT,
+            on_disk=settings.QDRANT_HNSW_ON_DISK
+        ),
+        "on_disk_payload": spec["on_disk"]
+    }
 
-    def _ensure_collection(self, collection_name):
-        if not self.client.collection_exists(collection_name):
-            print(f"Creating Qdrant collection: {collection_name}")
-            self.client.create_collection(
-                collection_name=collection_name,
-                vectors_config=models.VectorParams(
-                    size=1536,
-                    distance=models.Distance.COSINE
-                )
+
+def search_params(profile):
+    """Query-time params matching a profile (rescoring for quantized collections)"""
+    spec = COLLECTION_PROFILES[profile]
+    quantization = None
+    if spec["quantization"]:
+        quantization = models.QuantizationSearchParams(
+            ignore=False,
+            rescore=True,
+            oversampling=spec["oversampling"]
+        )
+    if quantization is None and settings.QDRANT_HNSW_EF is None:
+        return None
+    return models.SearchParams(hnsw_ef=settings.QDRANT_HNSW_EF, quantization=quantization)
+
+
+def group_hits_into_events(hits, gap=5.0):
+    """
+    Merges hits from the same video whose time spans are less than `gap` seconds apart
+    (chained, interval-merge style) into events. A frame hit spans its relative_offset;
+    an event point (event segmentation) spans event_start..event_end. Sort-based and
+    vectorized, so it stays cheap as the per-collection limit grows.
+
+    Returns events ordered by peak score:
+    [{"hit": peak ScoredPoint, "video_id", "start", "end", "peak_offset", "peak_score", "frame_count"}]
+    """
+    n = len(hits)
+    if n == 0:
+        return []
+    video_codes = {}
+    videos = [h.payload.get('video_id', 'unknown') for h in hits]
+    codes = np.fromiter((video_codes.setdefault(v, len(video_codes)) for v in videos), dtype=np.int64, count=n)
+    offsets = np.fromiter((h.payload.get('relative_offset') or 0.0 for h in hits), dtype=np.float64, count=n)
+    span_starts = np.fromiter((h.payload.get('event_start', o) for h, o in zip(hits, offsets)), dtype=np.float64, count=n)
+    span_ends = np.fromiter((h.payload.get('event_end', o) for h, o in zip(hits, offsets)), dtype=np.float64, count=n)
+    frames = np.fromiter((h.payload.get('frame_count', 1) for h in hits), dtype=np.int64, count=n)
+    scores = np.fromiter((h.score for h in hits), dtype=np.float64, count=n)
+
+    # Sort by (video, span start); an event starts at every video change or where the next
+    # span begins `gap` or more after everything before it has ended
+    order = np.lexsort((span_starts, codes))
+    sorted_codes, sorted_scores = codes[order], scores[order]
+    sorted_starts, sorted_ends = span_starts[order], span_ends[order]
+    # Running max of span ends within each video (videos are offset apart so the max never crosses over)
+    video_base = sorted_codes * VIDEO_SPAN_SEPARATION
+    reach = np.maximum.accumulate(sorted_ends + video_base) - video_base
+    boundary = np.ones(n, dtype=bool)
+    boundary[1:] = (sorted_codes[1:] != sorted_codes[:-1]) | (sorted_starts[1:] - reach[:-1] >= gap)
+    event_ids = np.cumsum(boundary) - 1
+    event_starts = np.flatnonzero(boundary)
+
+    starts = sorted_starts[event_starts]
+    ends = np.maximum.reduceat(sorted_ends, event_starts)
+    counts = np.add.reduceat(frames[order], event_starts)
+    peak_scores = np.maximum.reduceat(sorted_scores, event_starts)
+
+    # Peak frame of each event: best score within the event (earliest span on ties)
+    by_peak = np.lexsort((-sorted_scores, event_ids))
+    first_of_event = np.flatnonzero(np.r_[True, event_ids[by_peak][1:] != event_ids[by_peak][:-1]])
+    peak_hits = order[by_peak[first_of_event]]
+
+    events = []
+    for e in np.argsort(-peak_scores, kind="stable"):
+        hit = hits[peak_hits[e]]
+        events.append({
+            "hit": hit,
+            "video_id": videos[peak_hits[e]],
+            "start": float(starts[e]),
+            "end": float(ends[e]),
+            "peak_offset": float(offsets[peak_hits[e]]),
+            "peak_score": float(peak_scores[e]),
+            "frame_count": int(counts[e])
+        })
+    return events
+
+
+class QdrantService:
+    def __init__(self, client=None, layout=None, async_client=None, profile=None, vector_size=None):
+        own_client = client is None
+        if own_client:
+            # --- NEW: Use Config & API Key ---
+            logger.info("Connecting to Qdrant at: %s", settings.QDRANT_URL)
+            
+            client = QdrantClient(
+                url=settings.QDRANT_URL,
+                api_key=settings.QDRANT_API_KEY, 
+                timeout=300.0 # Increase timeout for cloud operations to 5 mins
             )
-            # Create payload indexes for filtering
-            self.client.create_payload_index(
-                collection_name=collection_name,
-                field_name="timestamp_sortable",
-                field_schema=models.PayloadSchemaType.FLOAT
+        self.client = client
+        # Async client for the concurrent search path (falls back to threads when a client is injected)
+        if async_client is None and own_client:
+            async_client = AsyncQdrantClient(
+                url=settings.QDRANT_URL,
+                api_key=settings.QDRANT_API_KEY,
+                timeout=300.0
             )
+        self.async_client = async_client
+        # "per_camera": one collection per camera_id (legacy)
+        # "shared": one collection for all cameras, filtered by a camera_id tenant index
+        self.layout = layout or settings.QDRANT_LAYOUT
+        self.shared_collection = settings.QDRANT_SHARED_COLLECTION
+        # Storage/index profile applied to new collections (see COLLECTION_PROFILES)
+        self.profile = profile or settings.QDRANT_PROFILE
+        if self.profile not in COLLECTION_PROFILES:
+            raise ValueError(f"Unknown QDRANT_PROFILE '{self.profile}' (expected one of {', '.join(COLLECTION_PROFILES)})")
+        self.vector_size = vector_size or settings.EMBEDDING_DIMENSIONS or 1536
+        self.search_params = search_params(self.profile)
+
+        # TTL cache of existing collection names (also how cameras are discovered)
+        self._collections = set()
+        self._collections_fetched_at = float("-inf")
+        self._collections_lock = threading.Lock()
+        # Collection name -> whether it is one of this app's camera collections (never changes)
+        self._camera_collections = {}
+
+    def collection_for(self, camera_id):
+        return self.shared_collection if self.layout == "shared" else camera_id
+
+    @staticmethod
+    def is_frames_collection(name):
+        return name.endswith(FRAMES_SUFFIX)
+
+    def _ensure_collection(self, collection_name):
+        if collection_name in self.known_collections():
+            return
+        # Cache may be stale (another process created it); confirm before creating
+        if self.client.collection_exists(collection_name):
+            self._remember_collection(collection_name)
+            return
+        logger.info("Creating Qdrant collection: %s (profile: %s)", collection_name, self.profile)
+        self.client.create_collection(
+            collection_name=collection_name,
+            **collection_config(self.profile, self.vector_size)
+        )
+        # Create payload indexes for filtering
+        self.client.create_payload_index(
+            collection_name=collection_name,
+            field_name="timestamp_sortable",
+            field_schema=models.PayloadSchemaType.FLOAT
+        )
+        self.client.create_payload_index(
+            collection_name=collection_name,
+            field_name="relative_offset",
+            field_schema=models.PayloadSchemaType.FLOAT
+        )
+        self.client.create_payload_index(
+            collection_name=collection_name,
+            field_name="clock_time_seconds",
+            field_schema=models.PayloadSchemaType.FLOAT
+        )
+        if collection_name in (self.shared_collection, self.shared_collection + FRAMES_SUFFIX):
+            # Keyword indexes so one filtered query can serve any set of cameras
             self.client.create_payload_index(
                 collection_name=collection_name,
-                field_name="relative_offset",
-                field_schema=models.PayloadSchemaType.FLOAT
+                field_name="camera_id",
+                field_schema=models.KeywordIndexParams(type=models.KeywordIndexType.KEYWORD, is_tenant=True)
             )
             self.client.create_payload_index(
                 collection_name=collection_name,
-                field_name="clock_time_seconds",
-                field_schema=models.PayloadSchemaType.FLOAT
+                field_name="video_id",
+                field_schema=models.PayloadSchemaType.KEYWORD
             )
 
+        # Invalidate: the cache now knows about the new collection
+        self._remember_collection(collection_name)
+        self._camera_collections[collection_name] = True
+
     def parse_custom_timestamp(self, ts_str: str) -> float:
         try:
             # Try parsing user provided ISO format (YYYY-MM-DDTHH:MM:SS)
@@ -63,7 +250,7 @@ class QdrantService:
                 return dt_object.timestamp()
             return 0.0
         except Exception as e:
-            print(f"Error parsing timestamp {ts_str}: {e}")
+            logger.warning("Error parsing timestamp %s: %s", ts_str, e)
             return 0.0
 
     def upload_frame(self, vector, metadata: dict):
@@ -73,59 +260,115 @@ class QdrantService:
         """
         items: List of (vector, metadata) tuples
         """
+        try:
+            self.upsert_items(items)
+        except Exception as e:
+            logger.error("Error indexing batch: %s", e)
+
+    def upsert_items(self, items, wait=True):
+        """Like upload_batch, but raises on failure. wait=False returns once Qdrant has accepted the points."""
         if not items: return
         
-        # Group by camera_id (collection)
+        # Group by target collection
         grouped = {}
         for vector, metadata in items:
-            cam_id = metadata.get('camera_id', 'unknown_cam')
-            if cam_id not in grouped: grouped[cam_id] = []
-            grouped[cam_id].append((vector, metadata))
+            collection = self.collection_for(metadata.get('camera_id', 'unknown_cam'))
+            if metadata.get('level') == "frame":
+                # Frame-level detail behind an event point (event segmentation)
+                collection += FRAMES_SUFFIX
+            if collection not in grouped: grouped[collection] = []
+            grouped[collection].append((vector, metadata))
             
         # Upload per collection
         for cam_id, batch in grouped.items():
             self._ensure_collection(cam_id)
-            points = []
-            for vector, metadata in batch:
-                sortable_ts = self.parse_custom_timestamp(metadata['timestamp_str'])
-                point_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, metadata['frame_id']))
-                
-                points.append(
-                    models.PointStruct(
-                        id=point_id,
-                        vector=vector,
-                        payload={
-                            "camera_id": metadata['camera_id'],
-                            "video_id": metadata['video_id'],
-                            "timestamp_str": metadata['timestamp_str'],
-                            "timestamp_sortable": sortable_ts,
-                            "relative_offset": metadata.get('relative_offset', 0.0),
-                            "clock_time_seconds": metadata.get('clock_time_seconds', 0.0), # Store new field
-                            "description": metadata['description'],
-                            "video_path": metadata['video_path'],
-                            "chunk_id": metadata['frame_id']
-                        }
-                    )
-                )
-            
-            try:
-                self.client.upsert(
-                    collection_name=cam_id,
-                    points=points
-                )
-                print(f"Batch indexed {len(points)} frames into {cam_id}")
-            except Exception as e:
-                print(f"Error indexing batch to {cam_id}: {e}")
+            points = [self._build_point(vector, metadata) for vector, metadata in batch]
+            self._upsert_with_retry(cam_id, points, wait)
+            logger.debug("Batch indexed %d frames into %s", len(points), cam_id)
 
-    def search(self, query_vector, camera_ids=None, date_range=None, relative_range=None, k=20):
-        # Default to all known cameras if not specified or "all"
-        target_cameras = camera_ids
-        if not target_cameras or "all" in target_cameras:
-            target_cameras = ["cam1", "cam2", "cam3", "cam4", "cam5"]
-            
-        all_results = []
+    @retry(
+        wait=wait_random_exponential(multiplier=1, max=30),
+        stop=stop_after_attempt(5),
+        reraise=True
+    )
+    def _upsert_with_retry(self, collection_name, points, wait):
+        self.client.upsert(
+            collection_name=collection_name,
+            points=points,
+            wait=wait
+        )
+
+    def _build_point(self, vector, metadata):
+        sortable_ts = self.parse_custom_timestamp(metadata['timestamp_str'])
+        point_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, metadata['frame_id']))
         
-        # Build Filters
+        payload = {
+            "camera_id": metadata['camera_id'],
+            "video_id": metadata['video_id'],
+            "timestamp_str": metadata['timestamp_str'],
+            "timestamp_sortable": sortable_ts,
+            "relative_offset": metadata.get('relative_offset', 0.0),
+            "clock_time_seconds": metadata.get('clock_time_seconds', 0.0), # Store new field
+            "description": metadata['description'],
+            "video_path": metadata['video_path'],
+            "chunk_id": metadata['frame_id']
+        }
+        # Event points (event segmentation) carry their span
+        for key in ("level", "event_start", "event_end", "frame_count"):
+            if key in metadata:
+                payload[key] = metadata[key]
+
+        return models.PointStruct(
+            id=point_id,
+            vector=vector,
+            payload=payload
+        )
+
+    def writer(self, on_commit=None, max_delay=None):
+        """Streaming, batched writer for ingestion (see QdrantBatchWriter)"""
+        return QdrantBatchWriter(
+            self,
+            batch_size=settings.QDRANT_UPSERT_BATCH_SIZE,
+            max_delay=max_delay or settings.QDRANT_UPSERT_MAX_DELAY,
+            max_inflight=settings.QDRANT_UPSERT_MAX_INFLIGHT,
+            on_commit=on_commit
+        )
+
+    # --- Collection metadata cache ---
+    def known_collections(self, refresh=False):
+        """Collection names, from a TTL cache so hot paths don't pay a collection_exists RPC"""
+        with self._collections_lock:
+            fresh = time.monotonic() - self._collections_fetched_at < settings.QDRANT_COLLECTION_CACHE_TTL
+            if fresh and not refresh:
+                return set(self._collections)
+        names = {c.name for c in self.client.get_collections().collections}
+        self._store_collections(names)
+        return names
+
+    async def known_collections_async(self, refresh=False):
+        with self._collections_lock:
+            fresh = time.monotonic() - self._collections_fetched_at < settings.QDRANT_COLLECTION_CACHE_TTL
+            if fresh and not refresh:
+                return set(self._collections)
+        if self.async_client is not None:
+            response = await self.async_client.get_collections()
+        else:
+            response = await asyncio.to_thread(self.client.get_collections)
+        names = {c.name for c in response.collections}
+        self._store_collections(names)
+        return names
+
+    def _store_collections(self, names):
+        with self._collections_lock:
+            self._collections = set(names)
+            self._collections_fetched_at = time.monotonic()
+
+    def _remember_collection(self, name):
+        with self._collections_lock:
+            self._collections.add(name)
+
+    # --- Search ---
+    def _build_filter(self, date_range=None, relative_range=None, camera_ids=None):
         filters = []
         
         # 1. Date Filter (Absolute Timestamp Range for the day)
@@ -152,56 +395,283 @@ class QdrantService:
                 # We should filter on `clock_time_seconds`.
                 
                 filters.append(models.FieldCondition(key="clock_time_seconds", range=models.Range(**rel_filter)))
+
+        # 3. Camera Filter (shared layout only; per-camera layout selects collections instead)
+        if camera_ids:
+            filters.append(models.FieldCondition(key="camera_id", match=models.MatchAny(any=list(camera_ids))))
         
-        query_filter = models.Filter(must=filters) if filters else None
+        return models.Filter(must=filters) if filters else None
+
+    def _camera_candidates(self, known):
+        return [
+            name for name in known
+            if name != self.shared_collection and not self.is_frames_collection(name)
+        ]
+
+    def _inspect_collection(self, name):
+        """True/False whether `name` is one of our camera collections; None while it is empty and unindexed"""
+        if all(field in (self.client.get_collection(name).payload_schema or {}) for field in CAMERA_INDEX_FIELDS):
+            return True
+        points, _ = self.client.scroll(collection_name=name, limit=1, with_payload=True)
+        if not points:
+            return None
+        return all(field in (points[0].payload or {}) for field in CAMERA_PAYLOAD_FIELDS)
+
+    def camera_collections(self, known):
+        """
+        This app's per-camera collections among `known`, sorted. Other apps' collections on
+        the same instance are left out; each name is inspected once.
+        """
+        for name in self._camera_candidates(known):
+            if name not in self._camera_collections:
+                try:
+                    kind = self._inspect_collection(name)
+                except Exception as e:
+                    logger.warning("Could not inspect collection %s: %s", name, e)
+                    continue
+                if kind is not None:
+                    self._camera_collections[name] = kind
+        return sorted(n for n in self._camera_candidates(known) if self._camera_collections.get(n))
+
+    async def camera_collections_async(self, known):
+        if any(name not in self._camera_collections for name in self._camera_candidates(known)):
+            # Only names not seen before cost a round trip; usually this is a dict lookup
+            return await asyncio.to_thread(self.camera_collections, known)
+        return self.camera_collections(known)
+
+    def _plan_search(self, known, cameras, camera_ids, date_range, relative_range):
+        """
+        Returns (collections_to_query, query_filter) for the current layout.
+        cameras: camera_collections(known); only used by the per-camera layout.
+        """
+        search_all = not camera_ids or "all" in camera_ids
+        if self.layout == "shared":
+            if self.shared_collection not in known:
+                return [], None
+            return [self.shared_collection], self._build_filter(
+                date_range, relative_range, None if search_all else camera_ids
+            )
+
+        # Per-camera: each of our camera collections is a camera, so "all" means all of them
+        if search_all:
+            targets = list(cameras)
+        else:
+            targets = [cam_id for cam_id in camera_ids if cam_id in cameras]
+        return targets, self._build_filter(date_range, relative_range)
+
+    def search(self, query_vector, camera_ids=None, date_range=None, relative_range=None, k=20):
+        try:
+            known = self.known_collections()
+        except Exception as e:
+            logger.error("Error listing collections: %s", e)
+            return []
+        cameras = self.camera_collections(known) if self.layout != "shared" else []
+        targets, query_filter = self._plan_search(known, cameras, camera_ids, date_range, relative_range)
+            
+        all_results = []
 
         # Scatter-Gather Search
-        for cam_id in target_cameras:
+        for cam_id in targets:
             try:
-                if not self.client.collection_exists(cam_id):
-                    continue
-                
                 response = self.client.query_points(
                     collection_name=cam_id,
                     query=query_vector,
                     query_filter=query_filter,
-                    limit=k 
+                    search_params=self.search_params,
+                    limit=k * settings.SEARCH_EVENT_OVERFETCH # Extra frames so events get their full span
                 )
                 results = response.points
                 all_results.extend(results)
                 
             except Exception as e:
-                print(f"Error searching collection {cam_id}: {e}")
-        
-        # Sort aggregated results by score (descending)
-        all_results.sort(key=lambda x: x.score, reverse=True)
-        
-        # --- Deduplication Logic ---
-        # Goal: If we have multiple high-scoring frames from the same event (e.g., t=10s, t=11s),
-        # keep only the highest scoring one to provide variety.
-        final_results = []
-        seen_events = {} # Key: video_id, Value: List[timestamp]
-        
-        TIME_THRESHOLD = 5.0 # Seconds. If within this range, consider it the same event.
-        
-        for hit in all_results:
-            vid = hit.payload.get('video_id', 'unknown')
-            ts = hit.payload.get('relative_offset', 0.0)
-            
-            is_duplicate = False
-            if vid in seen_events:
-                for seen_ts in seen_events[vid]:
-                    if abs(ts - seen_ts) < TIME_THRESHOLD:
-                        is_duplicate = True
-                        break
-            
-            if not is_duplicate:
-                final_results.append(hit)
-                if vid not in seen_events:
-                    seen_events[vid] = []
-                seen_events[vid].append(ts)
-                
-            if len(final_results) >= k:
-                break
-        
-        return final_results
\ No newline at end of file
+                logger.error("Error searching collection %s: %s", cam_id, e)
+
+        return self._group_hits(all_results, k)
+
+    async def search_async(self, query_vector, camera_ids=None, date_range=None, relative_range=None, k=20):
+        """
+        Same results as search(), but queries all target collections concurrently.
+        A collection that doesn't answer within QDRANT_SEARCH_TIMEOUT is skipped,
+        so latency is bounded by the slowest collection rather than the sum.
+        """
+        try:
+            known = await self.known_collections_async()
+        except Exception as e:
+            logger.error("Error listing collections: %s", e)
+            return []
+        cameras = await self.camera_collections_async(known) if self.layout != "shared" else []
+        targets, query_filter = self._plan_search(known, cameras, camera_ids, date_range, relative_range)
+
+        async def query(collection):
+            if self.async_client is not None:
+                call = self.async_client.query_points(
+                    collection_name=collection, query=query_vector, query_filter=query_filter,
+                    search_params=self.search_params, limit=k * settings.SEARCH_EVENT_OVERFETCH
+                )
+            else:
+                call = asyncio.to_thread(
+                    self.client.query_points,
+                    collection_name=collection, query=query_vector, query_filter=query_filter,
+                    search_params=self.search_params, limit=k * settings.SEARCH_EVENT_OVERFETCH
+                )
+            try:
+                response = await asyncio.wait_for(call, timeout=settings.QDRANT_SEARCH_TIMEOUT)
+                return response.points
+            except asyncio.TimeoutError:
+                logger.warning("Search timed out for collection %s", collection)
+            except Exception as e:
+                logger.error("Error searching collection %s: %s", collection, e)
+            return []
+
+        all_results = []
+        for points in await asyncio.gather(*(query(c) for c in targets)):
+            all_results.extend(points)
+        return self._group_hits(all_results, k)
+
+    def _group_hits(self, all_results, k):
+        """
+        Collapses hits from the same event (e.g. t=10s, t=11s, t=12s of one video) into
+        its highest-scoring frame, to provide variety. Each returned hit's payload gets an
+        'event' span the clip stage can cut directly.
+        """
+        results = []
+        for event in group_hits_into_events(all_results, gap=settings.SEARCH_EVENT_GAP)[:k]:
+            hit = event.pop("hit")
+            hit.payload["event"] = event
+            results.append(hit)
+        return results
+
+    def migrate_to_shared(self, delete_source=False, batch_size=256, search_cache=None):
+        """
+        Copies every per-camera collection of this app (see camera_collections) into the shared
+        collection (vectors, payloads and ids).
+        Each migrated camera's version is bumped in `search_cache`, if given.
+        Returns {collection_name: points_copied}.
+        """
+        self._ensure_collection(self.shared_collection)
+        shared_frames = self.shared_collection + FRAMES_SUFFIX
+        copied = {}
+        known = self.known_collections(refresh=True)
+        cameras = self.camera_collections(known)
+        frames = [c + FRAMES_SUFFIX for c in cameras if c + FRAMES_SUFFIX in known]
+        for name in cameras + frames:
+            # Frame-level collections (event segmentation) go to the shared frame-level collection
+            target, camera = self.shared_collection, name
+            if self.is_frames_collection(name):
+                target, camera = shared_frames, name[:-len(FRAMES_SUFFIX)]
+                self._ensure_collection(target)
+            count = 0
+            offset = None
+            while True:
+                points, offset = self.client.scroll(
+                    collection_name=name,
+                    limit=batch_size,
+                    offset=offset,
+                    with_payload=True,
+                    with_vectors=True
+                )
+                if points:
+                    self.client.upsert(
+                        collection_name=target,
+                        points=[
+                            models.PointStruct(
+                                id=p.id,
+                                vector=p.vector,
+                                # Older points may predate camera_id in the payload; the collection name is the camera
+                                payload={"camera_id": camera, **(p.payload or {})}
+                            )
+                            for p in points
+                        ]
+                    )
+                    count += len(points)
+                if offset is None:
+                    break
+            copied[name] = count
+            logger.info("Migrated %d points from %s into %s", count, name, target)
+            if delete_source:
+                self.client.delete_collection(name)
+            # Cached searches over this camera were answered from the old layout
+            if search_cache is not None:
+                search_cache.bump(camera)
+        return copied
+
+
+class QdrantBatchWriter:
+    """
+    Buffers (vector, metadata) pairs and upserts them in bounded batches while the caller keeps working.
+
+    A batch is sent once it holds `batch_size` points or its oldest point is `max_delay` seconds old.
+    Batches go out in order on one background thread with wait=False, each retried with backoff,
+    and at most `max_inflight` batches are queued before add() blocks (backpressure).
+    After each acknowledged batch, on_commit(watermark, committed) is called, where `watermark`
+    is the relative_offset of the last frame that is safely stored. Frame-level detail points
+    (level "frame") never move it: only their event point makes an event's span durable.
+    """
+
+    def __init__(self, service, batch_size=128, max_delay=5.0, max_inflight=2, on_commit=None):
+        self.service = service
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.max_inflight = max_inflight
+        self.on_commit = on_commit
+        self.committed = 0
+        self.watermark = None
+        self._buffer = []
+        self._buffer_started = None
+        self._inflight = deque()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="qdrant-writer")
+
+    def add(self, vector, metadata):
+        if not self._buffer:
+            self._buffer_started = time.monotonic()
+        self._buffer.append((vector, metadata))
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+        else:
+            self.flush_if_due()
+
+    def flush_if_due(self):
+        """Sends the buffer once its oldest point is `max_delay` old; call it on a timer when points arrive slowly."""
+        if self._buffer and time.monotonic() - self._buffer_started >= self.max_delay:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            batch, self._buffer = self._buffer, []
+            self._inflight.append(self._executor.submit(self._write, batch))
+        # Surface failures early and bound memory held by queued batches
+        while self._inflight and (len(self._inflight) > self.max_inflight or self._inflight[0].done()):
+            self._inflight.popleft().result()
+
+    def _write(self, batch):
+        self.service.upsert_items(batch, wait=False)
+        self.committed += len(batch)
+        # A batch may end on an event's frame points with the event point still buffered
+        last = next((meta for _, meta in reversed(batch) if meta.get('level') != "frame"), None)
+        if last is not None:
+            self.watermark = last.get('event_end', last.get('relative_offset'))
+        if self.on_commit:
+            self.on_commit(self.watermark, self.committed)
+
+    def close(self):
+        """Sends what's left and waits for every batch; raises if any batch ultimately failed."""
+        try:
+            self.flush()
+            while self._inflight:
+                self._inflight.popleft().result()
+        finally:
+            self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # Keep whatever was already acknowledged; don't mask the original error
+            try:
+                self.close()
+            except Exception as e:
+                logger.error("Error flushing Qdrant writer: %s", e)
+        return False
@@ -0,0 +1,84 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class TokenBucket:
+    """Thread-safe token bucket. Refills continuously at `rate_per_minute`."""
+
+    def __init__(self, rate_per_minute: float, capacity: float = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self, amount: float = 1.0):
+        """Blocks until `amount` tokens are available, then takes them."""
+        amount = min(amount, self.capacity) # A single oversized request must still pass eventually
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                wait = (amount - self._tokens) / self.rate
+            time.sleep(min(wait, 1.0))
+
+    def adjust(self, delta: float):
+        """Charges (delta > 0) or refunds (delta < 0) tokens after the fact. May go negative."""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens - delta)
+
+
+class RateLimiter:
+    """Paces calls against both a requests-per-minute and a tokens-per-minute budget."""
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+
+    def acquire(self, estimated_tokens: int):
+        self.requests.acquire(1)
+        self.tokens.acquire(estimated_tokens)
+
+    def settle(self, estimated_tokens: int, actual_tokens: int):
+        """Corrects the token bucket once the real usage is known."""
+        if actual_tokens is not None:
+            self.tokens.adjust(actual_tokens - estimated_tokens)
+
+
+def bounded_ordered_map(fn, items, concurrency: int):
+    """
+    Applies `fn` to `items` on a thread pool, keeping at most `concurrency` calls running.
+    Yields (item, result) pairs lazily, in input order.
+    """
+    if concurrency <= 1:
+        for item in items:
+            yield item, fn(item)
+        return
+
+    # Window larger than the pool so a slow head-of-line call doesn't idle the workers
+    window = concurrency * 2
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        try:
+            for item in items:
+                pending.append((item, pool.submit(fn, item)))
+                # Hand back finished results early (matters for slow, live sources)
+                while pending and (len(pending) >= window or pending[0][1].done()):
+                    head, future = pending.popleft()
+                    yield head, future.result()
+            while pending:
+                head, future = pending.popleft()
+                yield head, future.result()
+        finally:
+            for _, future in pending:
+                future.cancel()
@@ -1,28 +1,134 @@
-from sentence_transformers import CrossEncoder
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-# Load a small but powerful reranker model
-# This runs on CPU efficiently enough for 20 items
-model = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
+from app.core.config import settings
 
-def rerank_results(query, initial_results, top_k=3):
+logger = logging.getLogger(__name__)
+
+
+class Reranker:
     """
-    query: User text
-    initial_results: List of dicts (payloads from Qdrant)
+    Cross-encoder reranking of vector-search candidates.
+
+    The model is loaded on first use (or by warmup()), never at import time, so a
+    disabled reranker costs nothing. Scoring is one batched predict() over at most
+    `max_candidates` (query, description) pairs, run on a dedicated thread so the
+    event loop stays free. If the model isn't loaded yet, scoring exceeds the
+    latency budget, or an earlier (timed-out) predict is still running, the
+    vector-similarity order is returned unchanged.
     """
-    if not initial_results:
-        return []
-
-    # Prepare pairs: [ (Query, Doc1), (Query, Doc2) ... ]
-    pairs = [[query, res['description']] for res in initial_results]
-    
-    # Get scores
-    scores = model.predict(pairs)
-    
-    # Attach scores to results
-    for i, res in enumerate(initial_results):
-        res['score'] = scores[i]
-        
-    # Sort by score descending
-    sorted_results = sorted(initial_results, key=lambda x: x['score'], reverse=True)
-    
-    return sorted_results[:top_k]
\ No newline at end of file
+
+    def __init__(self, model_name, max_candidates=20, batch_size=32, timeout=None, device=None):
+        self.model_name = model_name
+        self.max_candidates = max_candidates
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.device = device
+        self._model = None
+        self._load_lock = threading.Lock()
+        self._warmup_lock = threading.Lock()
+        self._loading = None
+        # One worker: predict() already uses every core, and queued calls would only add latency
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reranker")
+        # Held from submit until predict() returns; a timed-out call keeps it, so later searches skip instead of queueing
+        self._busy = threading.Lock()
+        self.reranked = 0
+        self.skipped = 0
+
+    @property
+    def loaded(self):
+        return self._model is not None
+
+    def _load(self):
+        with self._load_lock:
+            if self._model is None:
+                try:
+                    from sentence_transformers import CrossEncoder
+                except ImportError as e:
+                    raise RuntimeError("Reranking requires the 'sentence-transformers' package") from e
+                start = time.perf_counter()
+                self._model = CrossEncoder(self.model_name, device=self.device)
+                logger.info("Loaded reranker %s in %.1fs", self.model_name, time.perf_counter() - start)
+            return self._model
+
+    def warmup(self):
+        """Loads the model in the background; returns the loading Future."""
+        with self._warmup_lock:
+            if self._loading is None:
+                self._loading = self._executor.submit(self._load)
+                self._loading.add_done_callback(self._report_load_failure)
+            return self._loading
+
+    def _report_load_failure(self, future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.warning("Reranker unavailable, searches use vector order: %s", future.exception())
+
+    def score(self, query, results):
+        """Cross-encoder relevance for each result's description (blocking)."""
+        model = self._load()
+        pairs = [(query, res.get('description') or "") for res in results]
+        return [float(s) for s in model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)]
+
+    def rerank(self, query, results):
+        """
+        Reorders the first `max_candidates` results by cross-encoder score (blocking).
+        Each scored result gets 'rerank_score'; 'score' keeps the vector similarity.
+        """
+        head, tail = results[:self.max_candidates], results[self.max_candidates:]
+        if not head:
+            return results
+        for res, s in zip(head, self.score(query, head)):
+            res['rerank_score'] = s
+        return sorted(head, key=lambda r: r['rerank_score'], reverse=True) + tail
+
+    def _rerank_and_release(self, query, results):
+        try:
+            return self.rerank(query, results)
+        finally:
+            self._busy.release()
+
+    async def rerank_async(self, query, results):
+        """rerank() off the event loop, within the latency budget."""
+        if not results:
+            return results
+        if not self.loaded:
+            # Never make a search wait for the model download/load
+            self.warmup()
+            self.skipped += 1
+            return results
+        if not self._busy.acquire(blocking=False):
+            self.skipped += 1
+            return results
+        future = asyncio.wrap_future(self._executor.submit(self._rerank_and_release, query, [dict(r) for r in results]))
+        try:
+            reranked = await asyncio.wait_for(future, timeout=self.timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Reranking exceeded %ss budget; using vector order", self.timeout)
+            self.skipped += 1
+            return results
+        except Exception as e:
+            logger.warning("Reranking failed; using vector order: %s", e)
+            self.skipped += 1
+            return results
+        self.reranked += 1
+        return reranked
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def get_reranker():
+    """Reranker from settings, or None when RERANK_ENABLED is off."""
+    if not settings.RERANK_ENABLED:
+        return None
+    return Reranker(
+        settings.RERANK_MODEL,
+        max_candidates=settings.RERANK_MAX_CANDIDATES,
+        batch_size=settings.RERANK_BATCH_SIZE,
+        timeout=settings.RERANK_TIMEOUT,
+        device=settings.RERANK_DEVICE
+    )
+
@@ -0,0 +1,291 @@
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+ALL_CAMERAS = "*"
+
+
+def normalize_search_request(request) -> dict:
+    """Canonical form of a SearchRequest: equivalent searches map to the same dict."""
+    cameras = sorted({c.strip() for c in (request.cameras or []) if c and c.strip()})
+    if not cameras or "all" in cameras:
+        cameras = ["all"]
+    return {
+        "query": " ".join(request.query.split()).lower(),
+        "cameras": cameras,
+        "start_date": (request.start_date or "").strip() or None,
+        "end_date": (request.end_date or "").strip() or None,
+        "start_time": (request.start_time or "").strip() or None,
+        "end_time": (request.end_time or "").strip() or None,
+    }
+
+
+class MemoryVersions:
+    """
+    Per-camera collection version counters for a single process. Ingestion running in
+    another process (e.g. scripts/live_ingest.py) can't bump them; use the sqlite or
+    redis backend there so its new frames invalidate the API's cached searches.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions = {}
+
+    def bump(self, camera_id):
+        with self._lock:
+            for name in (camera_id, ALL_CAMERAS):
+                self._versions[name] = self._versions.get(name, 0) + 1
+
+    def versions(self, names):
+        with self._lock:
+            return [self._versions.get(n, 0) for n in names]
+
+
+class SqliteResultStore:
+    """
+    Second-tier result cache on disk. Also holds the collection version counters,
+    so entries written before a restart are still invalidated correctly.
+    """
+
+    def __init__(self, db_path, max_entries=5000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS results (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_results_expires ON results (expires_at)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS versions (camera_id TEXT PRIMARY KEY, version INTEGER NOT NULL)"
+            )
+            self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM results WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), now + ttl)
+            )
+            self._conn.execute("DELETE FROM results WHERE expires_at <= ?", (now,))
+            # Oldest-expiring entries go first once over the cap
+            self._conn.execute(
+                "DELETE FROM results WHERE key IN ("
+                "SELECT key FROM results ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            self._conn.commit()
+
+    def bump(self, camera_id):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO versions (camera_id, version) VALUES (?, 1) "
+                "ON CONFLICT(camera_id) DO UPDATE SET version = version + 1",
+                [(camera_id,), (ALL_CAMERAS,)]
+            )
+            self._conn.commit()
+
+    def versions(self, names):
+        with self._lock:
+            rows = dict(self._conn.execute(
+                f"SELECT camera_id, version FROM versions WHERE camera_id IN ({','.join('?' * len(names))})",
+                list(names)
+            ).fetchall())
+        return [rows.get(n, 0) for n in names]
+
+
+class RedisResultStore:
+    """Second-tier result cache shared between API processes (any Redis-compatible server)."""
+
+    PREFIX = "video_rag:search:"
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("SEARCH_CACHE_BACKEND=redis requires the 'redis' package (pip install redis)") from e
+        self._redis = redis.Redis.from_url(url)
+
+    def get(self, key):
+        raw = self._redis.get(self.PREFIX + "result:" + key)
+        return json.loads(raw) if raw else None
+
+    def set(self, key, value, ttl):
+        self._redis.set(self.PREFIX + "result:" + key, json.dumps(value), ex=max(1, int(ttl)))
+
+    def bump(self, camera_id):
+        pipe = self._redis.pipeline()
+        pipe.hincrby(self.PREFIX + "versions", camera_id, 1)
+        pipe.hincrby(self.PREFIX + "versions", ALL_CAMERAS, 1)
+        pipe.execute()
+
+    def versions(self, names):
+        values = self._redis.hmget(self.PREFIX + "versions", list(names))
+        return [int(v) if v else 0 for v in values]
+
+
+class SearchResultCache:
+    """
+    Tiered cache of /api/search responses: an in-process LRU in front of an optional
+    SQLite or Redis store.
+
+    Keys are the normalized request plus the version counters of the cameras it
+    covers ("*" for all cameras). Ingestion bumps a camera's counter whenever new
+    frames become searchable, so only searches that could see that camera miss;
+    stale entries are never read again and age out of the LRU/TTL.
+    Concurrent identical searches share one computation.
+    """
+
+    def __init__(self, max_entries=512, ttl=300.0, store=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.store = store
+        self._versions = store or MemoryVersions()
+        self._lock = threading.Lock()
+        self._entries = OrderedDict() # key -> (expires_at, value), least recently used first
+        self._inflight = {}
+        self.hits = 0
+        self.store_hits = 0
+        self.misses = 0
+
+    def bump(self, camera_id):
+        """Invalidates cached searches that include `camera_id`."""
+        try:
+            self._versions.bump(camera_id)
+        except Exception as e:
+            # Never fail ingestion over the cache; drop the local tier so this process stays correct
+            logger.warning("Search cache version bump failed for %s: %s", camera_id, e)
+            with self._lock:
+                self._entries.clear()
+
+    def key_for(self, request) -> str:
+        normalized = normalize_search_request(request)
+        names = [ALL_CAMERAS] if normalized["cameras"] == ["all"] else normalized["cameras"]
+        normalized["versions"] = dict(zip(names, self._versions.versions(names)))
+        return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry:
+                del self._entries[key]
+
+        value = None
+        if self.store is not None:
+            try:
+                value = self.store.get(key)
+            except Exception as e:
+                logger.warning("Search cache store read failed: %s", e)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.store_hits += 1
+            self._put_local(key, value)
+        return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._put_local(key, value)
+        if self.store is not None:
+            try:
+                self.store.set(key, value, self.ttl)
+            except Exception as e:
+                logger.warning("Search cache store write failed: %s", e)
+
+    def _put_local(self, key, value):
+        # Caller holds the lock
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_compute(self, key, compute):
+        """Returns the cached value for `key`, or awaits compute() once across concurrent callers."""
+        value = await asyncio.to_thread(self.get, key)
+        if value is not None:
+            return value
+
+        future = self._inflight.get(key)
+        if future is not None:
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise # This request was cancelled
+                # The request computing it went away; compute it here instead
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await compute()
+            future.set_result(value)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Nobody may be waiting; mark the exception as retrieved
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+        await asyncio.to_thread(self.set, key, value)
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "store_hits": self.store_hits,
+                "misses": self.misses,
+                "inflight": len(self._inflight)
+            }
+
+
+def get_search_cache():
+    """Builds the cache described by settings; None when SEARCH_CACHE_ENABLED is off."""
+    if not settings.SEARCH_CACHE_ENABLED:
+        return None
+    backend = settings.SEARCH_CACHE_BACKEND
+    if backend == "memory":
+        store = None
+    elif backend == "sqlite":
+        store = SqliteResultStore(settings.SEARCH_CACHE_PATH, settings.SEARCH_CACHE_STORE_MAX_ENTRIES)
+    elif backend == "redis":
+        if not settings.SEARCH_CACHE_REDIS_URL:
+            raise ValueError("SEARCH_CACHE_BACKEND=redis requires SEARCH_CACHE_REDIS_URL")
+        store = RedisResultStore(settings.SEARCH_CACHE_REDIS_URL)
+    else:
+        raise ValueError(f"Unknown SEARCH_CACHE_BACKEND '{backend}' (expected memory, sqlite or redis)")
+    return SearchResultCache(settings.SEARCH_CACHE_MAX_ENTRIES, settings.SEARCH_CACHE_TTL, store)
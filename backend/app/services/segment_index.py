@@ -0,0 +1,632 @@
+import json
+import logging
+import os
+import struct
+import subprocess
+import threading
+import uuid
+from array import array
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+
+import imageio_ffmpeg
+
+logger = logging.getLogger(__name__)
+
+STREAMABLE_EXTENSIONS = {".mp4", ".m4v"}
+
+
+def iter_boxes(data, start=0, end=None):
+    """Yields (box_type, offset, size, header_size) for the boxes in data[start:end]"""
+    end = len(data) if end is None else end
+    pos = start
+    while pos + 8 <= end:
+        size, box_type = struct.unpack(">I4s", data[pos:pos + 8])
+        header = 8
+        if size == 1:
+            size = struct.unpack(">Q", data[pos + 8:pos + 16])[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header:
+            break
+        yield box_type, pos, size, header
+        pos += size
+
+
+def iter_file_boxes(f, file_size):
+    """Top-level boxes of an open MP4 file, without reading payloads"""
+    pos = 0
+    while pos + 8 <= file_size:
+        f.seek(pos)
+        head = f.read(16)
+        size, box_type = struct.unpack(">I4s", head[:8])
+        header = 8
+        if size == 1:
+            size = struct.unpack(">Q", head[8:16])[0]
+            header = 16
+        elif size == 0:
+            size = file_size - pos
+        if size < header:
+            break
+        yield box_type, pos, size, header
+        pos += size
+
+
+def find_child(data, box_type, start, end):
+    for t, off, size, header in iter_boxes(data, start, end):
+        if t == box_type:
+            return off, size, header
+    return None
+
+
+def parse_tracks(moov):
+    """{track_id: (timescale, handler_type)} from a moov payload"""
+    tracks = {}
+    for t, off, size, header in iter_boxes(moov):
+        if t != b"trak":
+            continue
+        tkhd = find_child(moov, b"tkhd", off + header, off + size)
+        mdia = find_child(moov, b"mdia", off + header, off + size)
+        if not tkhd or not mdia:
+            continue
+        p = tkhd[0] + tkhd[2]
+        version = moov[p]
+        track_id = struct.unpack(">I", moov[p + (20 if version == 1 else 12):][:4])[0]
+
+        m_off, m_size, m_header = mdia
+        mdhd = find_child(moov, b"mdhd", m_off + m_header, m_off + m_size)
+        hdlr = find_child(moov, b"hdlr", m_off + m_header, m_off + m_size)
+        if not mdhd or not hdlr:
+            continue
+        p = mdhd[0] + mdhd[2]
+        version = moov[p]
+        timescale = struct.unpack(">I", moov[p + (20 if version == 1 else 12):][:4])[0]
+        p = hdlr[0] + hdlr[2]
+        handler = moov[p + 8:p + 12].decode("ascii", errors="ignore")
+        tracks[track_id] = (timescale, handler)
+    return tracks
+
+
+def iter_traf_times(moof):
+    """
+    Yields (track_id, tfdt_value_offset, version, base_media_decode_time, explicit_base_offset)
+    for each traf in a moof box (offsets relative to the moof start).
+    """
+    _, _, moof_size, moof_header = next(iter_boxes(moof))
+    for t, off, size, header in iter_boxes(moof, moof_header, moof_size):
+        if t != b"traf":
+            continue
+        tfhd = find_child(moof, b"tfhd", off + header, off + size)
+        tfdt = find_child(moof, b"tfdt", off + header, off + size)
+        if not tfhd or not tfdt:
+            continue
+        p = tfhd[0] + tfhd[2]
+        flags = int.from_bytes(moof[p + 1:p + 4], "big")
+        track_id = struct.unpack(">I", moof[p + 4:p + 8])[0]
+        p = tfdt[0] + tfdt[2]
+        version = moof[p]
+        value_offset = p + 4
+        if version == 1:
+            value = struct.unpack(">Q", moof[value_offset:value_offset + 8])[0]
+        else:
+            value = struct.unpack(">I", moof[value_offset:value_offset + 4])[0]
+        yield track_id, value_offset, version, value, bool(flags & 0x000001)
+
+
+def _box(box_type, *payload):
+    data = b"".join(payload)
+    return struct.pack(">I4s", 8 + len(data), box_type) + data
+
+
+def _full_box_entries(data, box, fmt):
+    """Entries of a full box laid out as version/flags, entry count, then `fmt` records"""
+    off, size, header = box
+    p = off + header
+    count = struct.unpack(">I", data[p + 4:p + 8])[0]
+    record = struct.calcsize(fmt)
+    return list(struct.iter_unpack(fmt, data[p + 8:p + 8 + count * record]))
+
+
+def read_sample_table(moov, trak):
+    """
+    Sample tables of one trak in a non-fragmented moov, expanded per sample.
+    Returns None for layouts we don't serve (compact sizes, several sample descriptions).
+    """
+    off, size, header = trak
+    tkhd = find_child(moov, b"tkhd", off + header, off + size)
+    mdia = find_child(moov, b"mdia", off + header, off + size)
+    if not tkhd or not mdia:
+        return None
+    p = tkhd[0] + tkhd[2]
+    track_id = struct.unpack(">I", moov[p + (20 if moov[p] == 1 else 12):][:4])[0]
+    m_off, m_size, m_header = mdia
+    mdhd = find_child(moov, b"mdhd", m_off + m_header, m_off + m_size)
+    hdlr = find_child(moov, b"hdlr", m_off + m_header, m_off + m_size)
+    minf = find_child(moov, b"minf", m_off + m_header, m_off + m_size)
+    if not mdhd or not hdlr or not minf:
+        return None
+    stbl = find_child(moov, b"stbl", minf[0] + minf[2], minf[0] + minf[1])
+    if not stbl:
+        return None
+    boxes = {t: (o, s, h) for t, o, s, h in iter_boxes(moov, stbl[0] + stbl[2], stbl[0] + stbl[1])}
+    if not all(t in boxes for t in (b"stsd", b"stts", b"stsc", b"stsz")) or not (b"stco" in boxes or b"co64" in boxes):
+        return None
+    p = mdhd[0] + mdhd[2]
+    timescale = struct.unpack(">I", moov[p + (20 if moov[p] == 1 else 12):][:4])[0]
+    p = hdlr[0] + hdlr[2]
+    handler = moov[p + 8:p + 12].decode("ascii", errors="ignore")
+
+    deltas = array("q")
+    for count, delta in _full_box_entries(moov, boxes[b"stts"], ">II"):
+        deltas.extend([delta] * count)
+    dts = array("q", [0]) * len(deltas)
+    t = 0
+    for i, delta in enumerate(deltas):
+        dts[i] = t
+        t += delta
+
+    p = boxes[b"stsz"][0] + boxes[b"stsz"][2]
+    sample_size, count = struct.unpack(">II", moov[p + 4:p + 12])
+    if sample_size:
+        sizes = array("q", [sample_size]) * count
+    else:
+        sizes = array("q", (s for s, in struct.iter_unpack(">I", moov[p + 12:p + 12 + 4 * count])))
+
+    if b"co64" in boxes:
+        chunks = [c for c, in _full_box_entries(moov, boxes[b"co64"], ">Q")]
+    else:
+        chunks = [c for c, in _full_box_entries(moov, boxes[b"stco"], ">I")]
+    runs = _full_box_entries(moov, boxes[b"stsc"], ">III")
+    if len({desc for *_, desc in runs}) > 1:
+        return None
+    offsets = array("q")
+    k = 0
+    for r, (first_chunk, per_chunk, _) in enumerate(runs):
+        last_chunk = runs[r + 1][0] - 1 if r + 1 < len(runs) else len(chunks)
+        for chunk in range(first_chunk - 1, last_chunk):
+            pos = chunks[chunk]
+            for _ in range(per_chunk):
+                if k >= len(sizes):
+                    break
+                offsets.append(pos)
+                pos += sizes[k]
+                k += 1
+    if not (len(deltas) == len(sizes) == len(offsets)):
+        return None
+
+    ctts = None
+    if b"ctts" in boxes:
+        ctts = array("q")
+        for count, value in _full_box_entries(moov, boxes[b"ctts"], ">II"):
+            ctts.extend([value] * count)
+    sync = None
+    if b"stss" in boxes:
+        sync = array("q", (n - 1 for n, in _full_box_entries(moov, boxes[b"stss"], ">I")))
+
+    return {
+        "track_id": track_id, "timescale": timescale, "handler": handler, "trak": trak,
+        "stsd": moov[boxes[b"stsd"][0]:boxes[b"stsd"][0] + boxes[b"stsd"][1]],
+        "desc": runs[0][2] if runs else 1, "ctts_version": moov[boxes[b"ctts"][0] + boxes[b"ctts"][2]] if ctts else 0,
+        "deltas": deltas, "dts": dts, "sizes": sizes, "offsets": offsets, "ctts": ctts, "sync": sync
+    }
+
+
+def _run_lengths(values):
+    runs = []
+    for v in values:
+        if runs and runs[-1][1] == v:
+            runs[-1][0] += 1
+        else:
+            runs.append([1, v])
+    return runs
+
+
+def _patch_duration(moov, box, v1_offset, v0_offset, duration):
+    """Box bytes with the duration field of an mvhd/tkhd/mdhd replaced"""
+    off, size, header = box
+    data = bytearray(moov[off:off + size])
+    if data[header] == 1:
+        data[header + v1_offset:header + v1_offset + 8] = struct.pack(">Q", duration)
+    else:
+        data[header + v0_offset:header + v0_offset + 4] = struct.pack(">I", min(duration, 0xFFFFFFFF))
+    return bytes(data)
+
+
+def _window_stbl(track, a, b, offsets):
+    entries = _run_lengths(track["deltas"][a:b])
+    stbl = [
+        track["stsd"],
+        _box(b"stts", struct.pack(">II", 0, len(entries)), *(struct.pack(">II", c, v) for c, v in entries))
+    ]
+    if track["ctts"] is not None:
+        entries = _run_lengths(track["ctts"][a:b])
+        stbl.append(_box(b"ctts", struct.pack(">BxxxI", track["ctts_version"], len(entries)),
+                         *(struct.pack(">II", c, v) for c, v in entries)))
+    if track["sync"] is not None:
+        sync = track["sync"][bisect_left(track["sync"], a):bisect_left(track["sync"], b)]
+        stbl.append(_box(b"stss", struct.pack(">II", 0, len(sync)), *(struct.pack(">I", n - a + 1) for n in sync)))
+    # One sample per chunk keeps the offsets independent of how the original was chunked
+    stbl.append(_box(b"stsc", struct.pack(">IIIII", 0, 1, 1, 1, track["desc"])))
+    stbl.append(_box(b"stsz", struct.pack(">III", 0, 0, b - a), *(struct.pack(">I", s) for s in track["sizes"][a:b])))
+    stbl.append(_box(b"co64", struct.pack(">II", 0, len(offsets)), *(struct.pack(">Q", o) for o in offsets)))
+    return _box(b"stbl", *stbl)
+
+
+def _window_trak(moov, track, a, b, offsets, movie_timescale):
+    """The track's trak box with its sample tables cut to samples [a, b) and no edit list"""
+    duration = sum(track["deltas"][a:b])
+
+    def rebuild(box):
+        off, size, header = box
+        parts = []
+        for t, o, s, h in iter_boxes(moov, off + header, off + size):
+            if t == b"edts":
+                continue
+            elif t == b"tkhd":
+                parts.append(_patch_duration(moov, (o, s, h), 28, 20,
+                                             duration * movie_timescale // max(track["timescale"], 1)))
+            elif t == b"mdhd":
+                parts.append(_patch_duration(moov, (o, s, h), 24, 16, duration))
+            elif t in (b"mdia", b"minf"):
+                parts.append(rebuild((o, s, h)))
+            elif t == b"stbl":
+                parts.append(_window_stbl(track, a, b, offsets))
+            else:
+                parts.append(moov[o:o + s])
+        return _box(moov[off + 4:off + 8], *parts)
+
+    return rebuild(track["trak"]), duration * movie_timescale / max(track["timescale"], 1)
+
+
+@lru_cache(maxsize=8)
+def _load_sample_tables(path, mtime, moov_offset, moov_size):
+    # mtime is part of the key so a replaced file is re-read
+    with open(path, "rb") as f:
+        f.seek(moov_offset)
+        moov = f.read(moov_size)
+    _, _, _, header = next(iter_boxes(moov))
+    tracks = []
+    for t, off, size, h in iter_boxes(moov, header):
+        if t != b"trak":
+            continue
+        track = read_sample_table(moov, (off, size, h))
+        if track is None:
+            return moov, None
+        if track["handler"] in ("vide", "soun"):
+            tracks.append(track)
+    return moov, tracks
+
+
+class SegmentIndex:
+    """
+    Keyframe/fragment byte-offset index for MP4 files.
+
+    Built once at ingest time and stored as JSON next to the other data. For a
+    fragmented MP4 a time window is served as the file's init segment (ftyp + moov)
+    followed by the fragments (moof + mdat) that overlap the window, read straight
+    from the original file; fragment decode times are rebased to zero so the result
+    plays like a standalone clip. For a regular MP4 the index lists the keyframes
+    from the moov sample tables; a window is served as a small moov describing just
+    its samples, followed by the original's byte ranges that hold them. Either way
+    nothing is stored beyond the index.
+
+    With remux=True, H.264 MP4s whose sample tables can't be served this way are
+    stream-copied into a fragmented copy under index_dir instead. The original is
+    never modified.
+    """
+
+    def __init__(self, index_dir, remux=False):
+        self.index_dir = index_dir
+        self.remux = remux
+        self._lock = threading.Lock()
+        self._building = {}
+        os.makedirs(index_dir, exist_ok=True)
+
+    def index_path(self, video_id):
+        return self.index_dir / f"{os.path.basename(video_id)}.json"
+
+    def fragmented_path(self, video_id):
+        return self.index_dir / f"{os.path.basename(video_id)}.frag.mp4"
+
+    def has_index(self, video_id):
+        return os.path.exists(self.index_path(video_id))
+
+    def load(self, video_id):
+        path = self.index_path(video_id)
+        try:
+            return _load_index(str(path), os.path.getmtime(path))
+        except OSError:
+            return None
+
+    def remove(self, video_id):
+        """Deletes the index and fragmented copy of `video_id`, if any."""
+        for path in (self.index_path(video_id), self.fragmented_path(video_id)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def build(self, video_path, is_browser_safe=True):
+        """Builds (or rebuilds) the index for `video_path`. Returns the index dict or None."""
+        video_id = os.path.basename(video_path)
+        with self._lock:
+            lock = self._building.setdefault(video_id, threading.Lock())
+        with lock:
+            if os.path.splitext(video_id)[1].lower() not in STREAMABLE_EXTENSIONS:
+                return None
+            index = self._parse(video_path)
+            if index is None and is_browser_safe:
+                index = self._parse_progressive(video_path)
+            if index is None and self.remux and is_browser_safe:
+                fragmented = self.fragmented_path(video_id)
+                if self._remux_fragmented(video_path, fragmented):
+                    index = self._parse(fragmented)
+                    if index is not None:
+                        index["media"] = fragmented.name
+            if index is None:
+                return None
+
+            path = self.index_path(video_id)
+            temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(temp_path, "w") as f:
+                json.dump(index, f)
+            os.replace(temp_path, path)
+            return index
+
+    def _parse(self, video_path):
+        """Parses a fragmented MP4. Returns None if the file isn't one we can serve by byte range."""
+        file_size = os.path.getsize(video_path)
+        with open(video_path, "rb") as f:
+            init_size = None
+            tracks = None
+            fragments = []
+            pending = None # (time, moof_offset)
+            for box_type, offset, size, header in iter_file_boxes(f, file_size):
+                if box_type == b"moov":
+                    f.seek(offset + header)
+                    tracks = parse_tracks(f.read(size - header))
+                    init_size = offset + size
+                elif box_type == b"moof":
+                    if tracks is None:
+                        return None
+                    f.seek(offset)
+                    moof = f.read(size)
+                    video_track = next((tid for tid, (_, h) in tracks.items() if h == "vide"), None)
+                    times = list(iter_traf_times(moof))
+                    if any(explicit for *_, explicit in times):
+                        return None # Absolute data offsets can't be relocated
+                    start = next((v / tracks[tid][0] for tid, _, _, v, _ in times if tid == video_track), None)
+                    if start is None and times:
+                        tid, _, _, v, _ = times[0]
+                        start = v / tracks[tid][0]
+                    pending = (start or 0.0, offset)
+                elif box_type == b"mdat" and pending is not None:
+                    start, moof_offset = pending
+                    fragments.append([round(start, 4), moof_offset, offset + size - moof_offset])
+                    pending = None
+
+        if init_size is None or not fragments:
+            return None
+        return {
+            "init_size": init_size,
+            "timescales": {str(tid): ts for tid, (ts, _) in tracks.items()},
+            "fragments": fragments # [start_seconds, byte_offset, byte_size]
+        }
+
+    def _parse_progressive(self, video_path):
+        """Keyframe index of a non-fragmented MP4 from its moov sample tables; None if it can't be served."""
+        file_size = os.path.getsize(video_path)
+        ftyp = moov = None
+        with open(video_path, "rb") as f:
+            for box_type, offset, size, header in iter_file_boxes(f, file_size):
+                if box_type == b"ftyp":
+                    ftyp = [offset, size]
+                elif box_type == b"moov":
+                    moov = [offset, size]
+                elif box_type == b"moof":
+                    return None
+        if moov is None:
+            return None
+        _, tracks = _load_sample_tables(video_path, os.path.getmtime(video_path), *moov)
+        video = next((t for t in tracks or () if t["handler"] == "vide"), None)
+        if video is None:
+            return None
+        ts = video["timescale"]
+        sync = video["sync"] if video["sync"] is not None else range(len(video["dts"]))
+        return {
+            "layout": "progressive",
+            "ftyp": ftyp,
+            "moov": moov,
+            "keyframes": [[round(video["dts"][n] / ts, 4), n] for n in sync] # [start_seconds, sample_number]
+        }
+
+    def _plan_progressive(self, video_path, index, start, end):
+        moov, tracks = _load_sample_tables(video_path, os.path.getmtime(video_path), *index["moov"])
+        if not tracks:
+            return None
+        video = next(t for t in tracks if t["handler"] == "vide")
+
+        # From the keyframe at or before `start` up to the first sample at or after `end`
+        keyframes = index["keyframes"]
+        k = max(0, bisect_right([t for t, _ in keyframes], start) - 1)
+        a = keyframes[k][1]
+        b = max(a + 1, bisect_left(video["dts"], round(end * video["timescale"])))
+        t0 = video["dts"][a] / video["timescale"]
+        t1 = video["dts"][b] / video["timescale"] if b < len(video["dts"]) else float("inf")
+        windows = []
+        for track in tracks:
+            if track is video:
+                windows.append((track, a, b))
+            else:
+                ts = track["timescale"]
+                lo = bisect_left(track["dts"], round(t0 * ts))
+                hi = len(track["dts"]) if t1 == float("inf") else bisect_left(track["dts"], round(t1 * ts))
+                windows.append((track, lo, hi))
+
+        # Byte spans of the original holding the samples; short gaps are sent along to keep the parts few
+        samples = sorted((o, o + s) for track, lo, hi in windows
+                         for o, s in zip(track["offsets"][lo:hi], track["sizes"][lo:hi]))
+        spans = []
+        for lo, hi in samples:
+            if spans and lo <= spans[-1][1] + 65536:
+                spans[-1][1] = max(spans[-1][1], hi)
+            else:
+                spans.append([lo, hi])
+        span_starts = [lo for lo, _ in spans]
+        span_positions = []
+        payload = 0
+        for lo, hi in spans:
+            span_positions.append(payload)
+            payload += hi - lo
+
+        mdat_header = struct.pack(">I4s", 8 + payload, b"mdat") if payload + 8 <= 0xFFFFFFFF else \
+            struct.pack(">I4sQ", 1, b"mdat", payload + 16)
+        _, _, _, moov_header = next(iter_boxes(moov))
+        mvhd = find_child(moov, b"mvhd", moov_header, len(moov))
+        p = mvhd[0] + mvhd[2]
+        movie_timescale = struct.unpack(">I", moov[p + (20 if moov[p] == 1 else 12):][:4])[0]
+        ftyp_size = index["ftyp"][1] if index["ftyp"] else 0
+
+        def build_moov(data_start):
+            traks, durations = [], []
+            for track, lo, hi in windows:
+                offsets = []
+                for o in track["offsets"][lo:hi]:
+                    i = bisect_right(span_starts, o) - 1
+                    offsets.append(data_start + span_positions[i] + o - span_starts[i])
+                trak, duration = _window_trak(moov, track, lo, hi, offsets, movie_timescale)
+                traks.append(trak)
+                durations.append(duration)
+            parts = []
+            for t, o, s, h in iter_boxes(moov, moov_header):
+                if t == b"mvhd":
+                    parts.append(_patch_duration(moov, (o, s, h), 24, 16, int(max(durations))))
+                elif t == b"trak":
+                    # Window traks go where the first trak was; tracks other than video/audio are dropped
+                    parts.extend(traks)
+                    traks = []
+                elif t != b"mvex":
+                    parts.append(moov[o:o + s])
+            return _box(b"moov", *parts)
+
+        # co64 entries are fixed-size, so the moov's length doesn't depend on the offsets in it
+        moov_size = len(build_moov(0))
+        new_moov = build_moov(ftyp_size + moov_size + len(mdat_header))
+
+        parts = [("file", *index["ftyp"])] if index["ftyp"] else []
+        parts += [("bytes", new_moov + mdat_header)]
+        parts += [("file", lo, hi - lo) for lo, hi in spans]
+        total = sum(len(p[1]) if p[0] == "bytes" else p[2] for p in parts)
+        return video_path, parts, total
+
+    def _remux_fragmented(self, video_path, target):
+        """Writes a fragmented stream copy of video and audio to `target`; the source is left untouched."""
+        temp_path = f"{target}.remux-{uuid.uuid4().hex}.mp4"
+        cmd = [
+            imageio_ffmpeg.get_ffmpeg_exe(), "-hide_banner", "-loglevel", "error", "-y",
+            "-i", video_path, "-map", "0:v", "-map", "0:a?", "-c", "copy",
+            "-movflags", "frag_keyframe+empty_moov+default_base_moof",
+            "-f", "mp4", temp_path
+        ]
+        try:
+            result = subprocess.run(cmd, capture_output=True, timeout=3600)
+            if result.returncode != 0:
+                logger.warning("Remux failed for %s: %s", video_path, result.stderr.decode(errors='ignore').strip())
+                return False
+            os.replace(temp_path, target)
+            return True
+        except Exception as e:
+            logger.error("Error remuxing %s: %s", video_path, e)
+            return False
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def plan(self, video_path, start, duration):
+        """
+        Returns (media_path, parts, total_size) for the window, or None if there is no index.
+        media_path: the file the "file" parts refer to (the original or its fragmented copy).
+        parts: list of ("bytes", data) or ("file", offset, length), in output order.
+        """
+        index = self.load(os.path.basename(video_path))
+        if index is None:
+            return None
+        if index.get("layout") == "progressive":
+            return self._plan_progressive(video_path, index, start, start + duration)
+        if index.get("media"):
+            video_path = str(self.index_dir / index["media"])
+        fragments = index["fragments"]
+        end = start + duration
+
+        # Fragments overlapping [start, end): the one containing `start` through the last starting before `end`
+        first = 0
+        for i, (t, _, _) in enumerate(fragments):
+            if t <= start:
+                first = i
+            else:
+                break
+        last = first
+        while last + 1 < len(fragments) and fragments[last + 1][0] < end:
+            last += 1
+
+        parts = [("file", 0, index["init_size"])]
+        base_times = None
+        with open(video_path, "rb") as f:
+            for _, offset, size in fragments[first:last + 1]:
+                f.seek(offset)
+                head = f.read(16)
+                moof_size = struct.unpack(">I", head[:4])[0]
+                if moof_size == 1:
+                    moof_size = struct.unpack(">Q", head[8:16])[0]
+                f.seek(offset)
+                moof = bytearray(f.read(moof_size))
+
+                times = list(iter_traf_times(bytes(moof)))
+                if base_times is None:
+                    base_times = {tid: v for tid, _, _, v, _ in times}
+                # Rebase decode times so playback starts at 0
+                for tid, value_offset, version, value, _ in times:
+                    rebased = max(0, value - base_times.get(tid, value))
+                    if version == 1:
+                        moof[value_offset:value_offset + 8] = struct.pack(">Q", rebased)
+                    else:
+                        moof[value_offset:value_offset + 4] = struct.pack(">I", rebased)
+
+                parts.append(("bytes", bytes(moof)))
+                parts.append(("file", offset + moof_size, size - moof_size))
+
+        total = sum(len(p[1]) if p[0] == "bytes" else p[2] for p in parts)
+        return video_path, parts, total
+
+
+@lru_cache(maxsize=64)
+def _load_index(path, mtime):
+    # mtime is part of the cache key so a rebuilt index is picked up
+    with open(path) as f:
+        return json.load(f)
+
+
+def iter_range(video_path, parts, range_start, range_end, chunk_size=1024 * 1024):
+    """Yields bytes [range_start, range_end] (inclusive) of the virtual file described by `parts`"""
+    pos = 0
+    with open(video_path, "rb") as f:
+        for part in parts:
+            length = len(part[1]) if part[0] == "bytes" else part[2]
+            part_start, part_end = pos, pos + length - 1
+            pos += length
+            if part_end < range_start or part_start > range_end:
+                continue
+            lo = max(range_start, part_start) - part_start
+            hi = min(range_end, part_end) - part_start + 1
+            if part[0] == "bytes":
+                yield part[1][lo:hi]
+                continue
+            f.seek(part[1] + lo)
+            remaining = hi - lo
+            while remaining > 0:
+                data = f.read(min(chunk_size, remaining))
+                if not data:
+                    return
+                remaining -= len(data)
+                yield data
@@ -1,15 +1,146 @@
 import cv2
 import base64
+import logging
+import numpy as np
 import os
+import queue
+import subprocess
+import threading
+import uuid
+from collections import deque
 from datetime import datetime, timedelta
+import imageio_ffmpeg
 from moviepy import VideoFileClip
+from app.core.config import settings
+from app.services.chunked_upload import wait_for_growth
+
+logger = logging.getLogger(__name__)
+
+class FrameRecord:
+    """
+    One sampled frame on its way from extraction to captioning.
+
+    The image is kept as the raw JPEG (a memoryview over the encoder's buffer, no
+    copy) and only base64-encoded when something asks for frame['image'], i.e. at
+    the network boundary. Supports the dict-style access the pipeline stages use
+    (frame['relative_offset'], frame.get('duplicates'), frame.pop('thumb')), so
+    plain dict frames keep working alongside it.
+    """
+    __slots__ = ("frame_id", "timestamp_str", "relative_offset", "jpeg", "thumb", "duplicates")
+
+    def __init__(self, frame_id, timestamp_str, relative_offset, jpeg, thumb=None):
+        self.frame_id = frame_id
+        self.timestamp_str = timestamp_str
+        self.relative_offset = relative_offset
+        self.jpeg = jpeg
+        self.thumb = thumb
+        self.duplicates = None
+
+    def __getitem__(self, key):
+        if key == "image":
+            if self.jpeg is None:
+                raise KeyError(key)
+            return base64.b64encode(self.jpeg).decode("ascii")
+        if key not in self.__slots__ or getattr(self, key) is None:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        setattr(self, "jpeg" if key == "image" else key, value)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def pop(self, key, *default):
+        try:
+            value = self[key]
+        except KeyError:
+            if default:
+                return default[0]
+            raise
+        setattr(self, "jpeg" if key == "image" else key, None)
+        return value
+
+
+def frame_image(frame):
+    """Raw JPEG of a FrameRecord, or the base64 'image' of a plain dict frame."""
+    jpeg = getattr(frame, "jpeg", None)
+    return jpeg if jpeg is not None else frame['image']
+
+
+def drop_image(frame):
+    """Releases a frame's image without encoding it (pop('image') would base64 it first)."""
+    if isinstance(frame, FrameRecord):
+        frame.jpeg = None
+    else:
+        frame.pop('image', None)
+
 
 class VideoProcessor:
+    def __init__(self):
+        # Per-thread resize/grayscale buffers, reused for every frame (ingestion workers share this processor)
+        self._buffers = threading.local()
+
     @staticmethod
     def get_frame_base64(image):
         _, buffer = cv2.imencode('.jpg', image)
         return base64.b64encode(buffer).decode('utf-8')
 
+    @staticmethod
+    def encode_jpeg(image, quality=None):
+        """JPEG bytes of `image` as a memoryview over the encoder's output (no copy)."""
+        if quality is None:
+            quality = settings.FRAME_JPEG_QUALITY
+        _, buffer = cv2.imencode('.jpg', image, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+        return memoryview(buffer.reshape(-1))
+
+    @staticmethod
+    def jpeg_bytes(image):
+        """Raw JPEG from either raw bytes/memoryview (returned as is) or a base64 string."""
+        if isinstance(image, str):
+            return base64.b64decode(image)
+        return image
+
+    @staticmethod
+    def to_base64(image):
+        """Base64 text from either raw JPEG bytes/memoryview or an already encoded string."""
+        if isinstance(image, str):
+            return image
+        return base64.b64encode(image).decode("ascii")
+
+    @staticmethod
+    def build_mosaic(images, columns=2):
+        """
+        Tiles frames (JPEGs of equal size, raw or base64) into one grid image, left to
+        right, top to bottom, each tile labelled with its 1-based number. Returns base64 JPEG.
+        """
+        tiles = [
+            cv2.imdecode(np.frombuffer(VideoProcessor.jpeg_bytes(b), dtype=np.uint8), cv2.IMREAD_COLOR)
+            for b in images
+        ]
+        h, w = tiles[0].shape[:2]
+        columns = max(1, min(columns, len(tiles)))
+        rows = -(-len(tiles) // columns)
+        mosaic = np.zeros((rows * h, columns * w, 3), dtype=np.uint8)
+        for i, tile in enumerate(tiles):
+            r, c = divmod(i, columns)
+            if tile.shape[:2] != (h, w):
+                tile = cv2.resize(tile, (w, h))
+            mosaic[r * h:(r + 1) * h, c * w:(c + 1) * w] = tile
+            # Dark box behind the number so it stays legible on any background
+            cv2.rectangle(mosaic, (c * w, r * h), (c * w + 44, r * h + 34), (0, 0, 0), -1)
+            cv2.putText(mosaic, str(i + 1), (c * w + 6, r * h + 27), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (255, 255, 255), 2)
+        return VideoProcessor.get_frame_base64(mosaic)
+
+    @staticmethod
+    def get_thumbnail(image, size=32, gray_buffer=None):
+        """Small grayscale copy used for cheap frame-to-frame comparisons"""
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=gray_buffer)
+        return cv2.resize(gray, (size, size), interpolation=cv2.INTER_AREA)
+
     def parse_custom_ts(self, ts_str):
         """Converts '12022006152036125' OR ISO format to a datetime object"""
         if "-" in ts_str or "T" in ts_str:
@@ -39,56 +170,274 @@ class VideoProcessor:
         ms = int(dt_obj.microsecond / 1000)
         return f"{base}{ms:03d}"
 
-    def process_video(self, video_path, start_timestamp_str, interval=1):
+    def estimate_frame_count(self, video_path, interval=1):
+        """Number of frames process_video will yield (from container metadata)"""
+        cap = cv2.VideoCapture(video_path)
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        total = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+        cap.release()
+        if not fps or total <= 0: return None
+        stride = max(1, int(fps * interval))
+        return int((total + stride - 1) // stride)
+
+    def estimate_frames_before(self, video_path, resume_after, interval=1):
+        """Number of frames process_video samples at or before `resume_after` seconds (what a resumed run skips)"""
+        cap = cv2.VideoCapture(video_path)
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        cap.release()
+        if not fps: return 0
+        stride = max(1, int(fps * interval))
+        return self.first_frame_after(resume_after, fps, stride) // stride
+
+    def iter_sampled_frames(self, cap, stride, mode="grab", start_frame=0, end_frame=None):
+        """
+        Yields (frame_index, frame) for every `stride`-th frame, from start_frame up to
+        (not including) end_frame when given.
+
+        mode:
+          read - decode every frame, keep one per stride (legacy behaviour)
+          grab - grab() skipped frames (demux + no colour conversion), retrieve() only the sampled ones
+          seek - jump straight to each sampled frame with CAP_PROP_POS_FRAMES (best for very sparse sampling)
+        """
+        if start_frame and mode != "seek":
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+
+        if mode == "seek":
+            total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            if end_frame is not None and (total <= 0 or end_frame < total):
+                total = end_frame
+            frame_index = start_frame
+            while total <= 0 or frame_index < total:
+                if frame_index and not cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index):
+                    break
+                ret, frame = cap.read()
+                if not ret: break
+                yield frame_index, frame
+                frame_index += stride
+            return
+
+        current_frame = start_frame
+        while cap.isOpened() and (end_frame is None or current_frame < end_frame):
+            if mode == "read" or current_frame % stride == 0:
+                ret, frame = cap.read()
+                if not ret: break
+                if current_frame % stride == 0:
+                    yield current_frame, frame
+            else:
+                if not cap.grab(): break
+            current_frame += 1
+
+    @staticmethod
+    def first_frame_after(offset, fps, stride):
+        """Index of the first sampled frame strictly after `offset` seconds"""
+        return (int(offset * fps) // stride + 1) * stride
+
+    @staticmethod
+    def prefetch(iterator, maxsize=8):
+        """Runs `iterator` on a background thread so decoding overlaps with the caller's work"""
+        q = queue.Queue(maxsize=maxsize)
+        stop = threading.Event()
+        done = object()
+
+        def producer():
+            try:
+                for item in iterator:
+                    while not stop.is_set():
+                        try:
+                            q.put(item, timeout=0.1)
+                            break
+                        except queue.Full:
+                            continue
+                    if stop.is_set(): return
+            except Exception as e:
+                q.put(e)
+            finally:
+                q.put(done)
+
+        thread = threading.Thread(target=producer, name="frame-decode", daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = q.get()
+                if item is done: break
+                if isinstance(item, Exception): raise item
+                yield item
+        finally:
+            stop.set()
+            # Unblock a producer waiting on a full queue, then let it exit
+            while thread.is_alive():
+                try:
+                    q.get_nowait()
+                except queue.Empty:
+                    thread.join(timeout=0.1)
+
+    def process_video(self, video_path, start_timestamp_str, interval=1, mode=None, decode_thread=None,
+                      resume_after=None, frame_range=None):
         """
-        Yields: (frame_id, timestamp_str, base64_image)
+        Yields: FrameRecord per sampled frame
+        resume_after: skip straight past frames at or before this offset (seconds)
+        frame_range: (start_frame, end_frame) source frame indices to sample within;
+                     start_frame must be a multiple of the sampling stride
         """
+        mode = mode or settings.FRAME_SAMPLING_MODE
+        if decode_thread is None:
+            decode_thread = settings.FRAME_DECODE_THREAD
+
         cap = cv2.VideoCapture(video_path)
         fps = cap.get(cv2.CAP_PROP_FPS)
         
-        if fps == 0: return
+        if fps == 0:
+            cap.release()
+            return
 
-        stride = int(fps * interval)
-        current_frame = 0
+        stride = max(1, int(fps * interval))
         
         # Parse the start time provided by user
         start_dt = self.parse_custom_ts(start_timestamp_str)
+        video_name = os.path.basename(video_path)
 
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret: break
-            
-            if current_frame % stride == 0:
-                # Calculate time offset in seconds
-                seconds_passed = current_frame / fps
-                
-                # Calculate exact time of this frame
-                frame_dt = start_dt + timedelta(seconds=seconds_passed)
-                frame_ts_str = self.format_custom_ts(frame_dt)
-                
-                # Create unique ID: video_name + timestamp
-                video_name = os.path.basename(video_path)
-                frame_id = f"{video_name}_{frame_ts_str}"
+        start_frame, end_frame = frame_range or (0, None)
+        if resume_after is not None:
+            # First sampled frame strictly after the checkpoint
+            start_frame = max(start_frame, self.first_frame_after(resume_after, fps, stride))
 
-                # Resize and Encode
-                frame_resized = cv2.resize(frame, (640, 360))
-                b64_img = self.get_frame_base64(frame_resized)
-                
-                yield {
-                    "frame_id": frame_id,
-                    "timestamp_str": frame_ts_str,
-                    "relative_offset": seconds_passed,
-                    "image": b64_img
-                }
-                
-            current_frame += 1
+        frames = self.iter_sampled_frames(cap, stride, mode, start_frame, end_frame)
+        if decode_thread:
+            frames = self.prefetch(frames)
+
+        try:
+            for current_frame, frame in frames:
+                yield self.build_frame_record(video_name, start_dt, current_frame, fps, frame)
+        finally:
+            frames.close()
+            cap.release()
+
+    def process_growing_video(self, video_path, start_timestamp_str, is_complete, interval=1,
+                              poll_interval=1.0, stall_timeout=None, resume_after=None):
+        """
+        Like process_video, but for a file that is still being uploaded.
+
+        Reopens the file whenever more bytes arrive and continues from the next
+        unsampled frame. While the upload is incomplete a frame is only yielded
+        once at least `stride` further frames have decoded after it, so we never
+        caption a frame whose data was only partially written. Containers that
+        can't be read until complete (MP4 with the moov atom at the end) simply
+        start once the last chunk lands.
+        """
+        if stall_timeout is None:
+            stall_timeout = settings.UPLOAD_STALL_TIMEOUT
+        start_dt = self.parse_custom_ts(start_timestamp_str)
+        video_name = os.path.basename(video_path)
+        next_index = 0
+
+        while True:
+            complete = is_complete()
+            size_at_open = os.path.getsize(video_path) if os.path.exists(video_path) else 0
+
+            cap = cv2.VideoCapture(video_path)
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            if cap.isOpened() and fps > 0:
+                stride = max(1, int(fps * interval))
+                if resume_after is not None and next_index == 0:
+                    next_index = self.first_frame_after(resume_after, fps, stride)
+                guard = 0 if complete else stride
+                if next_index:
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, next_index)
+
+                pending = deque()
+                current_frame = next_index
+                try:
+                    while cap.grab():
+                        if current_frame % stride == 0:
+                            ok, frame = cap.retrieve()
+                            if ok: pending.append((current_frame, frame))
+                        while pending and current_frame - pending[0][0] >= guard:
+                            frame_index, frame = pending.popleft()
+                            yield self.build_frame_record(video_name, start_dt, frame_index, fps, frame)
+                            next_index = frame_index + stride
+                        current_frame += 1
+                finally:
+                    cap.release()
+            else:
+                cap.release()
+
+            if complete:
+                return
+            wait_for_growth(video_path, is_complete, size_at_open, poll_interval, stall_timeout)
+
+    def build_frame_record(self, video_name, start_dt, current_frame, fps, frame):
+        # Calculate time offset in seconds
+        return self.build_frame_record_at(video_name, start_dt, current_frame / fps, frame)
+
+    def build_frame_record_at(self, video_name, start_dt, seconds_passed, frame):
+        """FrameRecord for a frame `seconds_passed` after start_dt (live sources have no frame index)."""
+        # Calculate exact time of this frame
+        frame_dt = start_dt + timedelta(seconds=seconds_passed)
+        frame_ts_str = self.format_custom_ts(frame_dt)
+        
+        # Create unique ID: video_name + timestamp
+        frame_id = f"{video_name}_{frame_ts_str}"
+
+        # Resize into this thread's reusable buffers, then keep only the JPEG and the thumbnail
+        buffers = self._buffers
+        size = (settings.FRAME_WIDTH, settings.FRAME_HEIGHT)
+        resized = getattr(buffers, "resized", None)
+        if resized is None or resized.shape != (size[1], size[0], frame.shape[2]):
+            resized = buffers.resized = np.empty((size[1], size[0], frame.shape[2]), dtype=frame.dtype)
+            buffers.gray = np.empty((size[1], size[0]), dtype=np.uint8)
+        cv2.resize(frame, size, dst=resized)
+        thumb = self.get_thumbnail(resized, gray_buffer=buffers.gray)
+
+        return FrameRecord(
+            frame_id,
+            frame_ts_str,
+            seconds_passed,
+            self.encode_jpeg(resized),
+            thumb # For change detection
+        )
+
+    # Codecs browsers can play inside MP4, i.e. safe to stream-copy without re-encoding
+    BROWSER_SAFE_FOURCC = {"avc1", "h264", "H264", "x264", "X264"}
+
+    def get_codec(self, video_path):
+        cap = cv2.VideoCapture(video_path)
+        fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
         cap.release()
+        return "".join(chr((fourcc >> (8 * i)) & 0xFF) for i in range(4)).strip("\x00 ")
+
+    def cut_clip(self, video_path, start_offset, output_path, duration=3):
+        """Stream-copies the clip when the source codec allows it, otherwise re-encodes with MoviePy"""
+        if self.get_codec(video_path) in self.BROWSER_SAFE_FOURCC:
+            if self.copy_clip(video_path, start_offset, output_path, duration):
+                return True
+        return self.create_clip(video_path, start_offset, output_path, duration)
+
+    def copy_clip(self, video_path, start_offset, output_path, duration=3):
+        """
+        Cuts a clip with ffmpeg stream copy (no decode/encode).
+        Input seeking with -c copy snaps to the preceding keyframe, so the clip may start slightly early.
+        """
+        start = max(0, start_offset - 1)
+        cmd = [
+            imageio_ffmpeg.get_ffmpeg_exe(), "-hide_banner", "-loglevel", "error", "-y",
+            "-ss", f"{start:.3f}", "-i", video_path, "-t", str(duration),
+            "-c", "copy", "-avoid_negative_ts", "make_zero", "-movflags", "+faststart",
+            "-f", "mp4", output_path
+        ]
+        try:
+            result = subprocess.run(cmd, capture_output=True, timeout=60)
+            if result.returncode != 0:
+                logger.warning("Stream copy failed for %s: %s", video_path, result.stderr.decode(errors='ignore').strip())
+                return False
+            return os.path.exists(output_path) and os.path.getsize(output_path) > 0
+        except Exception as e:
+            logger.error("Error clipping with ffmpeg: %s", e)
+            return False
 
-    def create_clip(self, video_path, start_offset, output_path):
-        """Creates a 3-second clip using MoviePy"""
+    def create_clip(self, video_path, start_offset, output_path, duration=3):
+        """Creates a clip (3 seconds by default) using MoviePy"""
         try:
             start = max(0, start_offset - 1)
-            duration = 3
             end = start + duration
 
             with VideoFileClip(video_path) as video:
@@ -102,16 +451,18 @@ class VideoProcessor:
                 # Write file with compatible codecs
                 # audio_codec='aac' ensures audio works in browsers
                 # temp_audiofile and remove_temp=True cleans up
+                # Unique temp audio name so concurrent clips never collide
+                temp_audio = os.path.join(os.path.dirname(output_path) or ".", f"temp-audio-{uuid.uuid4().hex}.m4a")
                 new_clip.write_videofile(
                     output_path,
                     codec="libx264",
                     audio_codec="aac",
-                    temp_audiofile="temp-audio.m4a",
+                    temp_audiofile=temp_audio,
                     remove_temp=True,
                     logger=None  # Reduce console spam
                 )
                 
             return True
         except Exception as e:
-            print(f"Error clipping with MoviePy: {e}")
+            logger.error("Error clipping with MoviePy: %s", e)
             return False
\ No newline at end of file
@@ -0,0 +1,279 @@
+"""
+End-to-end benchmark of the FastAPI app, fully offline.
+
+Generates synthetic videos, uploads them through POST /api/upload, waits for the
+ingestion jobs, then times POST /api/search and clip generation. The app runs
+against the deterministic stub LLM (LLM_PROVIDER=stub, --latency simulates API
+round trips) and an in-process Qdrant (":memory:", or local mode with
+--qdrant-path). All data lives in a temporary directory.
+
+Reports ingest frames/s, search p50/p95/p99, clip build time and the process's
+peak RSS, and writes them as JSON. With --compare, prints the change against an
+earlier run and exits non-zero when a metric regressed by more than --tolerance.
+
+Run from backend/:
+    python -m benchmarks.bench_e2e --videos 4 --seconds 30 --latency 0.05
+    python -m benchmarks.bench_e2e --compare benchmarks/results/e2e-<earlier>.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+QUERIES = [
+    "find the red car",
+    "person carrying a parcel near the entrance",
+    "white delivery van parked in the driveway",
+    "dog on a leash crossing the street",
+    "black SUV at night",
+]
+
+# Higher is better for these; every other compared metric is a duration or size
+HIGHER_IS_BETTER = {"ingest.frames_per_second"}
+
+
+def configure_environment(data_dir, latency, search_cache):
+    """Points every path setting into data_dir and selects the offline services (before app import)."""
+    env = {
+        "LLM_PROVIDER": "stub",
+        "STUB_LATENCY": str(latency),
+        "QDRANT_URL": "http://localhost:6333", # Required setting; replaced by a local client below
+        "SEARCH_CACHE_ENABLED": "true" if search_cache else "false",
+        "RERANK_ENABLED": "false",
+        "LOG_LEVEL": "WARNING",
+        "DATA_DIR": str(data_dir),
+        "VIDEO_DIR": str(data_dir / "videos"),
+        "CLIPS_DIR": str(data_dir / "clips"),
+        "SEGMENT_INDEX_DIR": str(data_dir / "segment_index"),
+        "JOBS_DB_PATH": str(data_dir / "jobs.db"),
+        "UPLOADS_DB_PATH": str(data_dir / "uploads.db"),
+        "EMBEDDING_CACHE_PATH": str(data_dir / "embedding_cache.db"),
+        "LOCAL_MODEL_DIR": str(data_dir / "models"),
+    }
+    os.environ.update(env)
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def percentiles(samples_ms):
+    import numpy as np
+    values = np.asarray(samples_ms)
+    return {
+        "p50_ms": round(float(np.percentile(values, 50)), 2),
+        "p95_ms": round(float(np.percentile(values, 95)), 2),
+        "p99_ms": round(float(np.percentile(values, 99)), 2),
+        "mean_ms": round(float(values.mean()), 2),
+        "samples": len(samples_ms),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def run_ingest(client, video_paths, timeout):
+    start = time.perf_counter()
+    job_ids = []
+    for i, path in enumerate(video_paths):
+        with open(path, "rb") as f:
+            response = client.post(
+                "/api/upload",
+                files={"file": (os.path.basename(path), f, "video/mp4")},
+                data={"camera_id": f"bench_cam{i % 2}", "start_timestamp": "2026-01-15T09:00:00"},
+            )
+        response.raise_for_status()
+        job_ids.append(response.json()["job_id"])
+
+    pending = set(job_ids)
+    results = {}
+    while pending:
+        if time.perf_counter() - start > timeout:
+            raise TimeoutError(f"{len(pending)} ingestion job(s) unfinished after {timeout}s")
+        for job_id in list(pending):
+            job = client.get(f"/api/jobs/{job_id}").json()
+            if job["status"] == "failed":
+                raise RuntimeError(f"Ingestion job {job_id} failed: {job.get('error')}")
+            if job["status"] == "completed":
+                results[job_id] = job.get("result") or {}
+                pending.discard(job_id)
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - start
+
+    indexed = sum(r.get("frames_indexed", 0) for r in results.values())
+    sampled = sum(r.get("frames_sampled", r.get("frames_indexed", 0)) for r in results.values())
+    return {
+        "videos": len(video_paths),
+        "frames_sampled": sampled,
+        "frames_indexed": indexed,
+        "seconds": round(elapsed, 3),
+        "frames_per_second": round(sampled / elapsed, 2) if elapsed else None,
+    }
+
+
+def run_search(client, repeats):
+    """
+    The first pass over QUERIES is reported separately as cold: it pays for building
+    the result clips, which later searches get from the clip cache.
+    """
+    timings = []
+    hits = 0
+    for i in range(len(QUERIES) + repeats):
+        query = QUERIES[i % len(QUERIES)]
+        start = time.perf_counter()
+        response = client.post("/api/search", json={"query": query})
+        timings.append((time.perf_counter() - start) * 1000)
+        response.raise_for_status()
+        hits += len(response.json().get("results", []))
+    cold, warm = timings[:len(QUERIES)], timings[len(QUERIES):]
+    return {
+        **percentiles(warm),
+        "cold_p50_ms": round(sorted(cold)[len(cold) // 2], 2),
+        "cold_max_ms": round(max(cold), 2),
+        "avg_results": round(hits / len(timings), 2),
+    }
+
+
+def run_clips(clip_cache, video_paths, count, duration):
+    timings = []
+    for i in range(count):
+        path = video_paths[i % len(video_paths)]
+        offset = float(1 + (i // len(video_paths)) * (duration + 1))
+        name = f"bench_{i}_{Path(path).stem}.mp4"
+        start = time.perf_counter()
+        ok = clip_cache.get(str(path), offset, name, duration=duration)
+        timings.append((time.perf_counter() - start) * 1000)
+        if not ok:
+            raise RuntimeError(f"Clip generation failed for {name}")
+    return percentiles(timings)
+
+
+def compare(current, baseline_path, tolerance):
+    """Prints per-metric change against a baseline run; returns the regressed metric names."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    regressions = []
+    print(f"\nAgainst {baseline_path} ({baseline['meta'].get('commit')}):")
+    if baseline["meta"].get("args") != current["meta"]["args"]:
+        print("  (runs used different arguments; numbers may not be comparable)")
+    for section in ("ingest", "search", "clips", "memory"):
+        for key, value in current.get(section, {}).items():
+            before = baseline.get(section, {}).get(key)
+            if not isinstance(value, (int, float)) or not isinstance(before, (int, float)) or not before:
+                continue
+            if key in ("samples", "videos", "frames_sampled", "frames_indexed", "avg_results"):
+                continue
+            name = f"{section}.{key}"
+            change = (value - before) / before
+            worse = -change if name in HIGHER_IS_BETTER else change
+            flag = " REGRESSION" if worse > tolerance else ""
+            if flag:
+                regressions.append(name)
+            print(f"  {name:<28} {before:>10} -> {value:>10} ({change:+.1%}){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--videos", type=int, default=2)
+    parser.add_argument("--seconds", type=int, default=20, help="Length of each synthetic video")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--fps", type=int, default=15)
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated seconds per stub caption request")
+    parser.add_argument("--searches", type=int, default=100)
+    parser.add_argument("--clips", type=int, default=10)
+    parser.add_argument("--clip-seconds", type=float, default=3.0)
+    parser.add_argument("--search-cache", action="store_true", help="Leave the search result cache on")
+    parser.add_argument("--qdrant-path", help="Qdrant local-mode directory instead of :memory:")
+    parser.add_argument("--timeout", type=float, default=600.0, help="Seconds to wait for ingestion")
+    parser.add_argument("--output", help="JSON file to write (default benchmarks/results/e2e-<time>.json)")
+    parser.add_argument("--compare", help="Earlier JSON result to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed relative slowdown before flagging")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = Path(tmp) / "data"
+        configure_environment(data_dir, args.latency, args.search_cache)
+
+        # Imported only now: settings and the app's singletons are built at import time
+        from fastapi.testclient import TestClient
+        from qdrant_client import QdrantClient
+
+        import app.main as app_main
+        from benchmarks.bench_frame_sampling import make_synthetic_video
+
+        app_main.qdrant.client = QdrantClient(path=args.qdrant_path) if args.qdrant_path else QdrantClient(":memory:")
+        app_main.qdrant.async_client = None
+
+        print(f"Generating {args.videos} x {args.seconds}s {args.width}x{args.height} @ {args.fps}fps ...")
+        source_dir = Path(tmp) / "source"
+        source_dir.mkdir()
+        video_paths = []
+        for i in range(args.videos):
+            path = source_dir / f"bench_{i}.mp4"
+            make_synthetic_video(str(path), args.width, args.height, args.fps, args.seconds)
+            video_paths.append(path)
+
+        with TestClient(app_main.app) as client:
+            ingest = run_ingest(client, video_paths, args.timeout)
+            print(f"Ingest: {ingest['frames_sampled']} frames in {ingest['seconds']}s "
+                  f"({ingest['frames_per_second']} frames/s)")
+            search = run_search(client, args.searches)
+            print(f"Search: p50 {search['p50_ms']} ms, p95 {search['p95_ms']} ms, p99 {search['p99_ms']} ms "
+                  f"(cold p50 {search['cold_p50_ms']} ms)")
+            stored = [app_main.settings.VIDEO_DIR / p.name for p in video_paths]
+            clips = run_clips(app_main.clip_cache, stored, args.clips, args.clip_seconds)
+            print(f"Clips: p50 {clips['p50_ms']} ms, p95 {clips['p95_ms']} ms")
+
+        memory = {"peak_rss_mb": peak_rss_mb()}
+        print(f"Peak RSS: {memory['peak_rss_mb']} MB")
+
+    result = {
+        "meta": {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        },
+        "ingest": ingest,
+        "search": search,
+        "clips": clips,
+        "memory": memory,
+    }
+    output = Path(args.output) if args.output else (
+        Path(__file__).resolve().parent / "results" / f"e2e-{datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2))
+    print(f"Wrote {output}")
+
+    if args.compare:
+        regressions = compare(result, args.compare, args.tolerance)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
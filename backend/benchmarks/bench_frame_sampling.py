@@ -0,0 +1,88 @@
+"""
+Micro-benchmark for VideoProcessor.process_video sampling modes.
+
+Generates a synthetic video and reports sampled frames/sec (decode + resize + JPEG)
+for each mode, with and without the decode thread. With --processes, also reports
+the FrameExtractionPool (INGEST_PROCESS_WORKERS) at each worker count.
+
+Run from backend/:
+    python -m benchmarks.bench_frame_sampling --width 1920 --height 1080 --seconds 20
+    python -m benchmarks.bench_frame_sampling --seconds 120 --processes 1 2 4 8 --shard-seconds 15
+"""
+import argparse
+import os
+import tempfile
+import time
+
+# Settings require these; the benchmark never talks to either service
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+os.environ.setdefault("QDRANT_URL", "http://localhost:6333")
+
+import cv2
+import numpy as np
+
+from app.services.frame_pool import FrameExtractionPool
+from app.services.video_proc import VideoProcessor
+
+
+def make_synthetic_video(path, width, height, fps, seconds):
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    rng = np.random.default_rng(0)
+    background = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+    for i in range(int(fps * seconds)):
+        frame = background.copy()
+        x = (i * 7) % max(1, width - 200)
+        cv2.rectangle(frame, (x, height // 3), (x + 200, height // 3 + 150), (0, 0, 255), -1)
+        writer.write(frame)
+    writer.release()
+
+
+def run_mode(processor, path, mode, decode_thread):
+    start = time.perf_counter()
+    count = 0
+    for _ in processor.process_video(path, "2026-01-01T00:00:00", mode=mode, decode_thread=decode_thread):
+        count += 1
+    elapsed = time.perf_counter() - start
+    return count, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--seconds", type=int, default=20)
+    parser.add_argument("--video", help="Benchmark an existing file instead of a synthetic one")
+    parser.add_argument("--processes", nargs="*", type=int, default=[], help="Worker counts for the process pool")
+    parser.add_argument("--shard-seconds", type=float, default=15.0)
+    args = parser.parse_args()
+
+    processor = VideoProcessor()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.video
+        if not path:
+            path = os.path.join(tmp, "synthetic.mp4")
+            print(f"Generating {args.width}x{args.height} @ {args.fps}fps, {args.seconds}s ...")
+            make_synthetic_video(path, args.width, args.height, args.fps, args.seconds)
+
+        print(f"{'mode':<6} {'thread':<7} {'frames':>6} {'seconds':>8} {'frames/s':>9}")
+        for mode in ("read", "grab", "seek"):
+            for decode_thread in (False, True):
+                count, elapsed = run_mode(processor, path, mode, decode_thread)
+                rate = count / elapsed if elapsed else 0.0
+                print(f"{mode:<6} {str(decode_thread):<7} {count:>6} {elapsed:>8.2f} {rate:>9.1f}")
+
+        for workers in args.processes:
+            pool = FrameExtractionPool(workers, shard_seconds=args.shard_seconds)
+            # Worker start-up (spawn + imports) is a one-off cost; keep it out of the numbers
+            list(pool.process_video(path, "2026-01-01T00:00:00", resume_after=max(0, args.seconds - 2)))
+            start = time.perf_counter()
+            count = sum(1 for _ in pool.process_video(path, "2026-01-01T00:00:00"))
+            elapsed = time.perf_counter() - start
+            pool.shutdown()
+            rate = count / elapsed if elapsed else 0.0
+            print(f"{'pool':<6} {f'{workers}p':<7} {count:>6} {elapsed:>8.2f} {rate:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
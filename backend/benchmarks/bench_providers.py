@@ -0,0 +1,103 @@
+"""
+Captioning and embedding throughput per LLM provider (LLM_PROVIDER).
+
+Encodes synthetic 640x360 frames the way VideoProcessor does, captions them with
+each provider's caption_frames() and embeds the captions with get_embeddings(),
+reporting frames/s, texts/s and time to the first caption. The embedding cache is
+bypassed so every run measures the model, not SQLite.
+
+"stub" needs nothing and shows the pipeline ceiling (add --stub-latency to mimic
+API round trips); "local" needs transformers + sentence-transformers (and
+optimum[onnxruntime] for LOCAL_BACKEND=onnx); "openai" needs OPENAI_API_KEY and
+is billed.
+
+Run from backend/:
+    python -m benchmarks.bench_providers --providers stub local --frames 64
+"""
+import argparse
+import base64
+import os
+import time
+
+# Settings require this; the benchmark never talks to Qdrant
+os.environ.setdefault("QDRANT_URL", "http://localhost:6333")
+
+import cv2
+import numpy as np
+
+from app.core.config import settings
+from app.services.embedding_cache import EmbeddingCache
+
+
+class _NoCache(EmbeddingCache):
+    """Always-miss cache, so embeddings are computed every run."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, keys):
+        return {}
+
+    def put_many(self, items):
+        pass
+
+
+def make_frames(count, seed=0):
+    rng = np.random.default_rng(seed)
+    frames = []
+    for i in range(count):
+        img = np.full((360, 640, 3), rng.integers(40, 200, 3), dtype=np.uint8)
+        for _ in range(4):
+            x, y = int(rng.integers(0, 560)), int(rng.integers(0, 280))
+            cv2.rectangle(img, (x, y), (x + 80, y + 80), tuple(int(c) for c in rng.integers(0, 255, 3)), -1)
+        _, buffer = cv2.imencode('.jpg', img, [int(cv2.IMWRITE_JPEG_QUALITY), 85])
+        frames.append({"image": base64.b64encode(buffer).decode('utf-8'), "relative_offset": float(i)})
+    return frames
+
+
+def make_provider(name):
+    settings.LLM_PROVIDER = name
+    from app.services.llm_factory import get_llm_provider
+    provider = get_llm_provider()
+    if hasattr(provider, "embedding_cache"):
+        provider.embedding_cache = _NoCache()
+    return provider
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--providers", nargs="+", default=["stub"], choices=["stub", "local", "openai"])
+    parser.add_argument("--frames", type=int, default=64)
+    parser.add_argument("--stub-latency", type=float, default=settings.STUB_LATENCY)
+    args = parser.parse_args()
+    settings.STUB_LATENCY = args.stub_latency
+
+    frames = make_frames(args.frames)
+    print(f"{'provider':>8} {'load s':>7} {'first s':>8} {'frames/s':>9} {'texts/s':>9} {'dims':>5}")
+    for name in args.providers:
+        provider = make_provider(name)
+        # Model loading is a one-off cost; keep it out of the throughput numbers
+        start = time.perf_counter()
+        captions = [d for _, d in provider.caption_frames(frames[:1])]
+        provider.get_embeddings(captions)
+        load = time.perf_counter() - start
+
+        start = time.perf_counter()
+        first = None
+        captions = []
+        for _, description in provider.caption_frames(frames):
+            if first is None:
+                first = time.perf_counter() - start
+            captions.append(description)
+        caption_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        vectors = provider.get_embeddings(captions)
+        embed_time = time.perf_counter() - start
+        print(f"{name:>8} {load:>7.2f} {first:>8.3f} {len(frames) / caption_time:>9.1f} "
+              f"{len(captions) / embed_time:>9.1f} {len(vectors[0]):>5}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Recall/latency benchmark for the Qdrant collection profiles (QDRANT_PROFILE).
+
+Builds a synthetic caption-like corpus (clustered unit vectors), loads it into one
+collection per profile and embedding size, and reports recall@k against exact
+float32 search, query latency and the RAM needed for the in-memory vectors.
+
+Shortened embeddings are simulated by truncating the synthetic vectors; real
+text-embedding-3 vectors are trained for this and lose much less recall than
+random ones do, so treat those rows as a lower bound.
+
+Quantization and HNSW only exist on a real Qdrant server; the in-process
+":memory:" client does brute-force search and ignores both.
+
+Run from backend/:
+    python -m benchmarks.bench_quantization --url http://localhost:6333 --points 50000
+"""
+import argparse
+import os
+import time
+import uuid
+
+# Settings require these; the benchmark never calls OpenAI
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+os.environ.setdefault("QDRANT_URL", "http://localhost:6333")
+
+import numpy as np
+from qdrant_client import QdrantClient, models
+
+from app.services.qdrant_store import COLLECTION_PROFILES, QdrantService
+
+FULL_DIMENSIONS = 1536
+BYTES_PER_DIMENSION = {None: 4, "scalar": 1, "binary": 1 / 8}
+
+
+def make_corpus(points, queries, dimensions, clusters, seed=0):
+    """Clustered unit vectors: near-duplicate captions of the same scene sit close together."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dimensions)).astype(np.float32)
+    assignment = rng.integers(0, clusters, points)
+    corpus = centers[assignment] + 0.6 * rng.standard_normal((points, dimensions)).astype(np.float32)
+    query_assignment = rng.integers(0, clusters, queries)
+    query_vectors = centers[query_assignment] + 0.6 * rng.standard_normal((queries, dimensions)).astype(np.float32)
+    return normalize(corpus), normalize(query_vectors)
+
+
+def normalize(vectors):
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def shorten(vectors, dimensions):
+    """Same as requesting `dimensions` from text-embedding-3: truncate, then re-normalize."""
+    return normalize(vectors[:, :dimensions]) if dimensions < vectors.shape[1] else vectors
+
+
+def exact_top_k(corpus, query_vectors, k):
+    scores = query_vectors @ corpus.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def wait_until_indexed(client, collection, timeout=600):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if client.get_collection(collection).status == models.CollectionStatus.GREEN:
+            return
+        time.sleep(0.5)
+
+
+def run_profile(client, profile, corpus, query_vectors, truth, k, batch_size):
+    dimensions = corpus.shape[1]
+    collection = f"bench_{profile}_{dimensions}_{uuid.uuid4().hex[:6]}"
+    service = QdrantService(client=client, layout="per_camera", profile=profile, vector_size=dimensions)
+    try:
+        service._ensure_collection(collection)
+        start = time.perf_counter()
+        for i in range(0, len(corpus), batch_size):
+            chunk = corpus[i:i + batch_size]
+            client.upsert(
+                collection_name=collection,
+                points=models.Batch(ids=list(range(i, i + len(chunk))), vectors=chunk.tolist()),
+                wait=True
+            )
+        wait_until_indexed(client, collection)
+        load_seconds = time.perf_counter() - start
+
+        latencies = []
+        hits = 0
+        for query, expected in zip(query_vectors, truth):
+            t0 = time.perf_counter()
+            response = client.query_points(
+                collection_name=collection, query=query.tolist(),
+                search_params=service.search_params, limit=k
+            )
+            latencies.append((time.perf_counter() - t0) * 1000)
+            hits += len({p.id for p in response.points} & set(expected.tolist()))
+        return {
+            "recall": hits / truth.size,
+            "p50": float(np.percentile(latencies, 50)),
+            "p95": float(np.percentile(latencies, 95)),
+            "load": load_seconds,
+            "ram_mb": len(corpus) * dimensions * BYTES_PER_DIMENSION[COLLECTION_PROFILES[profile]["quantization"]] / 2**20
+        }
+    finally:
+        client.delete_collection(collection)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:6333", help='Qdrant URL, or ":memory:"')
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--clusters", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=512)
+    parser.add_argument("--profiles", nargs="+", default=list(COLLECTION_PROFILES), choices=list(COLLECTION_PROFILES))
+    parser.add_argument("--dimensions", nargs="+", type=int, default=[FULL_DIMENSIONS, 512])
+    args = parser.parse_args()
+
+    if args.url == ":memory:":
+        print("Note: the in-process client ignores quantization/HNSW; all profiles will report exact search.")
+        client = QdrantClient(":memory:")
+    else:
+        client = QdrantClient(url=args.url, timeout=300)
+
+    print(f"Generating {args.points} points / {args.queries} queries ...")
+    corpus, query_vectors = make_corpus(args.points, args.queries, FULL_DIMENSIONS, args.clusters)
+    # Ground truth is always exact search over the full 1536-d vectors
+    truth = exact_top_k(corpus, query_vectors, args.k)
+
+    print(f"{'profile':<8} {'dims':>5} {f'recall@{args.k}':>10} {'p50 ms':>8} {'p95 ms':>8} {'load s':>8} {'vector MB':>10}")
+    for dimensions in args.dimensions:
+        short_corpus, short_queries = shorten(corpus, dimensions), shorten(query_vectors, dimensions)
+        for profile in args.profiles:
+            r = run_profile(client, profile, short_corpus, short_queries, truth, args.k, args.batch_size)
+            print(f"{profile:<8} {dimensions:>5} {r['recall']:>10.3f} {r['p50']:>8.2f} {r['p95']:>8.2f} "
+                  f"{r['load']:>8.1f} {r['ram_mb']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
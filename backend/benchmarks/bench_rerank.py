@@ -0,0 +1,80 @@
+"""
+Latency added by cross-encoder reranking, per candidate count.
+
+Scores synthetic frame captions against a few queries with the configured
+RERANK_MODEL and reports p50/p95 milliseconds per search for each candidate
+count (RERANK_MAX_CANDIDATES) and batch size. Needs sentence-transformers; the
+model is downloaded on first run.
+
+Run from backend/:
+    python -m benchmarks.bench_rerank --device cpu --candidates 5 10 20 50 100
+"""
+import argparse
+import os
+import random
+import time
+
+# Settings require these; the benchmark never talks to either service
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+os.environ.setdefault("QDRANT_URL", "http://localhost:6333")
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.reranker import Reranker
+
+QUERIES = [
+    "red car turning left at the intersection",
+    "person carrying a large box near the entrance",
+    "delivery van parked in the driveway at night",
+]
+SUBJECTS = ["A man in a grey hoodie", "A woman with a red umbrella", "A white delivery van", "A black SUV",
+            "Two children on bicycles", "A dog on a leash", "A courier holding a parcel", "A silver sedan"]
+ACTIONS = ["walks past the front door", "turns left at the intersection", "is parked in the driveway",
+           "stops near the gate", "crosses the street", "enters the shop", "waits by the entrance"]
+SETTINGS = ["in daylight.", "at night under a streetlight.", "in light rain.", "while the gate is open.",
+            "with a parked car in the background.", "near a row of bins."]
+
+
+def make_captions(count, seed=0):
+    rng = random.Random(seed)
+    return [f"{rng.choice(SUBJECTS)} {rng.choice(ACTIONS)} {rng.choice(SETTINGS)}" for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=settings.RERANK_MODEL)
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--candidates", nargs="+", type=int, default=[5, 10, 20, 50, 100])
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[16, 32, 64])
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    reranker = Reranker(args.model, device=args.device)
+    start = time.perf_counter()
+    reranker._load()
+    print(f"Model load: {time.perf_counter() - start:.2f}s ({args.model} on {args.device})")
+
+    captions = make_captions(max(args.candidates))
+    # First predict() pays one-off initialization; keep it out of the numbers
+    reranker.score(QUERIES[0], [{"description": c} for c in captions[:8]])
+
+    print(f"{'candidates':>10} {'batch':>6} {'p50 ms':>8} {'p95 ms':>8} {'ms/pair':>8}")
+    for count in args.candidates:
+        results = [{"description": c} for c in captions[:count]]
+        for batch_size in args.batch_sizes:
+            reranker.batch_size = batch_size
+            reranker.max_candidates = count
+            timings = []
+            for i in range(args.repeats):
+                t0 = time.perf_counter()
+                reranker.rerank(QUERIES[i % len(QUERIES)], [dict(r) for r in results])
+                timings.append((time.perf_counter() - t0) * 1000)
+            p50 = float(np.percentile(timings, 50))
+            p95 = float(np.percentile(timings, 95))
+            print(f"{count:>10} {batch_size:>6} {p50:>8.1f} {p95:>8.1f} {p50 / count:>8.2f}")
+    reranker.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+"""
+Moves per-camera Qdrant collections into the single shared collection.
+
+Run from backend/:
+    python -m scripts.migrate_to_shared_collection [--delete-source]
+
+Afterwards set QDRANT_LAYOUT=shared so ingestion and search use the shared collection.
+Cached searches of the migrated cameras are invalidated in the configured search cache
+(with SEARCH_CACHE_BACKEND=memory the API's cache is per process and clears on restart).
+"""
+import argparse
+
+from app.services.qdrant_store import QdrantService
+from app.services.result_cache import get_search_cache
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--delete-source", action="store_true", help="Drop each per-camera collection once copied")
+    parser.add_argument("--batch-size", type=int, default=256)
+    args = parser.parse_args()
+
+    service = QdrantService(layout="shared")
+    copied = service.migrate_to_shared(
+        delete_source=args.delete_source, batch_size=args.batch_size, search_cache=get_search_cache()
+    )
+    print(f"Done: {sum(copied.values())} points from {len(copied)} collection(s)")
+
+
+if __name__ == "__main__":
+    main()
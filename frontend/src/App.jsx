@@ -4,7 +4,7 @@ import Sidebar from './components/Sidebar';
 import ChatMessage from './components/ChatMessage';
 import UploadModal from './components/UploadModal';
 import UploadProgress from './components/UploadProgress';
-import { searchVideos, uploadVideo } from './api/client';
+import { searchVideos, searchVideosStream, uploadVideo, waitForJob } from './api/client';
 import './App.css'; // This now loads our new beautiful styles
 
 function App() {
@@ -41,19 +41,49 @@ function App() {
         setMessages(prev => [...prev, { role: 'user', text: userText }]);
         setLoading(true);
 
+        // The streamed answer is a single assistant message, updated in place as events arrive
+        const answerId = `answer-${Date.now()}`;
+        let started = false;
+        const updateAnswer = (update) => {
+            started = true;
+            setLoading(false);
+            setMessages(prev => prev.some(m => m.id === answerId)
+                ? prev.map(m => (m.id === answerId ? update(m) : m))
+                : [...prev, update({ id: answerId, role: 'assistant', text: '', results: [] })]
+            );
+        };
+
         try {
-            // 1. Get Response (Chat OR Search)
-            const response = await searchVideos(userText, filters);
+            // 1. Get Response (Chat OR Search), streamed
+            const response = await searchVideosStream(userText, filters, {
+                onResults: (results) => updateAnswer(msg => ({ ...msg, results })),
+                onClip: (clip) => updateAnswer(msg => ({
+                    ...msg,
+                    results: msg.results.map(r => r.id === clip.id ? { ...r, ...clip } : r)
+                })),
+                onToken: (text) => updateAnswer(msg => ({ ...msg, text: msg.text + text })),
+            });
 
-            // 2. Add AI Message directly using backend text
-            setMessages(prev => [...prev, {
+            // 2. Final message from the backend (same shape as the non-streaming endpoint)
+            updateAnswer(() => ({
+                id: answerId,
                 role: 'assistant',
                 text: response.message, // Use the smart message from Python
                 results: response.results // Only exists if type='search'
-            }]);
+            }));
 
         } catch (error) {
-            setMessages(prev => [...prev, { role: 'assistant', text: "Error connecting to the database." }]);
+            if (!started) {
+                // Stream unavailable before anything arrived: fall back to the blocking endpoint
+                const response = await searchVideos(userText, filters);
+                setMessages(prev => [...prev, {
+                    role: 'assistant',
+                    text: response.message,
+                    results: response.results
+                }]);
+            } else {
+                updateAnswer(msg => ({ ...msg, text: msg.text || "Error connecting to the database." }));
+            }
         } finally {
             setLoading(false);
         }
@@ -77,10 +107,23 @@ function App() {
                 }));
             });
 
+            // Upload returns a job id straight away; indexing continues server-side
+            const job = await waitForJob(res.job_id, (j) => {
+                setUploadState(prev => ({
+                    ...prev,
+                    status: 'processing',
+                    progress: j.progress != null ? Math.round(j.progress * 100) : prev.progress
+                }));
+            });
+
+            if (job.status === 'failed') {
+                throw new Error(job.error || 'Ingestion failed');
+            }
+
             setUploadState(prev => ({
                 ...prev,
                 status: 'success',
-                message: `Indexed ${res.frames_indexed || 0} frames.`
+                message: `Indexed ${job.result?.frames_indexed || 0} frames.`
             }));
 
             // Auto-dismiss after 5 seconds
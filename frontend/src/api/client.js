@@ -5,31 +5,34 @@ const apiClient = axios.create({
     headers: { 'Content-Type': 'application/json' },
 });
 
+const buildSearchPayload = (query, filters) => {
+    // Parse Sidebar filters
+    let startDate = filters.startDate || null;
+    let endDate = filters.endDate || null;
+    let s_time = filters.startTime || null; // e.g. "00:10:00"
+    let e_time = filters.endTime || null;   // e.g. "00:20:00"
+
+    // Legacy cleanup if it was passed weirdly
+    if (s_time && s_time.includes('T')) {
+         s_time = s_time.split('T')[1];
+    }
+    if (e_time && e_time.includes('T')) {
+         e_time = e_time.split('T')[1];
+    }
+    
+    return {
+        query: query,
+        cameras: filters.cameras.length > 0 ? filters.cameras : ["all"],
+        start_date: startDate,
+        end_date: endDate,
+        start_time: s_time,
+        end_time: e_time
+    };
+};
+
 export const searchVideos = async (query, filters) => {
     try {
-        // Parse Sidebar filters
-        let startDate = filters.startDate || null;
-        let endDate = filters.endDate || null;
-        let s_time = filters.startTime || null; // e.g. "00:10:00"
-        let e_time = filters.endTime || null;   // e.g. "00:20:00"
-
-        // Legacy cleanup if it was passed weirdly
-        if (s_time && s_time.includes('T')) {
-             s_time = s_time.split('T')[1];
-        }
-        if (e_time && e_time.includes('T')) {
-             e_time = e_time.split('T')[1];
-        }
-        
-        const payload = {
-            query: query,
-            cameras: filters.cameras.length > 0 ? filters.cameras : ["all"],
-            start_date: startDate,
-            end_date: endDate,
-            start_time: s_time,
-            end_time: e_time
-        };
-        
+        const payload = buildSearchPayload(query, filters);
         const response = await apiClient.post('/search', payload);
         // CHANGE: Return the whole data object { type, message, results }
         return response.data; 
@@ -40,6 +43,47 @@ export const searchVideos = async (query, filters) => {
     }
 };
 
+// Streaming search (server-sent events over a POST): hits arrive first, then clip URLs
+// as clips finish and the summary token by token. Resolves with the final response.
+export const searchVideosStream = async (query, filters, { onResults, onClip, onToken } = {}) => {
+    const response = await fetch(`${apiClient.defaults.baseURL}/search/stream`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(buildSearchPayload(query, filters)),
+    });
+    if (!response.ok || !response.body) {
+        throw new Error(`Search failed with status ${response.status}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const block = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            let event = 'message';
+            let data = '';
+            for (const line of block.split('\n')) {
+                if (line.startsWith('event:')) event = line.slice(6).trim();
+                else if (line.startsWith('data:')) data += line.slice(5).trim();
+            }
+            const payload = data ? JSON.parse(data) : null;
+            if (event === 'results' && onResults) onResults(payload.results);
+            else if (event === 'clip' && onClip) onClip(payload);
+            else if (event === 'token' && onToken) onToken(payload.text);
+            else if (event === 'done') return payload;
+            else if (event === 'error') throw new Error(payload.message);
+        }
+    }
+    throw new Error('Search stream ended early');
+};
+
 // ... (keep uploadVideo the same)
 // ... (keep uploadVideo the same)
 export const uploadVideo = async (formData, onProgress) => {
@@ -60,4 +104,21 @@ export const uploadVideo = async (formData, onProgress) => {
         console.error("Upload failed:", error);
         throw error;
     }
-};
\ No newline at end of file
+};
+
+// Ingestion runs in the background; poll the job until it finishes
+export const getJobStatus = async (jobId) => {
+    const response = await apiClient.get(`/jobs/${jobId}`);
+    return response.data;
+};
+
+export const waitForJob = async (jobId, onProgress, intervalMs = 2000) => {
+    while (true) {
+        const job = await getJobStatus(jobId);
+        if (onProgress) onProgress(job);
+        if (job.status === 'completed' || job.status === 'failed') {
+            return job;
+        }
+        await new Promise(resolve => setTimeout(resolve, intervalMs));
+    }
+};
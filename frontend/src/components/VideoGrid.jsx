@@ -11,6 +11,7 @@ const VideoGrid = ({ results }) => {
     const safeResults = results ? results.filter(r => r && r.video_url && (
         r.video_url.includes('/static/clips/') || 
         r.video_url.includes('/clips/') || 
+        r.video_url.includes('/segments/') || 
         Number.isFinite(r.timestamp_sortable)
     )) : [];
 
@@ -37,7 +38,7 @@ const VideoGrid = ({ results }) => {
                             // We use timestamp_sortable (seconds) for seeking
                             // If backend sends '12022006..', we rely on that parsing logic
                             // FORCE 0 if it's a clip to prevent out-of-bounds seeking
-                            timestamp={(result.video_url?.includes('/static/clips/') || result.video_url?.includes('/clips/')) ? 0 : result.timestamp_sortable} 
+                            timestamp={(result.video_url?.includes('/static/clips/') || result.video_url?.includes('/clips/') || result.video_url?.includes('/segments/')) ? 0 : result.timestamp_sortable} 
                             isActive={activeIndex === idx}
                         />
                     </div>
@@ -8,7 +8,8 @@ const VideoPlayer = ({ videoUrl, timestamp = 0, isActive }) => {
 
     // Detect if this is a generated clip or full video
     // Clips are stored in /static/clips/ (local) OR /clips/ (supabase)
-    const isClip = videoUrl?.includes('/static/clips/') || videoUrl?.includes('/clips/');
+    // /api/segments/ windows are streamed from the original file and also start at 0
+    const isClip = videoUrl?.includes('/static/clips/') || videoUrl?.includes('/clips/') || videoUrl?.includes('/segments/');
 
     // Auto-seek when the video loads or becomes active
     useEffect(() => {
@@ -24,6 +25,15 @@ const VideoPlayer = ({ videoUrl, timestamp = 0, isActive }) => {
         }
     }, [isActive, timestamp, isClip]);
 
+    // Streamed results arrive before their clip is cut
+    if (!videoUrl) {
+        return (
+            <div className="video-wrapper relative rounded-lg overflow-hidden bg-black aspect-video flex items-center justify-center text-xs text-slate-400">
+                Preparing clip...
+            </div>
+        );
+    }
+
     // --- RENDER RAW VIDEO FOR CLIPS (Verified working via test_player.html) ---
     if (isClip) {
          const fullUrl = videoUrl?.startsWith('http') ? videoUrl : `http://localhost:8000${videoUrl}`;